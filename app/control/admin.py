@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.urls import reverse
 from .models import Empleado, Asistencia, Justificante, Horario, SystemConfig, Pase
+from . import pases_pdf
 
 
 @admin.register(Justificante)
@@ -42,7 +44,7 @@ class JustificanteAdmin(admin.ModelAdmin):
 
 	def ver_pdf(self, obj):
 		if obj.ruta_archivo:
-			return f'<a href="{obj.ruta_archivo.url}" target="_blank">📄 Ver PDF</a>'
+			return f'<a href="{reverse("control:descargar_justificante", args=[obj.pk])}" target="_blank">📄 Ver PDF</a>'
 		return '-'
 	ver_pdf.short_description = 'PDF'
 	ver_pdf.allow_tags = True
@@ -50,7 +52,7 @@ class JustificanteAdmin(admin.ModelAdmin):
 	def pdf_link(self, obj):
 		"""Mostrar enlace del PDF en la vista detallada"""
 		if obj.ruta_archivo:
-			return f'<a href="{obj.ruta_archivo.url}" target="_blank">📥 Descargar PDF</a>'
+			return f'<a href="{reverse("control:descargar_justificante", args=[obj.pk])}?descargar=1" target="_blank">📥 Descargar PDF</a>'
 		return 'No hay archivo'
 	pdf_link.short_description = 'Descargar Documento'
 	pdf_link.allow_tags = True
@@ -87,10 +89,10 @@ class SystemConfigAdmin(admin.ModelAdmin):
 
 @admin.register(Pase)
 class PaseAdmin(admin.ModelAdmin):
-	list_display = ('folio', 'empleado_nombre', 'tipo', 'fecha', 'hora', 'descargar_pdf')
-	list_filter = ('tipo', 'fecha', 'empleado')
+	list_display = ('folio', 'empleado_nombre', 'tipo', 'fecha', 'hora', 'pdf_estado', 'descargar_pdf')
+	list_filter = ('tipo', 'fecha', 'empleado', 'pdf_estado')
 	search_fields = ('folio', 'empleado__nombre', 'empleado__apellido')
-	readonly_fields = ('creado_por', 'fecha_creacion', 'pdf_link')
+	readonly_fields = ('creado_por', 'fecha_creacion', 'pdf_link', 'pdf_estado', 'pdf_intentos', 'pdf_error')
 	fieldsets = (
 		('Información del Pase', {
 			'fields': ('empleado', 'tipo', 'folio', 'creado_por', 'fecha_creacion')
@@ -99,24 +101,29 @@ class PaseAdmin(admin.ModelAdmin):
 			'fields': ('fecha', 'hora', 'hora_reincorporacion', 'asunto', 'observaciones')
 		}),
 		('PDF', {
-			'fields': ('pdf_link',)
+			'fields': ('pdf_link', 'pdf_estado', 'pdf_intentos', 'pdf_error')
 		}),
 	)
 
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		# Regenerar el PDF con los datos guardados
+		pases_pdf.encolar_pdf(obj)
+
 	def empleado_nombre(self, obj):
 		return f"{obj.empleado.nombre} {obj.empleado.apellido}"
 	empleado_nombre.short_description = 'Empleado'
 
 	def descargar_pdf(self, obj):
 		if obj.pdf_generado:
-			return f'<a href="{obj.pdf_generado.url}" download>📄 Descargar</a>'
+			return f'<a href="{reverse("control:descargar_pase_pdf", args=[obj.pk])}" download>📄 Descargar</a>'
 		return '-'
 	descargar_pdf.short_description = 'PDF'
 	descargar_pdf.allow_tags = True
 
 	def pdf_link(self, obj):
 		if obj.pdf_generado:
-			return f'<a href="{obj.pdf_generado.url}" target="_blank">📥 Ver/Descargar PDF</a>'
+			return f'<a href="{reverse("control:descargar_pase_pdf", args=[obj.pk])}?inline=1" target="_blank">📥 Ver/Descargar PDF</a>'
 		return 'PDF no generado'
 	pdf_link.short_description = 'Archivo PDF'
 	pdf_link.allow_tags = True
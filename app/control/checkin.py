@@ -0,0 +1,385 @@
+"""
+Servicio de checado (entrada/salida) usado por los kioscos.
+
+Calcula la puntualidad antes de escribir y persiste la asistencia con una
+sola sentencia (INSERT para la entrada, UPDATE condicional para la salida),
+de modo que cada checada cuesta un número acotado de consultas. El resumen
+diario (`control.resumen`) se actualiza en la misma checada; el aviso al
+dashboard en tiempo real (`control.tiempo_real`) se publica al confirmar.
+"""
+import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import puntualidad, resumen, tiempo_real
+from .models import (
+    Asistencia, Empleado, SystemConfig, normalizar_rfc, obtener_indice_horarios, obtener_indices_horarios,
+)
+
+# Límites del registro por lotes (kioscos que reenvían checadas acumuladas sin conexión)
+LOTE_MAX_EVENTOS = getattr(settings, 'LOTE_MAX_EVENTOS', 5000)
+LOTE_ANTIGUEDAD_MAX_DIAS = getattr(settings, 'LOTE_ANTIGUEDAD_MAX_DIAS', 7)
+LOTE_TOLERANCIA_FUTURO = datetime.timedelta(minutes=5)
+
+# Caché en proceso RFC -> empleado_id. Las señales de Empleado cambian una
+# versión guardada en la caché compartida; cada búsqueda la compara y, si otro
+# worker la cambió, vacía la copia local. El TTL solo acota la memoria.
+RFC_CACHE_MAX = getattr(settings, 'RFC_CACHE_MAX', 10000)
+RFC_CACHE_TTL = getattr(settings, 'RFC_CACHE_TTL', 300)
+CLAVE_VERSION_RFC = 'control:rfc:version'
+
+_rfc_cache = OrderedDict()
+_rfc_cache_lock = threading.Lock()
+_rfc_cache_version = None
+
+
+class ChecadoError(Exception):
+    """Error de negocio al registrar una checada (mensaje listo para el usuario)."""
+
+    def __init__(self, mensaje, status=None):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+def _nueva_version():
+    return uuid.uuid4().hex
+
+
+def _sincronizar_rfcs():
+    """Vacía la copia local si la versión compartida cambió desde la última búsqueda."""
+    global _rfc_cache_version
+    version = cache.get_or_set(CLAVE_VERSION_RFC, _nueva_version, None)
+    with _rfc_cache_lock:
+        if version != _rfc_cache_version:
+            _rfc_cache.clear()
+            _rfc_cache_version = version
+
+
+def _rfc_cacheado(rfc):
+    with _rfc_cache_lock:
+        entrada = _rfc_cache.get(rfc)
+        if entrada is None:
+            return None
+        empleado_id, expira = entrada
+        if expira < time.monotonic():
+            del _rfc_cache[rfc]
+            return None
+        _rfc_cache.move_to_end(rfc)
+        return empleado_id
+
+
+def _cachear_rfcs(pares):
+    expira = time.monotonic() + RFC_CACHE_TTL
+    with _rfc_cache_lock:
+        for rfc, empleado_id in pares:
+            _rfc_cache[rfc] = (empleado_id, expira)
+            _rfc_cache.move_to_end(rfc)
+        while len(_rfc_cache) > RFC_CACHE_MAX:
+            _rfc_cache.popitem(last=False)
+
+
+def olvidar_empleado(empleado_id):
+    """Quita de la caché de RFC las entradas de ese empleado, en todos los workers.
+
+    Las de este proceso se borran aquí; el resto vacía su copia al ver la
+    nueva versión compartida.
+    """
+    cache.set(CLAVE_VERSION_RFC, _nueva_version(), None)
+    with _rfc_cache_lock:
+        for rfc in [rfc for rfc, (pk, _) in _rfc_cache.items() if pk == empleado_id]:
+            del _rfc_cache[rfc]
+
+
+def resolver_empleado_id(rfc):
+    """Devuelve el id del empleado con ese RFC o lanza ChecadoError.
+
+    La búsqueda es por igualdad exacta sobre el índice único de `rfc`
+    (guardado en forma canónica); las repeticiones salen de la caché en proceso.
+    """
+    rfc = normalizar_rfc(rfc)
+    if not rfc:
+        raise ChecadoError('Debes indicar un RFC', status=400)
+
+    _sincronizar_rfcs()
+    empleado_id = _rfc_cacheado(rfc)
+    if empleado_id is None:
+        empleado_id = Empleado.objects.filter(rfc=rfc).values_list('pk', flat=True).first()
+        if empleado_id is None:
+            raise ChecadoError('No se encontró empleado con ese RFC', status=404)
+        _cachear_rfcs([(rfc, empleado_id)])
+    return empleado_id
+
+
+def resolver_empleado_ids(rfcs):
+    """Versión en bloque de `resolver_empleado_id`: `{rfc: empleado_id}` de los que existan."""
+    encontrados = {}
+    faltantes = set()
+    _sincronizar_rfcs()
+    for rfc in rfcs:
+        empleado_id = _rfc_cacheado(rfc)
+        if empleado_id is None:
+            faltantes.add(rfc)
+        else:
+            encontrados[rfc] = empleado_id
+    if faltantes:
+        nuevos = list(Empleado.objects.filter(rfc__in=faltantes).values_list('rfc', 'pk'))
+        _cachear_rfcs(nuevos)
+        encontrados.update(nuevos)
+    return encontrados
+
+
+def minutos_de_diferencia(indice, momento):
+    """Minutos entre `momento` (datetime aware) y la entrada programada de ese día.
+
+    `indice` es el índice semanal de horarios del empleado.
+    Positivo = tarde, negativo = antes. None si no hay horario aplicable.
+    """
+    local = timezone.localtime(momento)
+    return puntualidad.minutos_para(indice, local.date(), local.time())
+
+
+def umbral_retardo():
+    """Minutos de tolerancia configurados antes de marcar retardo."""
+    try:
+        return int(SystemConfig.get_cached().retardo_minutos or 0)
+    except Exception:
+        return 0
+
+
+def tipo_por_diferencia(mins, umbral):
+    return 'retardo' if mins is not None and mins > umbral else 'normal'
+
+
+def registrar_entrada(rfc, momento=None):
+    """Registra la entrada del empleado identificado por `rfc`.
+
+    El tipo (normal/retardo) se calcula antes de escribir; la fila se crea con
+    un único INSERT. Si ya existía una fila del día sin hora de entrada
+    (p. ej. una falta generada), se completa con un UPDATE condicional.
+    """
+    empleado_id = resolver_empleado_id(rfc)
+    momento = timezone.localtime(momento or timezone.now())
+    fecha, hora = momento.date(), momento.time()
+
+    mins = minutos_de_diferencia(obtener_indice_horarios(empleado_id), momento)
+    umbral = umbral_retardo()
+    tipo = tipo_por_diferencia(mins, umbral)
+
+    try:
+        with transaction.atomic():
+            Asistencia.objects.create(empleado_id=empleado_id, fecha=fecha, hora_entrada=hora, tipo=tipo)
+    except IntegrityError:
+        actualizadas = Asistencia.objects.filter(
+            empleado_id=empleado_id, fecha=fecha, hora_entrada__isnull=True,
+        ).update(hora_entrada=hora, tipo=tipo)
+        if not actualizadas:
+            raise ChecadoError('Ya has registrado tu entrada hoy')
+        resumen.actualizar(Asistencia.objects.filter(empleado_id=empleado_id, fecha=fecha))
+
+    tiempo_real.publicar_al_confirmar([('entrada', empleado_id, fecha, hora, tipo, mins)])
+    return {
+        'empleado_id': empleado_id,
+        'fecha': fecha,
+        'hora': hora,
+        'tipo': tipo,
+        'diferencia_minutos': mins,
+        'umbral_minutos': umbral,
+    }
+
+
+def registrar_salida(rfc, momento=None):
+    """Registra la salida con un UPDATE condicional sobre la asistencia del día.
+
+    Solo si la actualización no afecta filas se hace una consulta extra para
+    devolver el motivo exacto.
+    """
+    empleado_id = resolver_empleado_id(rfc)
+    momento = timezone.localtime(momento or timezone.now())
+    fecha, hora = momento.date(), momento.time()
+
+    actualizadas = Asistencia.objects.filter(
+        empleado_id=empleado_id, fecha=fecha,
+        hora_entrada__isnull=False, hora_salida__isnull=True,
+    ).update(hora_salida=hora)
+
+    if not actualizadas:
+        estado = Asistencia.objects.filter(
+            empleado_id=empleado_id, fecha=fecha,
+        ).values_list('hora_entrada', flat=True)
+        if not estado:
+            raise ChecadoError('No se encontró registro de entrada para hoy')
+        if estado[0] is None:
+            raise ChecadoError('Debes registrar primero tu entrada')
+        raise ChecadoError('Ya has registrado tu salida hoy')
+
+    resumen.actualizar(Asistencia.objects.filter(empleado_id=empleado_id, fecha=fecha))
+    tiempo_real.publicar_al_confirmar([('salida', empleado_id, fecha, hora)])
+    return {
+        'empleado_id': empleado_id,
+        'fecha': fecha,
+        'hora': hora,
+    }
+
+
+def _parsear_evento(evento, ahora):
+    """Valida un evento del lote y devuelve `(rfc, momento_local, direccion)`."""
+    if not isinstance(evento, dict):
+        raise ChecadoError('Evento inválido')
+
+    rfc = normalizar_rfc(str(evento.get('rfc') or ''))
+    if not rfc:
+        raise ChecadoError('Debes indicar un RFC')
+
+    direccion = evento.get('direccion')
+    if direccion not in ('entrada', 'salida'):
+        raise ChecadoError("La dirección debe ser 'entrada' o 'salida'")
+
+    try:
+        momento = parse_datetime(str(evento.get('timestamp') or ''))
+    except ValueError:
+        momento = None
+    if momento is None:
+        raise ChecadoError('Marca de tiempo inválida')
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento, timezone.get_current_timezone())
+
+    if momento > ahora + LOTE_TOLERANCIA_FUTURO:
+        raise ChecadoError('La marca de tiempo está en el futuro')
+    if momento < ahora - datetime.timedelta(days=LOTE_ANTIGUEDAD_MAX_DIAS):
+        raise ChecadoError('La marca de tiempo es demasiado antigua')
+
+    return rfc, timezone.localtime(momento), direccion
+
+
+def _aplicar_lote(validos, resultados):
+    """Aplica los eventos ya validados y escribe con bulk_create/bulk_update.
+
+    Las asistencias existentes se leen con `select_for_update`: un checado
+    individual sobre esas filas (UPDATE condicional) espera a que el lote
+    confirme, así que `bulk_update` no pisa lo que escriba entre la lectura
+    y la escritura. Si un checado crea entretanto una fila nueva, falla el
+    `bulk_create` y `registrar_lote` reintenta.
+    """
+    empleados = resolver_empleado_ids({rfc for _, rfc, _, _ in validos})
+
+    empleado_ids = set(empleados.values())
+    fechas = {momento.date() for _, _, momento, _ in validos}
+    indices = obtener_indices_horarios(empleado_ids)
+    umbral = umbral_retardo()
+
+    with transaction.atomic():
+        existentes = {
+            (a.empleado_id, a.fecha): a
+            for a in Asistencia.objects.select_for_update().filter(empleado_id__in=empleado_ids, fecha__in=fechas)
+        }
+
+        nuevas, modificadas = {}, {}
+        publicadas = []
+        for i, rfc, momento, direccion in validos:
+            empleado_id = empleados.get(rfc)
+            if empleado_id is None:
+                resultados[i].update(status='error', message='No se encontró empleado con ese RFC')
+                continue
+
+            clave = (empleado_id, momento.date())
+            hora = momento.time()
+            asistencia = existentes.get(clave)
+
+            if direccion == 'entrada':
+                if asistencia is None:
+                    asistencia = Asistencia(empleado_id=empleado_id, fecha=clave[1])
+                    existentes[clave] = nuevas[clave] = asistencia
+                if asistencia.hora_entrada == hora:
+                    resultados[i].update(status='duplicado', message='Entrada ya registrada')
+                    continue
+                if asistencia.hora_entrada is not None:
+                    resultados[i].update(status='error', message='Ya existe una entrada registrada ese día')
+                    continue
+                mins = minutos_de_diferencia(indices[empleado_id], momento)
+                asistencia.hora_entrada = hora
+                asistencia.tipo = tipo_por_diferencia(mins, umbral)
+                resultados[i].update(status='registrado', message='Entrada registrada', diferencia_minutos=mins)
+                publicadas.append(('entrada', empleado_id, clave[1], hora, asistencia.tipo, mins))
+            else:
+                if asistencia is None or asistencia.hora_entrada is None:
+                    resultados[i].update(status='error', message='Debes registrar primero tu entrada')
+                    continue
+                if asistencia.hora_salida == hora:
+                    resultados[i].update(status='duplicado', message='Salida ya registrada')
+                    continue
+                if asistencia.hora_salida is not None:
+                    resultados[i].update(status='error', message='Ya existe una salida registrada ese día')
+                    continue
+                asistencia.hora_salida = hora
+                resultados[i].update(status='registrado', message='Salida registrada')
+                publicadas.append(('salida', empleado_id, clave[1], hora, None, None))
+
+            if clave not in nuevas:
+                modificadas[clave] = asistencia
+
+        Asistencia.objects.bulk_create(list(nuevas.values()), batch_size=500)
+        Asistencia.objects.bulk_update(
+            list(modificadas.values()), ['hora_entrada', 'hora_salida', 'tipo'], batch_size=500,
+        )
+        tocadas = nuevas.keys() | modificadas.keys()
+        if tocadas:
+            # bulk_create no devuelve ids en MySQL: se releen por (empleado, fecha)
+            resumen.actualizar(Asistencia.objects.filter(
+                empleado_id__in={e for e, _ in tocadas}, fecha__in={f for _, f in tocadas},
+            ))
+        if publicadas:
+            tiempo_real.publicar_al_confirmar(publicadas)
+
+
+def registrar_lote(eventos):
+    """Registra un lote de checadas `{rfc, timestamp, direccion}` acumuladas por un kiosco.
+
+    Conserva la hora original de cada checada y resuelve todos los RFC con una
+    sola consulta. Es idempotente: reenviar el mismo lote devuelve `duplicado`
+    para los eventos ya aplicados sin modificar nada.
+
+    Devuelve una lista de resultados en el mismo orden que `eventos`.
+    """
+    if len(eventos) > LOTE_MAX_EVENTOS:
+        raise ChecadoError(f'El lote excede el máximo de {LOTE_MAX_EVENTOS} eventos', status=413)
+
+    ahora = timezone.now()
+    resultados = []
+    validos = []
+    for i, evento in enumerate(eventos):
+        resultado = {'indice': i}
+        if isinstance(evento, dict) and evento.get('id') is not None:
+            resultado['id'] = evento['id']
+        resultados.append(resultado)
+        try:
+            rfc, momento, direccion = _parsear_evento(evento, ahora)
+        except ChecadoError as e:
+            resultado.update(status='error', message=e.mensaje)
+            continue
+        validos.append((i, rfc, momento, direccion))
+
+    # Procesar en orden cronológico para que una entrada preceda a su salida
+    validos.sort(key=lambda v: v[2])
+
+    # Un checado individual concurrente puede crear la misma fila entre la
+    # lectura y el bulk_create; en ese caso se reintenta una vez con datos frescos.
+    for intento in range(2):
+        try:
+            _aplicar_lote(validos, resultados)
+            break
+        except IntegrityError:
+            if intento:
+                raise
+            for i, _, _, _ in validos:
+                resultados[i] = {k: v for k, v in resultados[i].items() if k in ('indice', 'id')}
+
+    return resultados
@@ -0,0 +1,117 @@
+"""
+Descarga autorizada de archivos de MEDIA_ROOT (pases, justificantes, exportaciones).
+
+Las vistas verifican permisos y delegan aquí el envío:
+
+- Con `DESCARGAS_X_ACCEL_PREFIX` configurado, la respuesta solo lleva la
+  cabecera `X-Accel-Redirect` y nginx envía el archivo desde una location
+  `internal` (incluidos los rangos); los bytes no pasan por Django.
+- Sin nginx, se usa `FileResponse` (que aprovecha `wsgi.file_wrapper`)
+  y se atienden peticiones `Range` de un solo rango.
+
+En ambos casos se responde `304` a `If-None-Match`/`If-Modified-Since`.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+RANGO_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+TAMANO_BLOQUE = 64 * 1024
+
+
+def _rango(cabecera, tamano):
+    """`(inicio, fin)` inclusivo para un único rango, None si no aplica o 'invalido'."""
+    coincidencia = RANGO_RE.match(cabecera.strip())
+    if not coincidencia:
+        # Varios rangos o unidad desconocida: se ignora y se envía el archivo completo
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # Sufijo: los últimos N bytes
+        inicio, fin = max(tamano - int(fin), 0), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return 'invalido'
+    return inicio, fin
+
+
+def _segmento(ruta, inicio, longitud):
+    with open(ruta, 'rb') as f:
+        f.seek(inicio)
+        while longitud > 0:
+            bloque = f.read(min(TAMANO_BLOQUE, longitud))
+            if not bloque:
+                break
+            longitud -= len(bloque)
+            yield bloque
+
+
+def _disposicion(nombre, adjunto):
+    tipo = 'attachment' if adjunto else 'inline'
+    try:
+        nombre.encode('ascii')
+        return f'{tipo}; filename="{nombre}"'
+    except UnicodeEncodeError:
+        return f"{tipo}; filename*=utf-8''{quote(nombre)}"
+
+
+def servir_archivo(request, nombre_archivo, nombre_descarga=None, adjunto=True, content_type=None):
+    """Respuesta de descarga para `nombre_archivo` (relativo a MEDIA_ROOT)."""
+    if not nombre_archivo:
+        raise Http404('Archivo no encontrado')
+    ruta = default_storage.path(nombre_archivo)
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        raise Http404('Archivo no encontrado')
+
+    nombre_descarga = nombre_descarga or os.path.basename(nombre_archivo)
+    content_type = content_type or mimetypes.guess_type(nombre_descarga)[0] or 'application/octet-stream'
+    etag = quote_etag(f'{estado.st_mtime_ns:x}-{estado.st_size:x}')
+    ultima_modificacion = int(estado.st_mtime)
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+    if no_modificado is not None:
+        return no_modificado
+
+    prefijo = getattr(settings, 'DESCARGAS_X_ACCEL_PREFIX', '')
+    if prefijo:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + quote(nombre_archivo)
+    else:
+        rango = _rango(request.headers.get('Range', ''), estado.st_size)
+        if_range = request.headers.get('If-Range')
+        if rango and if_range and if_range != etag:
+            # El archivo cambió desde que el cliente obtuvo la primera parte
+            rango = None
+
+        if rango == 'invalido':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{estado.st_size}'
+            return response
+        if rango:
+            inicio, fin = rango
+            response = StreamingHttpResponse(
+                _segmento(ruta, inicio, fin - inicio + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+            response['Content-Length'] = str(fin - inicio + 1)
+        else:
+            response = FileResponse(open(ruta, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = _disposicion(nombre_descarga, adjunto)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacion)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,135 @@
+"""
+Exportaciones del reporte de asistencias en segundo plano.
+
+`solicitar_exportacion` registra (o reutiliza) un trabajo `Exportacion` y lo
+encola en el pool local (ver `tareas`); `procesar_exportacion` genera el XLSX
+en MEDIA_ROOT actualizando el progreso. La cola es la propia tabla: el
+comando `procesar_exportaciones` atiende los trabajos pendientes.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from . import tareas
+from .models import Exportacion
+from .reportes import escribir_asistencias_xlsx, filtrar_asistencias
+
+logger = logging.getLogger(__name__)
+
+# Tiempo durante el que un archivo generado se reutiliza para los mismos filtros
+EXPORTACION_VIGENCIA = timedelta(minutes=getattr(settings, 'EXPORTACION_VIGENCIA_MINUTOS', 15))
+# Un trabajo 'procesando' sin actividad durante este tiempo se considera abandonado
+EXPORTACION_ABANDONO = timedelta(minutes=30)
+# Un trabajo 'pendiente' más antiguo que esto se volvió a perder (p. ej. el
+# proceso se reinició antes de ejecutar la tarea) y se encola de nuevo
+EXPORTACION_REENCOLAR = timedelta(minutes=getattr(settings, 'EXPORTACION_REENCOLAR_MINUTOS', 2))
+
+
+def hash_filtros(filtros):
+    return hashlib.sha256(json.dumps(filtros, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _archivo_disponible(exportacion):
+    return bool(exportacion.archivo) and default_storage.exists(exportacion.archivo.name)
+
+
+def solicitar_exportacion(filtros, usuario=None):
+    """Devuelve `(exportacion, creada)` para los filtros dados.
+
+    Si hay un trabajo idéntico en curso o completado dentro de la vigencia,
+    se reutiliza en lugar de generar otro archivo. Un trabajo en curso que
+    lleva demasiado tiempo sin avanzar se vuelve a encolar.
+    """
+    filtros_hash = hash_filtros(filtros)
+    vigentes = Exportacion.objects.filter(filtros_hash=filtros_hash).filter(
+        Q(estado__in=('pendiente', 'procesando'))
+        | Q(estado='completada', fecha_actualizacion__gte=timezone.now() - EXPORTACION_VIGENCIA)
+    )
+    for exportacion in vigentes.order_by('-fecha_creacion')[:1]:
+        if exportacion.estado != 'completada':
+            _reencolar_si_detenida(exportacion)
+            return exportacion, False
+        if _archivo_disponible(exportacion):
+            return exportacion, False
+
+    exportacion = Exportacion.objects.create(filtros=filtros, filtros_hash=filtros_hash, solicitado_por=usuario)
+    tareas.en_segundo_plano(procesar_exportacion, exportacion.pk)
+    return exportacion, True
+
+
+def _reencolar_si_detenida(exportacion):
+    """Vuelve a encolar un trabajo pendiente perdido o uno 'procesando' abandonado.
+
+    El cambio de estado es condicional, así que solo una petición lo encola;
+    si aun así se ejecutara dos veces, `procesar_exportacion` lo reclama una sola.
+    """
+    ahora = timezone.now()
+    detenida = Exportacion.objects.filter(pk=exportacion.pk).filter(
+        Q(estado='pendiente', fecha_actualizacion__lt=ahora - EXPORTACION_REENCOLAR)
+        | Q(estado='procesando', fecha_actualizacion__lt=ahora - EXPORTACION_ABANDONO)
+    )
+    if detenida.update(estado='pendiente', fecha_actualizacion=ahora):
+        exportacion.estado = 'pendiente'
+        tareas.en_segundo_plano(procesar_exportacion, exportacion.pk)
+
+
+def procesar_exportacion(exportacion_id):
+    """Genera el archivo de un trabajo pendiente. Devuelve False si otro worker lo tomó."""
+    # Reclamar el trabajo de forma atómica: solo un worker pasa de pendiente a procesando
+    if not Exportacion.objects.filter(pk=exportacion_id, estado='pendiente').update(
+        estado='procesando', fecha_actualizacion=timezone.now(),
+    ):
+        return False
+
+    exportacion = Exportacion.objects.get(pk=exportacion_id)
+    actualizar = Exportacion.objects.filter(pk=exportacion_id).update
+    nombre = f'exportaciones/asistencias_{exportacion.pk}_{exportacion.filtros_hash[:12]}.xlsx'
+    ruta = default_storage.path(nombre)
+    temporal = ruta + '.tmp'
+    try:
+        asistencias = filtrar_asistencias(exportacion.filtros)
+        actualizar(total=asistencias.count())
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        filas = escribir_asistencias_xlsx(
+            asistencias, temporal,
+            progreso=lambda n: actualizar(progreso=n, fecha_actualizacion=timezone.now()),
+        )
+        os.replace(temporal, ruta)
+        actualizar(estado='completada', archivo=nombre, progreso=filas, fecha_actualizacion=timezone.now())
+    except Exception as e:
+        logger.exception("Error generando la exportación %s", exportacion_id)
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        actualizar(estado='fallida', error=str(e), fecha_actualizacion=timezone.now())
+    return True
+
+
+def procesar_pendientes(limite=None):
+    """Procesa los trabajos pendientes (y recupera los abandonados). Devuelve cuántos tomó."""
+    Exportacion.objects.filter(
+        estado='procesando', fecha_actualizacion__lt=timezone.now() - EXPORTACION_ABANDONO,
+    ).update(estado='pendiente')
+
+    pendientes = Exportacion.objects.filter(estado='pendiente').order_by('fecha_creacion').values_list('pk', flat=True)
+    if limite:
+        pendientes = pendientes[:limite]
+    return sum(1 for pk in list(pendientes) if procesar_exportacion(pk))
+
+
+def limpiar_exportaciones(dias):
+    """Elimina trabajos (y sus archivos) con más de `dias` días de antigüedad."""
+    antiguas = Exportacion.objects.filter(fecha_creacion__lt=timezone.now() - timedelta(days=dias))
+    eliminadas = 0
+    for exportacion in antiguas.exclude(estado='procesando'):
+        if exportacion.archivo:
+            exportacion.archivo.delete(save=False)
+        exportacion.delete()
+        eliminadas += 1
+    return eliminadas
@@ -0,0 +1,138 @@
+"""
+Generación automática de faltas.
+
+Para cada empleado activo se calculan los días laborales esperados a partir
+de su índice semanal de horarios y se comparan, como conjuntos de pares
+(empleado, fecha), con las asistencias existentes; las que faltan se crean
+como `tipo='falta'` con `bulk_create(ignore_conflicts=True)` por bloques, y
+su resumen diario con el mismo upsert que el resto de escrituras
+(`resumen.actualizar`). Los empleados se procesan por grupos para acotar la
+memoria y el tamaño de los `IN (...)`.
+
+No se esperan días anteriores al alta del empleado (`user.date_joined`).
+Los horarios son los vigentes: no hay historial, así que un rango pasado se
+evalúa con los horarios actuales.
+
+Es idempotente: volver a ejecutarlo sobre el mismo rango no crea nada, y un
+checado concurrente que cree la misma fila no provoca error.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metricas, resumen
+from .models import Asistencia, Empleado, mascaras_que_intersectan, obtener_indices_horarios
+
+# Empleados por grupo y filas por INSERT
+FALTAS_EMPLEADOS_POR_GRUPO = getattr(settings, 'FALTAS_EMPLEADOS_POR_GRUPO', 2000)
+FALTAS_TAMANO_INSERT = 1000
+
+
+def mascara_indice(indice):
+    """Días con horario del índice semanal como máscara (bit 0 = Lunes)."""
+    return sum(1 << dia for dia, horario in enumerate(indice) if horario is not None)
+
+
+def rango_fechas(desde, hasta):
+    return [desde + datetime.timedelta(days=n) for n in range((hasta - desde).days + 1)]
+
+
+def dias_esperados(indices, fechas, inicios=None):
+    """Pares `(empleado_id, fecha)` en los que cada empleado debía checar.
+
+    `inicios` es `{empleado_id: fecha}` con el primer día exigible de cada
+    empleado (su alta); los días anteriores no se esperan.
+    Las fechas de cada combinación de días laborales se calculan una sola vez.
+    """
+    inicios = inicios or {}
+    por_mascara = {}
+    esperados = set()
+    for empleado_id, indice in indices.items():
+        mascara = mascara_indice(indice)
+        if not mascara:
+            continue
+        dias = por_mascara.get(mascara)
+        if dias is None:
+            dias = por_mascara[mascara] = [f for f in fechas if mascara & (1 << f.weekday())]
+        inicio = inicios.get(empleado_id)
+        esperados.update((empleado_id, f) for f in dias if inicio is None or f >= inicio)
+    return esperados
+
+
+def _fecha_alta(date_joined):
+    if date_joined is None:
+        return None
+    return timezone.localdate(date_joined) if timezone.is_aware(date_joined) else date_joined.date()
+
+
+def _insertar_faltas(pares):
+    """Crea las faltas `(empleado_id, fecha)`; las que ya existan se ignoran."""
+    pares = sorted(pares)
+    for i in range(0, len(pares), FALTAS_TAMANO_INSERT):
+        Asistencia.objects.bulk_create(
+            [Asistencia(empleado_id=e, fecha=f, tipo='falta') for e, f in pares[i:i + FALTAS_TAMANO_INSERT]],
+            batch_size=FALTAS_TAMANO_INSERT,
+            ignore_conflicts=True,
+        )
+
+
+def _resumir_faltas(empleado_ids, desde, hasta):
+    """Crea el resumen de las faltas del grupo que aún no lo tienen (ver `control.resumen`)."""
+    resumen.actualizar(Asistencia.objects.filter(
+        empleado_id__in=empleado_ids, fecha__gte=desde, fecha__lte=hasta, tipo='falta', resumen__isnull=True,
+    ))
+
+
+def _grupos(valores, tamano):
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+def generar_faltas(desde, hasta=None, empleado_ids=None, progreso=None):
+    """Crea las faltas de los días laborales sin asistencia entre `desde` y `hasta`.
+
+    `hasta` se limita a ayer: el día en curso todavía puede checarse.
+    `empleado_ids` restringe el cálculo a esos empleados (activos). Para cada
+    empleado el rango empieza el día de su alta (`user.date_joined`).
+    `progreso(empleados, creadas)` se llama tras cada grupo.
+    Devuelve el número de faltas creadas (sin descontar las que un checado
+    concurrente haya insertado primero).
+    """
+    ayer = timezone.localdate() - datetime.timedelta(days=1)
+    hasta = min(hasta or ayer, ayer)
+    if desde > hasta:
+        return 0
+    fechas = rango_fechas(desde, hasta)
+
+    # Solo empleados con algún horario que cubra alguno de los días del rango
+    dias = 0
+    for fecha in fechas[:7]:
+        dias |= 1 << fecha.weekday()
+    empleados = Empleado.objects.filter(estado='activo', horarios__dias_mask__in=mascaras_que_intersectan(dias))
+    if empleado_ids is not None:
+        empleados = empleados.filter(pk__in=empleado_ids)
+    altas = {
+        pk: _fecha_alta(date_joined)
+        for pk, date_joined in empleados.order_by('pk').values_list('pk', 'user__date_joined').distinct()
+    }
+    empleados = list(altas)
+
+    creadas = procesados = 0
+    for grupo in _grupos(empleados, FALTAS_EMPLEADOS_POR_GRUPO):
+        esperados = dias_esperados(obtener_indices_horarios(grupo), fechas, altas)
+        asistencias = Asistencia.objects.filter(empleado_id__in=grupo, fecha__gte=desde, fecha__lte=hasta)
+        faltantes = esperados.difference(asistencias.values_list('empleado_id', 'fecha'))
+
+        if faltantes:
+            with transaction.atomic():
+                _insertar_faltas(faltantes)
+                _resumir_faltas(grupo, desde, hasta)
+                metricas.invalidar()
+            creadas += len(faltantes)
+
+        procesados += len(grupo)
+        if progreso:
+            progreso(procesados, creadas)
+    return creadas
@@ -1,10 +1,51 @@
+import re
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.db.models import Q
+from django.urls import reverse, reverse_lazy
 from .models import Empleado, Asistencia, Justificante, Pase
-from .models import Horario
+from .models import Horario, dias_de_mascara, mascara_dias, normalizar_busqueda, normalizar_rfc
 from django.core.exceptions import ValidationError
 
+# RFC al final de una sugerencia del buscador: 'Nombre Apellido (RFC)'
+RFC_DE_SUGERENCIA = re.compile(r'\(([^()]+)\)\s*$')
+
+
+class EmpleadoAutocomplete(forms.HiddenInput):
+    """Campo de empleado con sugerencias de `control:buscar_empleados`.
+
+    Reemplaza al `<select>` con todos los empleados: se envía el id en un
+    campo oculto y solo se consulta el empleado ya elegido (al editar).
+    """
+    template_name = 'control/widgets/empleado_autocomplete.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        empleado = Empleado.objects.filter(pk=value).first() if str(value or '').isdigit() else None
+        context['widget']['texto'] = empleado.etiqueta_busqueda() if empleado else ''
+        context['widget']['url'] = reverse('control:buscar_empleados')
+        return context
+
+
+class EmpleadosAutocomplete(forms.MultipleHiddenInput):
+    """Varios empleados con sugerencias de `control:buscar_empleados`.
+
+    Cada empleado elegido se envía en su propio campo oculto; solo se
+    consultan los ya elegidos (al volver a mostrar el formulario).
+    """
+    template_name = 'control/widgets/empleados_autocomplete.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        ids = [v for v in context['widget']['value'] if str(v).isdigit()]
+        context['widget']['elegidos'] = list(
+            Empleado.objects.filter(pk__in=ids).order_by('nombre', 'apellido') if ids else []
+        )
+        context['widget']['url'] = reverse('control:buscar_empleados')
+        return context
+
 
 class EmpleadoCreationForm(UserCreationForm):
     email = forms.EmailField(required=False)
@@ -52,9 +93,9 @@ class EmpleadoCreationForm(UserCreationForm):
         return user
 
     def clean_rfc(self):
-        rfc = self.cleaned_data.get('rfc')
+        rfc = normalizar_rfc(self.cleaned_data.get('rfc'))
         # If an Empleado with this RFC already exists, raise validation error
-        if rfc and Empleado.objects.filter(rfc__iexact=rfc).exists():
+        if rfc and Empleado.objects.filter(rfc=rfc).exists():
             raise ValidationError('Ya existe un empleado con ese RFC.')
         return rfc
 
@@ -70,6 +111,10 @@ class EmpleadoForm(forms.ModelForm):
             css = field.widget.attrs.get('class', '')
             field.widget.attrs['class'] = (css + ' form-control').strip()
 
+    def clean_rfc(self):
+        # Normalizar antes de la validación de unicidad del ModelForm
+        return normalizar_rfc(self.cleaned_data.get('rfc'))
+
 
 class JustificanteRetardoForm(forms.ModelForm):
     class Meta:
@@ -107,7 +152,10 @@ class HorarioForm(forms.ModelForm):
     required=True,
     widget=forms.TextInput(attrs={
         'class': 'form-control form-control',  
-        'placeholder': 'Escribe el nombre completo o el RFC'
+        'placeholder': 'Escribe el nombre completo o el RFC',
+        'list': 'empleado_busqueda_opciones',
+        'autocomplete': 'off',
+        'data-autocompletar-empleado': reverse_lazy('control:buscar_empleados'),
     })
 )
 
@@ -142,28 +190,31 @@ class HorarioForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Mantener funcionalidad original
         if self.instance and self.instance.pk:
-            dias_val = self.instance.dias_laborales or ''
-            self.fields['dias'].initial = [d.strip() for d in dias_val.split(',') if d.strip()]
+            self.fields['dias'].initial = dias_de_mascara(self.instance.dias_mask)
 
 
     def clean_empleado_busqueda(self):
         texto = self.cleaned_data.get('empleado_busqueda').strip()
 
-        # 1. Buscar por RFC
-        empleado = Empleado.objects.filter(rfc=texto).first()
+        # 1. Buscar por RFC (escrito o de la sugerencia elegida)
+        sugerencia = RFC_DE_SUGERENCIA.search(texto)
+        rfc = sugerencia.group(1) if sugerencia else texto
+        empleado = Empleado.objects.filter(rfc=normalizar_rfc(rfc)).first()
+
+        # 2. Buscar por nombre completo exacto (sin importar acentos ni mayúsculas)
+        if not empleado:
+            termino = normalizar_busqueda(texto)
+            empleado = Empleado.objects.filter(
+                Q(nombre_busqueda=termino) | Q(apellido_busqueda=termino)
+            ).first()
 
-        # 2. Buscar por nombre completo exacto
+        # 3. Inicio de nombre, apellido o RFC que corresponde a un solo empleado
         if not empleado:
-            partes = texto.split()
-            if len(partes) >= 2:
-                nombre = partes[0]
-                apellido = " ".join(partes[1:])
-                empleado = Empleado.objects.filter(
-                    nombre__iexact=nombre,
-                    apellido__iexact=apellido
-                ).first()
-
-        # 3. Si no existe
+            candidatos = Empleado.objects.buscar(texto, limite=2)
+            if len(candidatos) == 1:
+                empleado = candidatos[0]
+
+        # 4. Si no existe
         if not empleado:
             raise forms.ValidationError(
                 "El empleado no esta registrado."
@@ -185,8 +236,9 @@ class HorarioForm(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
 
+        # Siempre en orden de la semana; `Horario.save` calcula `dias_mask`
         dias = self.cleaned_data.get('dias', [])
-        instance.dias_laborales = ','.join(dias)
+        instance.dias_laborales = ','.join(dias_de_mascara(mascara_dias(','.join(dias))))
 
         if commit:
             instance.save()
@@ -204,7 +256,7 @@ class PaseForm(forms.ModelForm):
         model = Pase
         fields = ['empleado', 'tipo', 'folio', 'fecha', 'hora', 'hora_reincorporacion', 'asunto', 'observaciones']
         widgets = {
-            'empleado': forms.Select(attrs={'class': 'form-control'}),
+            'empleado': EmpleadoAutocomplete(attrs={'class': 'form-control'}),
             'tipo': forms.Select(attrs={'class': 'form-control'}),
             'folio': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -264,3 +316,47 @@ class PaseForm(forms.ModelForm):
                 raise ValidationError('La hora de reincorporación debe ser posterior a la hora de entrada/salida.')
         
         return cleaned
+
+
+class PaseLoteForm(forms.Form):
+    """Formulario para emitir el mismo pase a varios empleados a la vez.
+    Los folios se asignan automáticamente (ver `control.pases_lote`).
+    """
+    empleados = forms.ModelMultipleChoiceField(
+        queryset=Empleado.objects.filter(estado='activo').order_by('nombre', 'apellido'),
+        widget=EmpleadosAutocomplete(attrs={'class': 'form-control'}),
+        label='Empleados',
+    )
+    tipo = forms.ChoiceField(
+        choices=Pase.TIPO_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label='Tipo de Pase',
+    )
+    fecha = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}), label='Fecha')
+    hora = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}), label='Hora de Entrada/Salida')
+    hora_reincorporacion = forms.TimeField(
+        required=False,
+        widget=forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+        label='Hora de Reincorporación',
+    )
+    asunto = forms.CharField(
+        max_length=255,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Asunto del pase'}),
+        label='Asunto',
+    )
+    observaciones = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Observaciones (opcional)'}),
+        label='Observaciones',
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        hora = cleaned.get('hora')
+        hora_reincorporacion = cleaned.get('hora_reincorporacion')
+
+        if hora_reincorporacion and hora:
+            if hora_reincorporacion <= hora:
+                raise ValidationError('La hora de reincorporación debe ser posterior a la hora de entrada/salida.')
+
+        return cleaned
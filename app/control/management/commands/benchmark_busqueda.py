@@ -0,0 +1,72 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from control.models import Empleado
+
+from .benchmark_checadas import PREFIJO_RFC, PREFIJO_USUARIO, borrar_empleados_de_prueba
+
+NOMBRES = ['José', 'María', 'Ana', 'Luis', 'Jesús', 'Guadalupe', 'Andrés', 'Sofía', 'Raúl', 'Inés', 'Óscar', 'Elena']
+APELLIDOS = [
+    'Hernández', 'García', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez', 'Ramírez', 'Núñez',
+    'Cruz', 'Gómez', 'Ortiz', 'Álvarez', 'Jiménez', 'Muñoz',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia del buscador de empleados (prefijo de nombre, apellido '
+        'o RFC como rangos sobre las columnas normalizadas e indexadas) con '
+        'empleados sintéticos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empleados', type=int, default=20000, help='Empleados sintéticos')
+        parser.add_argument('--busquedas', type=int, default=2000, help='Búsquedas a medir')
+        parser.add_argument('--limite', type=int, default=10, help='Resultados por búsqueda')
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(20251124)
+        borrar_empleados_de_prueba()
+        User.objects.bulk_create([User(username=f'{PREFIJO_USUARIO}{i}') for i in range(options['empleados'])])
+        usuarios = User.objects.filter(username__startswith=PREFIJO_USUARIO).order_by('pk')
+        empleados = []
+        for i, usuario in enumerate(usuarios):
+            empleado = Empleado(
+                user=usuario, nombre=f'{aleatorio.choice(NOMBRES)} {aleatorio.choice(NOMBRES)}',
+                apellido=f'{aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}',
+                puesto='Prueba', rfc=f'{PREFIJO_RFC}{i:09d}',
+            )
+            empleado.actualizar_busqueda()
+            empleados.append(empleado)
+        Empleado.objects.bulk_create(empleados, batch_size=1000)
+        self.stdout.write(f"{len(empleados)} empleados ({connection.vendor})")
+
+        try:
+            # Lo que escribiría un usuario: inicio del nombre o del apellido, sin acentos o con ellos
+            consultas = []
+            for _ in range(options['busquedas']):
+                empleado = aleatorio.choice(empleados)
+                texto = aleatorio.choice([empleado.nombre, empleado.apellido, empleado.rfc])
+                consultas.append(texto[:aleatorio.randint(2, len(texto))])
+
+            latencias, encontrados = [], 0
+            for texto in consultas:
+                inicio = time.perf_counter()
+                resultados = Empleado.objects.only('pk', 'nombre', 'apellido', 'rfc').buscar(texto, options['limite'])
+                latencias.append(time.perf_counter() - inicio)
+                encontrados += len(resultados)
+
+            latencias.sort()
+            p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+            self.stdout.write(
+                f'  {len(consultas)} búsquedas, {encontrados / len(consultas):.1f} resultados de media\n'
+                f'  latencia p50 {statistics.median(latencias) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms, '
+                f'máx {latencias[-1] * 1000:.2f} ms'
+            )
+        finally:
+            borrar_empleados_de_prueba()
@@ -0,0 +1,145 @@
+import datetime
+import http.client
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from control.models import DIAS_SEMANA, Empleado, Horario
+
+PREFIJO_USUARIO = 'carga_'
+PREFIJO_RFC = 'CARG'
+NOMBRE_HORARIO = 'Prueba de carga'
+
+
+class _Cliente:
+    """Conexión HTTP persistente por hilo con la cookie CSRF del kiosco."""
+
+    def __init__(self, url, csrf):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.puerto = partes.port or 80
+        self.ruta = partes.path.rstrip('/') + '/'
+        self.csrf = csrf
+        self.conexion = None
+
+    def post(self, ruta, datos):
+        cuerpo = urlencode(datos)
+        cabeceras = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Cookie': f'csrftoken={self.csrf}',
+            'X-CSRFToken': self.csrf,
+        }
+        for intento in range(2):
+            if self.conexion is None:
+                self.conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=30)
+            try:
+                self.conexion.request('POST', self.ruta + ruta, cuerpo, cabeceras)
+                respuesta = self.conexion.getresponse()
+                respuesta.read()
+                return respuesta.status
+            except (http.client.HTTPException, OSError):
+                # El servidor cerró la conexión persistente: se reabre una vez
+                self.conexion.close()
+                self.conexion = None
+                if intento:
+                    raise
+
+
+def _obtener_csrf(url):
+    partes = urlsplit(url)
+    conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+    conexion.request('GET', partes.path.rstrip('/') + '/')
+    respuesta = conexion.getresponse()
+    respuesta.read()
+    cookie = SimpleCookie()
+    for valor in respuesta.headers.get_all('Set-Cookie') or []:
+        cookie.load(valor)
+    conexion.close()
+    if 'csrftoken' not in cookie:
+        raise CommandError(f'{url} no devolvió la cookie csrftoken (status {respuesta.status})')
+    return cookie['csrftoken'].value
+
+
+def borrar_empleados_de_prueba():
+    """Borra en cascada empleados, asistencias y resúmenes de la prueba."""
+    User.objects.filter(username__startswith=PREFIJO_USUARIO).delete()
+    Horario.objects.filter(nombre=NOMBRE_HORARIO).delete()
+
+
+def crear_empleados_de_prueba(cantidad):
+    """Crea `cantidad` empleados con horario todos los días; devuelve sus RFC."""
+    # Restos de una ejecución anterior
+    borrar_empleados_de_prueba()
+    horario = Horario.objects.create(
+        nombre=NOMBRE_HORARIO, dias_laborales=','.join(DIAS_SEMANA),
+        hora_entrada=datetime.time(8, 0), hora_salida=datetime.time(16, 0),
+    )
+    User.objects.bulk_create([User(username=f'{PREFIJO_USUARIO}{i}') for i in range(cantidad)])
+    usuarios = User.objects.filter(username__startswith=PREFIJO_USUARIO).order_by('pk')
+    empleados = [
+        Empleado(user=u, nombre='Carga', apellido=str(i), puesto='Prueba', rfc=f'{PREFIJO_RFC}{i:09d}')
+        for i, u in enumerate(usuarios)
+    ]
+    for empleado in empleados:
+        empleado.actualizar_busqueda()
+    Empleado.objects.bulk_create(empleados)
+    empleados = Empleado.objects.filter(rfc__startswith=PREFIJO_RFC).order_by('pk')
+    horario.empleados.add(*empleados)
+    return list(empleados.values_list('rfc', flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de los endpoints de checado: crea empleados de prueba, '
+        'envía entradas y salidas concurrentes a un servidor en marcha y reporta '
+        'checadas por segundo y latencias. Sirve para comparar runserver con gunicorn.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:80/control/', help='URL base de la app control')
+        parser.add_argument('--empleados', type=int, default=500, help='Empleados de prueba (2 checadas cada uno)')
+        parser.add_argument('--concurrencia', type=int, default=16, help='Peticiones simultáneas')
+        parser.add_argument('--conservar', action='store_true', help='No borrar los empleados de prueba al terminar')
+
+    def handle(self, *args, **options):
+        rfcs = crear_empleados_de_prueba(options['empleados'])
+        try:
+            csrf = _obtener_csrf(options['url'])
+            for ruta in ('entrada/', 'salida/'):
+                self._medir(options['url'], csrf, ruta, rfcs, options['concurrencia'])
+        finally:
+            if not options['conservar']:
+                borrar_empleados_de_prueba()
+
+    def _medir(self, url, csrf, ruta, rfcs, concurrencia):
+        local = threading.local()
+
+        def checar(rfc):
+            if not hasattr(local, 'cliente'):
+                local.cliente = _Cliente(url, csrf)
+            inicio = time.perf_counter()
+            status = local.cliente.post(ruta, {'rfc': rfc})
+            return status, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            resultados = list(pool.map(checar, rfcs))
+        total = time.perf_counter() - inicio
+
+        latencias = sorted(t for _, t in resultados)
+        errores = sum(1 for status, _ in resultados if status != 200)
+        percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+        self.stdout.write(self.style.MIGRATE_HEADING(f'POST {ruta} ({len(rfcs)} peticiones, {concurrencia} simultáneas)'))
+        self.stdout.write(f'  {len(rfcs) / total:8.1f} checadas/s')
+        self.stdout.write(
+            f'  latencia p50 {statistics.median(latencias) * 1000:.1f} ms, '
+            f'p95 {percentil(0.95):.1f} ms, p99 {percentil(0.99):.1f} ms'
+        )
+        if errores:
+            self.stdout.write(self.style.WARNING(f'  {errores} respuestas con error'))
@@ -0,0 +1,113 @@
+import queue
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from control import checkin
+from control.models import Asistencia
+
+from .benchmark_checadas import borrar_empleados_de_prueba, crear_empleados_de_prueba
+
+# CONN_MAX_AGE de cada modo sin pool
+MODOS = {'cerrar': 0, 'persistente': 600}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia del checado con y sin reutilización de conexiones. '
+        'Cada checada se ejecuta como una petición (señales request_started / '
+        'request_finished) contra la base de datos configurada. Con DB_POOL=True '
+        'mide el pool; sin él compara CONN_MAX_AGE=0 con conexiones persistentes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empleados', type=int, default=300, help='Empleados de prueba (2 checadas cada uno)')
+        parser.add_argument('--concurrencia', type=int, default=8, help='Hilos simultáneos (como hilos de un worker)')
+        parser.add_argument('--modos', default=','.join(MODOS), help='Modos sin pool a medir: cerrar, persistente')
+
+    def handle(self, *args, **options):
+        ajustes = connections.settings['default']
+        if 'dj_db_conn_pool' in ajustes['ENGINE']:
+            modos = {'pool': ajustes['CONN_MAX_AGE']}
+        else:
+            nombres = [m.strip() for m in options['modos'].split(',') if m.strip()]
+            desconocidos = set(nombres) - set(MODOS)
+            if desconocidos:
+                raise CommandError(f"Modos desconocidos: {', '.join(sorted(desconocidos))}")
+            modos = {m: MODOS[m] for m in nombres}
+
+        self.stdout.write(f"Motor: {ajustes['ENGINE']} (CONN_HEALTH_CHECKS={ajustes['CONN_HEALTH_CHECKS']})")
+        rfcs = crear_empleados_de_prueba(options['empleados'])
+        original = ajustes['CONN_MAX_AGE']
+        try:
+            for modo, max_age in modos.items():
+                # Las conexiones nuevas toman CONN_MAX_AGE de este diccionario
+                ajustes['CONN_MAX_AGE'] = max_age
+                connections.close_all()
+                Asistencia.objects.filter(empleado__rfc__in=rfcs).delete()
+                for direccion, funcion in (('entrada', checkin.registrar_entrada), ('salida', checkin.registrar_salida)):
+                    self._medir(f'{modo} (CONN_MAX_AGE={max_age})', direccion, funcion, rfcs, options['concurrencia'])
+        finally:
+            ajustes['CONN_MAX_AGE'] = original
+            connections.close_all()
+            borrar_empleados_de_prueba()
+
+    def _medir(self, modo, direccion, funcion, rfcs, concurrencia):
+        pendientes = queue.Queue()
+        for rfc in rfcs:
+            pendientes.put(rfc)
+        latencias, conexiones = [], []
+        candado = threading.Lock()
+
+        def contar_conexion(sender, connection, **kwargs):
+            # Solo las de las "peticiones", no las del pool de tareas
+            if threading.current_thread() in hilos:
+                with candado:
+                    conexiones.append(connection.alias)
+
+        def trabajador():
+            propias = []
+            try:
+                while True:
+                    try:
+                        rfc = pendientes.get_nowait()
+                    except queue.Empty:
+                        break
+                    inicio = time.perf_counter()
+                    # Mismo ciclo que una petición: close_old_connections al inicio y al final
+                    request_started.send(sender=self.__class__)
+                    try:
+                        funcion(rfc)
+                    finally:
+                        request_finished.send(sender=self.__class__)
+                    propias.append(time.perf_counter() - inicio)
+            finally:
+                connections.close_all()
+                with candado:
+                    latencias.extend(propias)
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+        connection_created.connect(contar_conexion)
+        try:
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            total = time.perf_counter() - inicio
+        finally:
+            connection_created.disconnect(contar_conexion)
+
+        latencias.sort()
+        percentil = lambda p: latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{modo}: {direccion} ({len(latencias)} checadas)'))
+        self.stdout.write(f'  {len(latencias) / total:8.1f} checadas/s, {len(conexiones)} conexiones abiertas')
+        self.stdout.write(
+            f'  latencia p50 {statistics.median(latencias) * 1000:.2f} ms, '
+            f'p95 {percentil(0.95):.2f} ms, p99 {percentil(0.99):.2f} ms'
+        )
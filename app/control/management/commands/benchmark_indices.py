@@ -0,0 +1,267 @@
+import datetime
+import os
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from control.models import Asistencia, Empleado, Horario, Justificante, Pase, normalizar_busqueda
+
+
+# Índices añadidos en 0012_indices_compuestos: se miden sin ellos y con ellos
+INDICES_MEDIDOS = {
+    Asistencia: ['asistencia_tipo_fecha_idx'],
+    Justificante: ['justificante_estado_envio_idx'],
+    Pase: ['pase_tipo_creacion_idx', 'pase_empleado_creacion_idx'],
+}
+
+# Tablas que necesita el benchmark, en orden de creación
+MODELOS = [ContentType, Permission, Group, User, Horario, Empleado, Asistencia, Justificante, Pase]
+
+ALIAS = 'benchmark'
+LOTE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra asistencias, justificantes y pases en una base de datos aparte y '
+        'compara planes de ejecución y tiempos de las consultas principales '
+        'sin y con los índices compuestos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=2_000_000, help='Número de asistencias a sembrar')
+        parser.add_argument('--empleados', type=int, default=2000, help='Número de empleados')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por consulta (se reporta la mediana)')
+        parser.add_argument(
+            '--motor', choices=['sqlite', 'mysql'], default='sqlite',
+            help='sqlite: archivo local; mysql: mismo servidor que DATABASES["default"]',
+        )
+        parser.add_argument('--archivo', default='/tmp/benchmark_indices.sqlite3', help='Archivo SQLite (se recrea)')
+        parser.add_argument('--base', help='Base de datos MySQL/MariaDB vacía a usar con --motor mysql')
+        parser.add_argument('--conservar', action='store_true', help='No borrar las tablas al terminar')
+
+    def handle(self, *args, **options):
+        conexion = self._conectar(options)
+        try:
+            self._crear_tablas(conexion)
+            inicio = time.perf_counter()
+            self._sembrar(conexion, options['filas'], options['empleados'])
+            self.stdout.write(f'Datos sembrados en {time.perf_counter() - inicio:.1f} s')
+
+            consultas = self._consultas(options['empleados'])
+            self._eliminar_indices(conexion)
+            self._analizar(conexion)
+            antes = self._medir('Sin índices compuestos', consultas, options['repeticiones'])
+            self._crear_indices(conexion)
+            self._analizar(conexion)
+            despues = self._medir('Con índices compuestos', consultas, options['repeticiones'])
+
+            self.stdout.write(self.style.MIGRATE_HEADING('\nResumen (mediana, ms)'))
+            for nombre in consultas:
+                self.stdout.write(f'  {nombre:<45} {antes[nombre]:>10.2f} -> {despues[nombre]:>10.2f}')
+        finally:
+            if not options['conservar']:
+                self._borrar_tablas(conexion)
+            conexion.close()
+
+    # -- Conexión -----------------------------------------------------------
+
+    def _conectar(self, options):
+        if options['motor'] == 'sqlite':
+            if os.path.exists(options['archivo']):
+                os.remove(options['archivo'])
+            config = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': options['archivo']}
+        else:
+            if not options['base']:
+                raise CommandError('Con --motor mysql indica una base de datos vacía con --base')
+            config = dict(connections.settings['default'], NAME=options['base'])
+        configuradas = connections.configure_settings({'default': connections.settings['default'], ALIAS: config})
+        connections.settings[ALIAS] = configuradas[ALIAS]
+        conexion = connections[ALIAS]
+        existentes = set(conexion.introspection.table_names())
+        ocupadas = existentes & {m._meta.db_table for m in MODELOS}
+        if ocupadas:
+            raise CommandError(f'La base de datos ya contiene tablas del sistema: {", ".join(sorted(ocupadas))}')
+        return conexion
+
+    def _crear_tablas(self, conexion):
+        with conexion.schema_editor() as editor:
+            for modelo in MODELOS:
+                editor.create_model(modelo)
+
+    def _borrar_tablas(self, conexion):
+        with conexion.schema_editor() as editor:
+            for modelo in reversed(MODELOS):
+                editor.delete_model(modelo)
+
+    def _eliminar_indices(self, conexion):
+        with conexion.schema_editor() as editor:
+            for modelo, nombres in INDICES_MEDIDOS.items():
+                for indice in modelo._meta.indexes:
+                    if indice.name in nombres:
+                        editor.remove_index(modelo, indice)
+
+    def _crear_indices(self, conexion):
+        inicio = time.perf_counter()
+        with conexion.schema_editor() as editor:
+            for modelo, nombres in INDICES_MEDIDOS.items():
+                for indice in modelo._meta.indexes:
+                    if indice.name in nombres:
+                        editor.add_index(modelo, indice)
+        self.stdout.write(f'\nÍndices creados en {time.perf_counter() - inicio:.1f} s')
+
+    def _analizar(self, conexion):
+        """Actualiza las estadísticas para que el optimizador vea los índices nuevos."""
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            else:
+                for modelo in INDICES_MEDIDOS:
+                    cursor.execute(f'ANALYZE TABLE {conexion.ops.quote_name(modelo._meta.db_table)}')
+                    cursor.fetchall()
+
+    # -- Datos --------------------------------------------------------------
+
+    def _insertar(self, conexion, modelo, columnas, filas):
+        tabla = conexion.ops.quote_name(modelo._meta.db_table)
+        nombres = ', '.join(conexion.ops.quote_name(c) for c in columnas)
+        marcas = ', '.join(['%s'] * len(columnas))
+        sql = f'INSERT INTO {tabla} ({nombres}) VALUES ({marcas})'
+        # Conversión de cada valor al formato del backend, como haría el ORM
+        campos = [modelo._meta.get_field(c) for c in columnas]
+        bloque = []
+        with transaction.atomic(using=ALIAS), conexion.cursor() as cursor:
+            for fila in filas:
+                bloque.append([c.get_db_prep_save(v, conexion) for c, v in zip(campos, fila)])
+                if len(bloque) == LOTE:
+                    cursor.executemany(sql, bloque)
+                    bloque = []
+            if bloque:
+                cursor.executemany(sql, bloque)
+
+    def _sembrar(self, conexion, total, num_empleados):
+        azar = random.Random(2025)
+        ahora = datetime.datetime(2025, 1, 1, 8, 0, tzinfo=datetime.timezone.utc)
+        dias = max(1, total // num_empleados)
+
+        self._insertar(conexion, User, [
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+            'email', 'is_staff', 'is_active', 'date_joined',
+        ], (
+            (i, '!', False, f'bench{i}', '', '', '', False, True, ahora)
+            for i in range(1, num_empleados + 1)
+        ))
+        self._insertar(conexion, Empleado, [
+            'id', 'user_id', 'nombre', 'apellido', 'puesto', 'estado', 'rfc', 'nombre_busqueda', 'apellido_busqueda',
+        ], (
+            (
+                i, i, f'Nombre{i}', f'Apellido{i}', 'Puesto', 'activo', f'BENC{i:09d}',
+                normalizar_busqueda(f'Nombre{i} Apellido{i}'), normalizar_busqueda(f'Apellido{i} Nombre{i}'),
+            )
+            for i in range(1, num_empleados + 1)
+        ))
+
+        inicio = datetime.date(2025, 1, 1) - datetime.timedelta(days=dias)
+        tipos = ['normal'] * 80 + ['retardo'] * 12 + ['falta'] * 6 + ['justificada'] * 2
+
+        def asistencias():
+            pk = 0
+            for d in range(dias):
+                fecha = inicio + datetime.timedelta(days=d)
+                for empleado in range(1, num_empleados + 1):
+                    pk += 1
+                    tipo = azar.choice(tipos)
+                    entrada = salida = None
+                    if tipo in ('normal', 'retardo'):
+                        entrada = datetime.time(7 + azar.randint(0, 1), azar.randint(0, 59))
+                        salida = datetime.time(15, azar.randint(0, 59))
+                    yield pk, empleado, fecha, entrada, salida, tipo
+
+        self._insertar(conexion, Asistencia, ['id', 'empleado_id', 'fecha', 'hora_entrada', 'hora_salida', 'tipo'], asistencias())
+
+        # Un justificante por cada ~20 asistencias y un pase por cada ~20
+        filas = dias * num_empleados
+        estados = ['pendiente'] * 10 + ['aprobado'] * 60 + ['rechazado'] * 30
+        self._insertar(conexion, Justificante, ['empleado_id', 'asistencia_id', 'fecha_envio', 'estado'], (
+            (
+                (pk - 1) % num_empleados + 1, pk,
+                ahora - datetime.timedelta(minutes=filas - pk), azar.choice(estados),
+            )
+            for pk in range(1, filas + 1, 20)
+        ))
+        self._insertar(conexion, Pase, [
+            'empleado_id', 'tipo', 'folio', 'fecha', 'hora', 'asunto', 'creado_por_id', 'fecha_creacion',
+            'pdf_estado', 'pdf_intentos',
+        ], (
+            (
+                azar.randint(1, num_empleados), azar.choice(['entrada', 'salida']), f'B-{n}',
+                ahora.date(), datetime.time(10), 'Asunto', None,
+                ahora - datetime.timedelta(minutes=n), 'listo', 0,
+            )
+            for n in range(filas // 20)
+        ))
+
+    # -- Medición -----------------------------------------------------------
+
+    def _consultas(self, num_empleados):
+        hasta = datetime.date(2025, 1, 1)
+        desde = hasta - datetime.timedelta(days=30)
+        empleado = num_empleados // 2
+        asistencias = Asistencia.objects.using(ALIAS)
+        justificantes = Justificante.objects.using(ALIAS)
+        pases = Pase.objects.using(ALIAS)
+        return {
+            'Asistencias retardo, último mes (conteo)': lambda: asistencias.filter(
+                tipo='retardo', fecha__range=(desde, hasta)).count(),
+            'Asistencias retardo, último mes (página)': lambda: list(asistencias.filter(
+                tipo='retardo', fecha__range=(desde, hasta)).order_by('-fecha')[:50]),
+            'Asistencias de un empleado, último mes': lambda: list(asistencias.filter(
+                empleado_id=empleado, fecha__range=(desde, hasta))),
+            'Asistencias por rango de fecha (conteo)': lambda: asistencias.filter(
+                fecha__range=(desde, hasta)).count(),
+            'Justificantes pendientes (página)': lambda: list(justificantes.filter(
+                estado='pendiente').order_by('-fecha_envio')[:50]),
+            'Justificantes pendientes (conteo)': lambda: justificantes.filter(estado='pendiente').count(),
+            'Pases de salida (página)': lambda: list(pases.filter(
+                tipo='salida').order_by('-fecha_creacion')[:50]),
+            'Pases de un empleado (página)': lambda: list(pases.filter(
+                empleado_id=empleado).order_by('-fecha_creacion')[:50]),
+        }
+
+    def _plan(self, consulta):
+        """Plan de la consulta capturando el SQL que genera el queryset."""
+        conexion = connections[ALIAS]
+        capturadas = []
+
+        def capturar(execute, sql, params, many, context):
+            capturadas.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with conexion.execute_wrapper(capturar):
+            consulta()
+        sql, params = capturadas[-1]
+        prefijo = 'EXPLAIN QUERY PLAN ' if conexion.vendor == 'sqlite' else 'EXPLAIN '
+        with conexion.cursor() as cursor:
+            cursor.execute(prefijo + sql, params)
+            return [' | '.join(str(c) for c in fila) for fila in cursor.fetchall()]
+
+    def _medir(self, titulo, consultas, repeticiones):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{titulo}'))
+        resultados = {}
+        for nombre, consulta in consultas.items():
+            consulta()  # calentar caché de páginas
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                consulta()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nombre] = statistics.median(tiempos)
+            self.stdout.write(f'  {nombre}: {resultados[nombre]:.2f} ms')
+            for linea in self._plan(consulta):
+                self.stdout.write(f'      {linea}')
+        return resultados
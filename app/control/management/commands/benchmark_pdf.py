@@ -0,0 +1,76 @@
+import datetime
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from control import utils_pdf
+from control.models import Empleado, Pase
+
+
+def crear_template_sintetico(ruta, titulo):
+    """Template de una página parecido al real: recuadros, etiquetas y líneas."""
+    ancho, alto = letter
+    can = canvas.Canvas(ruta, pagesize=letter)
+    for base in (alto * 0.55, alto * 0.12):
+        can.rect(ancho * 0.08, base, ancho * 0.84, alto * 0.36)
+        can.setFont("Helvetica-Bold", 14)
+        can.drawCentredString(ancho / 2, base + alto * 0.33, titulo)
+        can.setFont("Helvetica", 10)
+        for i, etiqueta in enumerate(['FOLIO:', 'NOMBRE:', 'HORA:', 'FECHA:', 'ASUNTO:', 'OBSERVACIONES:']):
+            y = base + alto * (0.28 - i * 0.035)
+            can.drawString(ancho * 0.1, y, etiqueta)
+            can.line(ancho * 0.25, y - 2, ancho * 0.9, y - 2)
+    can.save()
+
+
+class Command(BaseCommand):
+    help = 'Mide pases por segundo generados con y sin la caché de templates PDF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pases', type=int, default=200, help='Pases a generar en cada medición')
+        parser.add_argument(
+            '--sintetico', action='store_true',
+            help='Usar templates generados en un directorio temporal aunque existan los reales',
+        )
+
+    def handle(self, *args, **options):
+        pase = Pase(
+            empleado=Empleado(nombre='María', apellido='López Hernández'),
+            tipo='salida', folio='S-2025-000001', fecha=datetime.date(2025, 11, 24),
+            hora=datetime.time(12, 30), hora_reincorporacion=datetime.time(13, 15),
+            asunto='Trámite personal', observaciones='Regresa después de la comida',
+        )
+        with tempfile.TemporaryDirectory() as media:
+            os.makedirs(os.path.join(media, 'pases_form'))
+            for tipo, nombre in utils_pdf.TEMPLATES_PASE.items():
+                crear_template_sintetico(os.path.join(media, 'pases_form', nombre), f'PASE DE {tipo.upper()}')
+
+            ajustes = {'MEDIA_ROOT': media} if options['sintetico'] else {}
+            with override_settings(**ajustes):
+                for tipo in utils_pdf.TEMPLATES_PASE:
+                    pase.tipo = tipo
+                    self.stdout.write(self.style.MIGRATE_HEADING(f'Pase de {tipo}'))
+                    try:
+                        sin_cache = self._medir(pase, options['pases'], limpiar=True)
+                    except FileNotFoundError as e:
+                        self.stderr.write(f'{e} (usa --sintetico)')
+                        return
+                    con_cache = self._medir(pase, options['pases'], limpiar=False)
+                    self.stdout.write(f'  Sin caché de templates: {sin_cache:8.1f} pases/s')
+                    self.stdout.write(f'  Con caché de templates: {con_cache:8.1f} pases/s')
+            utils_pdf.limpiar_cache_templates()
+
+    def _medir(self, pase, cantidad, limpiar):
+        utils_pdf.generar_pase_pdf(pase)
+        inicio = time.perf_counter()
+        for _ in range(cantidad):
+            if limpiar:
+                # Mismo trabajo que antes: leer e interpretar el template en cada pase
+                utils_pdf.limpiar_cache_templates()
+            utils_pdf.generar_pase_pdf(pase)
+        return cantidad / (time.perf_counter() - inicio)
@@ -0,0 +1,69 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from control import puntualidad
+from control.models import Horario, compilar_indice_horarios, mascara_dias
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide asistencias por segundo del cálculo de puntualidad en bloque '
+        '(NumPy y bucle de Python) con datos sintéticos, sin base de datos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=1_000_000, help='Asistencias sintéticas')
+        parser.add_argument('--empleados', type=int, default=5000, help='Empleados distintos')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se reporta la mejor')
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(20251124)
+        # Sin guardar: `dias_mask` se calcula aquí en lugar de en `Horario.save`
+        horarios = [
+            Horario(dias_mask=mascara_dias(dias), hora_entrada=hora)
+            for dias, hora in (
+                ('Lunes,Martes,Miércoles,Jueves,Viernes', datetime.time(8, 0)),
+                ('Lunes,Miércoles,Viernes', datetime.time(9, 30)),
+                ('Sábado,Domingo', datetime.time(7, 0)),
+            )
+        ]
+        indices = {
+            pk: compilar_indice_horarios(aleatorio.sample(horarios, aleatorio.randint(0, 2)))
+            for pk in range(1, options['empleados'] + 1)
+        }
+        tabla = puntualidad.tabla_entradas(indices)
+
+        n = options['filas']
+        empleado_ids = [aleatorio.randint(1, options['empleados']) for _ in range(n)]
+        dias = [aleatorio.randrange(7) for _ in range(n)]
+        entradas = [None if aleatorio.random() < 0.05 else aleatorio.uniform(6 * 3600, 11 * 3600) for _ in range(n)]
+        self.stdout.write(f'{n} asistencias, {len(indices)} empleados')
+
+        caminos = [('python', puntualidad._minutos_python)]
+        if puntualidad.np is not None:
+            np = puntualidad.np
+            # Columnas ya como arreglos, como las deja una consulta con `values_list`
+            columnas = (np.asarray(empleado_ids), np.asarray(dias), np.asarray(entradas, dtype=np.float64))
+            caminos.insert(0, ('numpy', lambda *_: puntualidad._minutos_numpy(*columnas, tabla)))
+        else:
+            self.stdout.write(self.style.WARNING('NumPy no está instalado: solo se mide el bucle de Python'))
+
+        for nombre, funcion in caminos:
+            mejor = min(self._medir(funcion, empleado_ids, dias, entradas, tabla) for _ in range(options['repeticiones']))
+            self.stdout.write(f'  {nombre:8} {mejor * 1000:8.1f} ms  {n / mejor:14,.0f} filas/s')
+
+        inicio = time.perf_counter()
+        minutos = puntualidad.minutos_columnas(empleado_ids, dias, entradas, tabla)
+        if puntualidad.np is not None:
+            minutos = minutos.tolist()
+        puntualidad.etiquetas([None if m != m else int(m) for m in minutos])
+        total = time.perf_counter() - inicio
+        self.stdout.write(f'  {"etiquetas":8} {total * 1000:8.1f} ms  {n / total:14,.0f} filas/s (minutos + texto)')
+
+    def _medir(self, funcion, *args):
+        inicio = time.perf_counter()
+        funcion(*args)
+        return time.perf_counter() - inicio
@@ -0,0 +1,51 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from control.faltas import generar_faltas
+
+
+def _fecha(valor, nombre):
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise CommandError(f'Fecha inválida para --{nombre}: {valor}')
+    return fecha
+
+
+class Command(BaseCommand):
+    help = (
+        'Registra como falta los días laborales sin asistencia. Pensado para '
+        'ejecutarse a diario (cron) sobre el día anterior; es idempotente.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (YYYY-MM-DD); por defecto ayer')
+        parser.add_argument('--hasta', help='Fecha final (YYYY-MM-DD); como máximo ayer')
+        parser.add_argument('--dias', type=int, help='Revisar los últimos N días (en lugar de --desde)')
+        parser.add_argument('--empleado', type=int, action='append', help='Limitar a este empleado (repetible)')
+
+    def handle(self, *args, **options):
+        ayer = timezone.localdate() - datetime.timedelta(days=1)
+        hasta = _fecha(options['hasta'], 'hasta') if options['hasta'] else ayer
+        if options['desde']:
+            desde = _fecha(options['desde'], 'desde')
+        elif options['dias']:
+            desde = hasta - datetime.timedelta(days=options['dias'] - 1)
+        else:
+            desde = hasta
+
+        inicio = time.perf_counter()
+        creadas = generar_faltas(
+            desde, hasta, empleado_ids=options['empleado'],
+            progreso=lambda n, c: self.stdout.write(f'  {n} empleados revisados, {c} faltas'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{creadas} faltas registradas del {desde} al {min(hasta, ayer)} '
+            f'en {time.perf_counter() - inicio:.1f} s'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from control.exportaciones import limpiar_exportaciones, procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos de exportación pendientes (cola en base de datos).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true', help='Seguir atendiendo la cola indefinidamente')
+        parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre revisiones en modo continuo')
+        parser.add_argument('--limpiar-dias', type=int, default=None, help='Eliminar exportaciones con más de N días')
+
+    def handle(self, *args, **options):
+        if options['limpiar_dias'] is not None:
+            eliminadas = limpiar_exportaciones(options['limpiar_dias'])
+            self.stdout.write(f'Exportaciones eliminadas: {eliminadas}')
+
+        while True:
+            procesadas = procesar_pendientes()
+            if procesadas:
+                self.stdout.write(f'Exportaciones procesadas: {procesadas}')
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
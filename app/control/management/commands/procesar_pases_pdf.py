@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from control import pases_lote, pases_pdf
+
+
+class Command(BaseCommand):
+    help = 'Genera los PDFs de pases y de lotes que quedaron pendientes (p. ej. tras reiniciar el servidor).'
+
+    def handle(self, *args, **options):
+        # Primero los lotes, que también generan el PDF de cada uno de sus pases
+        lotes = pases_lote.procesar_pendientes()
+        generados = pases_pdf.procesar_pendientes()
+        self.stdout.write(f'Lotes de pases generados: {lotes}')
+        self.stdout.write(f'PDFs de pases generados: {generados}')
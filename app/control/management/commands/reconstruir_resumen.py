@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from control.resumen import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Regenera el resumen diario de asistencias (ResumenAsistencia) a partir de las asistencias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (YYYY-MM-DD)')
+        parser.add_argument('--bloque', type=int, default=None, help='Asistencias por bloque')
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for nombre in ('desde', 'hasta'):
+            valor = options[nombre]
+            if valor:
+                try:
+                    fechas[nombre] = parse_date(valor)
+                except ValueError:
+                    fechas[nombre] = None
+                if fechas[nombre] is None:
+                    raise CommandError(f'Fecha inválida para --{nombre}: {valor}')
+
+        total = reconstruir(
+            tamano=options['bloque'],
+            progreso=lambda n: self.stdout.write(f'  {n} asistencias procesadas'),
+            **fechas,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Resumen reconstruido para {total} asistencias'))
@@ -0,0 +1,70 @@
+"""
+Métricas del dashboard de administración cacheadas por versión de datos.
+
+Los conteos de empleados y los totales del día se guardan en la caché bajo
+una clave que incluye la versión de datos actual. Cualquier escritura que
+los afecte llama a `invalidar()`: las señales de Empleado, Horario,
+Asistencia y Justificante, y `resumen.guardar` / `faltas` para las
+escrituras que no pasan por `save()` (`update`, `bulk_*`, SQL directo).
+Mientras no cambie nada, el dashboard no consulta la base de datos.
+
+La versión se incrementa al confirmar la transacción, para que nadie
+guarde en caché datos anteriores bajo la versión nueva. Con varios
+procesos la caché debe ser compartida (ver `REDIS_URL`).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import resumen
+from .models import Empleado
+
+# Límite de vida de las métricas aunque no cambie la versión
+DASHBOARD_TTL = getattr(settings, 'DASHBOARD_TTL', 300)
+
+CLAVE_VERSION = 'control:datos:version'
+
+
+def version_datos():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Arranca desde el reloj para no reutilizar claves de una caché anterior
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def _incrementar():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def invalidar():
+    """Marca como obsoletas las métricas cacheadas (al confirmar la transacción)."""
+    transaction.on_commit(_incrementar)
+
+
+def _contar_empleados():
+    return Empleado.objects.aggregate(
+        total=Count('pk', distinct=True),
+        activos=Count('pk', filter=Q(estado='activo'), distinct=True),
+        sin_horario=Count('pk', filter=Q(horarios__isnull=True), distinct=True),
+    )
+
+
+def dashboard(fecha):
+    """`{empleados: {total, activos, sin_horario}, hoy: totales_del_dia}`."""
+    clave = f'control:dashboard:{version_datos()}:{fecha.isoformat()}'
+    metricas = cache.get(clave)
+    if metricas is None:
+        metricas = {
+            'empleados': _contar_empleados(),
+            'hoy': resumen.totales_del_dia(fecha),
+        }
+        cache.set(clave, metricas, DASHBOARD_TTL)
+    return metricas
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def normalizar_rfcs(apps, schema_editor):
+    """Guardar los RFC existentes en forma canónica (mayúsculas, sin espacios)."""
+    Empleado = apps.get_model('control', 'Empleado')
+    existentes = set(Empleado.objects.values_list('rfc', flat=True))
+    for empleado in Empleado.objects.all().only('pk', 'rfc'):
+        canonico = ''.join((empleado.rfc or '').split()).upper()
+        if canonico == empleado.rfc:
+            continue
+        # Si ya existe la forma canónica (duplicado que solo difería en mayúsculas)
+        # se deja tal cual para no violar el índice único; debe resolverse a mano.
+        if canonico in existentes:
+            continue
+        existentes.discard(empleado.rfc)
+        existentes.add(canonico)
+        Empleado.objects.filter(pk=empleado.pk).update(rfc=canonico)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0008_pase'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_rfcs, migrations.RunPython.noop),
+    ]
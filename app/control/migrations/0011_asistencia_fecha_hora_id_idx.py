@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0010_exportacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['fecha', 'hora_entrada', 'id'], name='asistencia_fecha_hora_id_idx'),
+        ),
+    ]
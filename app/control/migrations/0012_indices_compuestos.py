@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 15:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0011_asistencia_fecha_hora_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asistencia',
+            index=models.Index(fields=['tipo', 'fecha'], name='asistencia_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='justificante',
+            index=models.Index(fields=['estado', '-fecha_envio'], name='justificante_estado_envio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pase',
+            index=models.Index(fields=['tipo', '-fecha_creacion'], name='pase_tipo_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pase',
+            index=models.Index(fields=['empleado', '-fecha_creacion'], name='pase_empleado_creacion_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 15:31
+
+from django.db import migrations, models
+
+
+def marcar_existentes(apps, schema_editor):
+    # Los pases anteriores ya tienen su PDF generado de forma síncrona
+    Pase = apps.get_model('control', 'Pase')
+    Pase.objects.exclude(pdf_generado='').exclude(pdf_generado__isnull=True).update(pdf_estado='listo')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0012_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pase',
+            name='pdf_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pase',
+            name='pdf_estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('listo', 'Listo'), ('fallido', 'Fallido')], default='pendiente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='pase',
+            name='pdf_intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(marcar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 15:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0013_pase_pdf_estado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenAsistencia',
+            fields=[
+                ('asistencia', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='control.asistencia')),
+                ('fecha', models.DateField()),
+                ('diferencia_minutos', models.IntegerField(blank=True, null=True)),
+                ('minutos_trabajados', models.PositiveIntegerField(blank=True, null=True)),
+                ('tipo', models.CharField(choices=[('normal', 'Normal'), ('retardo', 'Retardo'), ('falta', 'Falta'), ('justificada', 'Falta Justificada')], default='normal', max_length=20)),
+                ('tiene_justificante', models.BooleanField(default=False)),
+                ('empleado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='control.empleado')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'tipo'], name='resumen_fecha_tipo_idx'), models.Index(fields=['empleado', 'fecha'], name='resumen_empleado_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+
+def calcular_mascaras(apps, schema_editor):
+    """Convertir las cadenas 'Lunes,Martes' existentes en la máscara de bits."""
+    Horario = apps.get_model('control', 'Horario')
+    for horario in Horario.objects.all().only('pk', 'dias_laborales'):
+        mascara = 0
+        for dia in (horario.dias_laborales or '').split(','):
+            dia = dia.strip()
+            if dia in DIAS_SEMANA:
+                mascara |= 1 << DIAS_SEMANA.index(dia)
+        Horario.objects.filter(pk=horario.pk).update(dias_mask=mascara)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0014_resumen_asistencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='horario',
+            name='dias_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False, help_text='Días laborales como máscara de bits (bit 0 = Lunes ... bit 6 = Domingo)'),
+        ),
+        migrations.RunPython(calcular_mascaras, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 16:12
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+ALFABETO = ' 0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+    return ' '.join(''.join(c if c in ALFABETO else ' ' for c in sin_acentos).split())
+
+
+def llenar_busqueda(apps, schema_editor):
+    """Calcular las columnas de búsqueda de los empleados existentes."""
+    Empleado = apps.get_model('control', 'Empleado')
+    empleados = list(Empleado.objects.only('pk', 'nombre', 'apellido'))
+    for empleado in empleados:
+        empleado.nombre_busqueda = _normalizar(f"{empleado.nombre} {empleado.apellido}")
+        empleado.apellido_busqueda = _normalizar(f"{empleado.apellido} {empleado.nombre}")
+    Empleado.objects.bulk_update(empleados, ['nombre_busqueda', 'apellido_busqueda'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0015_horario_dias_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empleado',
+            name='apellido_busqueda',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=101),
+        ),
+        migrations.AddField(
+            model_name='empleado',
+            name='nombre_busqueda',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=101),
+        ),
+        migrations.RunPython(llenar_busqueda, migrations.RunPython.noop),
+    ]
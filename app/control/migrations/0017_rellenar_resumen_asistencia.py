@@ -0,0 +1,76 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+TAMANO_BLOQUE = 1000
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60 + hora.second + hora.microsecond / 1e6
+
+
+def _entradas_programadas(Empleado):
+    """`{empleado_id: [entrada de cada día de la semana o None]}` (la más temprana del día)."""
+    entradas = {}
+    asignaciones = Empleado.horarios.through.objects.values_list(
+        'empleado_id', 'horario__dias_mask', 'horario__hora_entrada',
+    )
+    for empleado_id, mascara, hora in asignaciones:
+        dias = entradas.setdefault(empleado_id, [None] * 7)
+        for dia in range(7):
+            if mascara & (1 << dia) and (dias[dia] is None or hora < dias[dia]):
+                dias[dia] = hora
+    return entradas
+
+
+def rellenar_resumen(apps, schema_editor):
+    """Calcular el resumen diario de las asistencias que ya existían.
+
+    Usa los modelos históricos y repite aquí el cálculo de `control.resumen`
+    (diferencia contra la entrada programada y minutos trabajados), así que
+    no depende del código ni del esquema posteriores. Las filas que el
+    checado ya haya resumido se conservan.
+    """
+    Asistencia = apps.get_model('control', 'Asistencia')
+    Empleado = apps.get_model('control', 'Empleado')
+    Justificante = apps.get_model('control', 'Justificante')
+    ResumenAsistencia = apps.get_model('control', 'ResumenAsistencia')
+    if not Asistencia.objects.exists():
+        return
+
+    entradas = _entradas_programadas(Empleado)
+    asistencias = Asistencia.objects.annotate(
+        con_justificante=Exists(Justificante.objects.filter(asistencia_id=OuterRef('pk'))),
+    ).order_by('pk').values_list(
+        'pk', 'empleado_id', 'fecha', 'hora_entrada', 'hora_salida', 'tipo', 'con_justificante',
+    )
+
+    ultimo = 0
+    while True:
+        bloque = list(asistencias.filter(pk__gt=ultimo)[:TAMANO_BLOQUE])
+        if not bloque:
+            break
+        resumenes = []
+        for pk, empleado_id, fecha, entrada, salida, tipo, con_justificante in bloque:
+            programada = entradas.get(empleado_id, [None] * 7)[fecha.weekday()]
+            diferencia = trabajados = None
+            if entrada is not None and programada is not None:
+                diferencia = int((_segundos(entrada) - _segundos(programada)) // 60)
+            if entrada is not None and salida is not None and salida >= entrada:
+                trabajados = int((_segundos(salida) - _segundos(entrada)) // 60)
+            resumenes.append(ResumenAsistencia(
+                asistencia_id=pk, empleado_id=empleado_id, fecha=fecha, diferencia_minutos=diferencia,
+                minutos_trabajados=trabajados, tipo=tipo, tiene_justificante=con_justificante,
+            ))
+        ResumenAsistencia.objects.bulk_create(resumenes, batch_size=TAMANO_BLOQUE, ignore_conflicts=True)
+        ultimo = bloque[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0016_empleado_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0017_rellenar_resumen_asistencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pase',
+            name='lote',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
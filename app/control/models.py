@@ -1,7 +1,188 @@
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, ExtractHour, ExtractIsoWeekDay, ExtractMinute, ExtractSecond, Floor
+from django.db.models.lookups import Exact
 from django.contrib.auth.models import User
 from django.utils import timezone
-import datetime
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Nombres de los días en el orden de `date.weekday()` (0=Lunes)
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Tiempo de vida del índice de horarios en caché (se invalida por señales)
+INDICE_HORARIOS_TTL = 60 * 60 * 24
+
+
+def normalizar_rfc(rfc):
+    """Forma canónica del RFC: mayúsculas y sin espacios."""
+    return ''.join((rfc or '').split()).upper()
+
+
+# Caracteres que pueden quedar en las columnas de búsqueda, en orden de
+# comparación (igual en collations binarias y *_ci de MySQL)
+ALFABETO_BUSQUEDA = ' 0123456789abcdefghijklmnopqrstuvwxyz'
+ALFABETO_RFC = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def normalizar_busqueda(texto):
+    """Texto para búsquedas: minúsculas, sin acentos ni signos y con espacios simples.
+
+    'José  Núñez-Ruiz' -> 'jose nunez ruiz'. Se aplica igual a lo que se
+    guarda en las columnas de búsqueda de Empleado y a lo que escribe el usuario.
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+    return ' '.join(''.join(c if c in ALFABETO_BUSQUEDA else ' ' for c in sin_acentos).split())
+
+
+def rango_prefijo(prefijo, alfabeto):
+    """`(desde, hasta)` tales que `desde <= valor < hasta` equivale a "empieza con `prefijo`".
+
+    A diferencia de `LIKE 'prefijo%'` (que SQLite no resuelve con el índice
+    y que en MySQL depende de la collation), un rango usa el índice de la
+    columna en cualquier motor. `hasta` es None si no hay cota superior.
+    """
+    for i in range(len(prefijo) - 1, -1, -1):
+        posicion = alfabeto.index(prefijo[i])
+        if posicion + 1 < len(alfabeto):
+            return prefijo, prefijo[:i] + alfabeto[posicion + 1]
+    return prefijo, None
+
+
+def mascara_dias(dias_laborales):
+    """Convierte 'Lunes,Martes' en una máscara de 7 bits (bit 0 = Lunes)."""
+    mascara = 0
+    for dia in (dias_laborales or '').split(','):
+        dia = dia.strip()
+        if dia in DIAS_SEMANA:
+            mascara |= 1 << DIAS_SEMANA.index(dia)
+    return mascara
+
+
+def dias_de_mascara(mascara):
+    """Nombres de los días de la máscara, en orden de la semana."""
+    return [dia for i, dia in enumerate(DIAS_SEMANA) if mascara & (1 << i)]
+
+
+def mascaras_que_intersectan(mascara):
+    """Todas las máscaras de 7 bits con algún día en común con `mascara`.
+
+    Con solo 128 combinaciones posibles, `dias_mask__in=...` expresa
+    "trabaja alguno de estos días" como una búsqueda en el índice de
+    `Horario.dias_mask`, a diferencia de una operación de bits sobre la columna.
+    """
+    return [m for m in range(1, 128) if m & mascara]
+
+
+def mascaras_con_dia(dia):
+    """Máscaras que incluyen el día `dia` (0=Lunes, como `date.weekday()`)."""
+    return mascaras_que_intersectan(1 << dia)
+
+
+def compilar_indice_horarios(horarios):
+    """Compila una lista de Horarios en una tupla de 7 posiciones.
+
+    La posición `i` contiene el Horario aplicable al día `weekday() == i`
+    (el de hora_entrada más temprana si hay varios) o None.
+    """
+    indice = [None] * 7
+    for h in horarios:
+        mascara = h.dias_mask
+        for dia in range(7):
+            if mascara & (1 << dia):
+                actual = indice[dia]
+                if actual is None or h.hora_entrada < actual.hora_entrada:
+                    indice[dia] = h
+    return tuple(indice)
+
+
+def _clave_indice_horarios(empleado_id):
+    return f'control:indice_horarios:{empleado_id}'
+
+
+def obtener_indice_horarios(empleado_id):
+    """Índice semanal de horarios del empleado, cacheado por empleado."""
+    clave = _clave_indice_horarios(empleado_id)
+    indice = cache.get(clave)
+    if indice is None:
+        horarios = Horario.objects.filter(empleados__id=empleado_id).order_by('pk')
+        indice = compilar_indice_horarios(horarios)
+        cache.set(clave, indice, INDICE_HORARIOS_TTL)
+    return indice
+
+
+def obtener_indices_horarios(empleado_ids):
+    """Índices semanales de varios empleados: `{empleado_id: indice}`.
+
+    Lee la caché en bloque y compila los que falten con una sola consulta
+    sobre la tabla intermedia Empleado-Horario.
+    """
+    empleado_ids = set(empleado_ids)
+    claves = {_clave_indice_horarios(pk): pk for pk in empleado_ids}
+    indices = {claves[clave]: indice for clave, indice in cache.get_many(list(claves)).items()}
+
+    faltantes = empleado_ids - set(indices)
+    if faltantes:
+        por_empleado = {pk: [] for pk in faltantes}
+        asignaciones = (
+            Empleado.horarios.through.objects
+            .filter(empleado_id__in=faltantes)
+            .select_related('horario')
+            .order_by('horario_id')
+        )
+        for asignacion in asignaciones:
+            por_empleado[asignacion.empleado_id].append(asignacion.horario)
+        nuevos = {pk: compilar_indice_horarios(horarios) for pk, horarios in por_empleado.items()}
+        cache.set_many({_clave_indice_horarios(pk): indice for pk, indice in nuevos.items()}, INDICE_HORARIOS_TTL)
+        indices.update(nuevos)
+    return indices
+
+
+def invalidar_indice_horarios(empleado_ids):
+    """Elimina de la caché los índices de horarios de los empleados dados."""
+    claves = [_clave_indice_horarios(pk) for pk in empleado_ids if pk is not None]
+    if claves:
+        cache.delete_many(claves)
+
+
+class EmpleadoQuerySet(models.QuerySet):
+    def _con_prefijo(self, campo, prefijo, alfabeto, limite):
+        desde, hasta = rango_prefijo(prefijo, alfabeto)
+        filtro = {f'{campo}__gte': desde}
+        if hasta is not None:
+            filtro[f'{campo}__lt'] = hasta
+        return list(self.filter(**filtro).order_by(campo, 'pk')[:limite])
+
+    def buscar(self, texto, limite=10):
+        """Hasta `limite` empleados cuyo nombre, apellido o RFC empieza con `texto`.
+
+        Primero los que coinciden por nombre ('nombre apellido'), luego por
+        apellido ('apellido nombre') y al final por RFC. Cada grupo es una
+        consulta que recorre solo `limite` entradas del índice de su columna,
+        sin importar cuántos empleados haya. Devuelve una lista.
+        """
+        termino = normalizar_busqueda(texto)
+        if not termino:
+            return []
+        grupos = [
+            self._con_prefijo('nombre_busqueda', termino, ALFABETO_BUSQUEDA, limite),
+            self._con_prefijo('apellido_busqueda', termino, ALFABETO_BUSQUEDA, limite),
+        ]
+        rfc = normalizar_rfc(texto)
+        if rfc and all(c in ALFABETO_RFC for c in rfc):
+            grupos.append(self._con_prefijo('rfc', rfc, ALFABETO_RFC, limite))
+
+        resultado, vistos = [], set()
+        for empleado in (e for grupo in grupos for e in grupo):
+            if empleado.pk not in vistos:
+                vistos.add(empleado.pk)
+                resultado.append(empleado)
+        return resultado[:limite]
+
 
 class Empleado(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -17,41 +198,108 @@ class Empleado(models.Model):
     rfc = models.CharField(max_length=13, unique=True)
     # Horarios asignados al empleado (muchos a muchos -> un horario puede asignarse a varios empleados)
     horarios = models.ManyToManyField('Horario', blank=True, related_name='empleados')
+    # 'nombre apellido' y 'apellido nombre' normalizados (ver `normalizar_busqueda`),
+    # indexados para buscar por prefijo; se calculan en save()
+    nombre_busqueda = models.CharField(max_length=101, default='', editable=False, db_index=True)
+    apellido_busqueda = models.CharField(max_length=101, default='', editable=False, db_index=True)
+
+    objects = EmpleadoQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
 
+    def save(self, *args, **kwargs):
+        # El RFC se guarda en forma canónica para poder buscarlo por igualdad exacta
+        self.rfc = normalizar_rfc(self.rfc)
+        self.actualizar_busqueda()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nombre', 'apellido'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'nombre_busqueda', 'apellido_busqueda'}
+        super().save(*args, **kwargs)
+
+    def actualizar_busqueda(self):
+        """Recalcula las columnas de búsqueda (llamarlo antes de un `bulk_create`)."""
+        self.nombre_busqueda = normalizar_busqueda(f"{self.nombre} {self.apellido}")
+        self.apellido_busqueda = normalizar_busqueda(f"{self.apellido} {self.nombre}")
+
+    def etiqueta_busqueda(self):
+        """Texto de una sugerencia del buscador: 'Nombre Apellido (RFC)'."""
+        return f"{self.nombre} {self.apellido} ({self.rfc})"
+
+    def get_indice_horarios(self):
+        """Índice semanal compilado de los horarios del empleado.
+
+        Si los horarios vienen de un ``prefetch_related('horarios')`` se compila
+        en memoria; en otro caso se usa el índice cacheado por empleado.
+        """
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('horarios')
+        if prefetched is not None:
+            return compilar_indice_horarios(prefetched)
+        return obtener_indice_horarios(self.pk)
+
     def get_horario_para_fecha(self, fecha=None):
         """
         Devuelve el objeto Horario aplicable para la fecha dada (por defecto hoy).
-        Busca entre los horarios asignados al empleado aquel(s) que contienen
-        el día de la semana en su campo `dias_laborales` (cadena separada por comas).
-        Si hay varios, devuelve el que tenga la hora_entrada más temprana.
+        Lee la posición `fecha.weekday()` del índice semanal del empleado
+        (ver `get_indice_horarios`), compilado a partir del `dias_mask` de sus
+        horarios: si varios cubren ese día, el de hora_entrada más temprana.
         Si no hay ninguno, devuelve None.
+
+        No hace consultas si los horarios vienen prefetcheados o el índice
+        ya está en caché.
         """
         from datetime import date as _date
 
         if fecha is None:
             fecha = _date.today()
 
-        # Mapear weekday() (0=Lunes) a nombres en español usados en dias_laborales
-        weekday_map = {
-            0: 'Lunes', 1: 'Martes', 2: 'Miércoles', 3: 'Jueves', 4: 'Viernes', 5: 'Sábado', 6: 'Domingo'
-        }
-        nombre_dia = weekday_map[fecha.weekday()]
+        return self.get_indice_horarios()[fecha.weekday()]
 
-        candidatos = []
-        for h in self.horarios.all():
-            # dias_laborales se espera como 'Lunes,Martes' etc.
-            dias = [d.strip() for d in (h.dias_laborales or '').split(',') if d.strip()]
-            if nombre_dia in dias:
-                candidatos.append(h)
 
-        if not candidatos:
-            return None
+def _segundos_del_dia(campo):
+    """Expresión SQL con los segundos desde medianoche de un TimeField."""
+    return ExtractHour(campo) * 3600 + ExtractMinute(campo) * 60 + ExtractSecond(campo)
+
+
+class AsistenciaQuerySet(models.QuerySet):
+    def con_puntualidad(self):
+        """Anota la entrada programada y la diferencia en minutos, calculadas en SQL.
+
+        - `hora_programada`: hora_entrada del horario del empleado que cubre
+          el día de la semana de `fecha` (el más temprano si hay varios,
+          como `compilar_indice_horarios`).
+        - `minutos_diferencia`: minutos de la entrada contra esa hora,
+          redondeados hacia abajo (positivo = tarde); NULL sin entrada u horario.
+
+        Permite filtrar, ordenar y agregar por retardo sin cargar filas en
+        Python. Coincide con `puntualidad.diferencias_minutos`.
+        """
+        if 'minutos_diferencia' in self.query.annotations:
+            return self
+        # Bit del día de la semana de `fecha` en `Horario.dias_mask`
+        bit = Case(*[
+            When(Exact(ExtractIsoWeekDay(OuterRef('fecha')), numero), then=Value(1 << (numero - 1)))
+            for numero in range(1, 8)
+        ], output_field=models.IntegerField())
+        programados = (
+            Horario.objects.filter(empleados=OuterRef('empleado_id'))
+            .alias(coincide=F('dias_mask').bitand(bit))
+            .filter(coincide__gt=0)
+            .order_by('hora_entrada')
+        )
+        # La diferencia se calcula dentro de la subconsulta: referenciar la
+        # anotación `hora_programada` repetiría la subconsulta en cada uso
+        diferencia = Cast(
+            _segundos_del_dia(OuterRef('hora_entrada')) - _segundos_del_dia('hora_entrada'), models.FloatField(),
+        )
+        minutos = programados.annotate(
+            minutos=Cast(Floor(diferencia / Value(60.0)), models.IntegerField()),
+        ).values('minutos')[:1]
+        return self.annotate(
+            hora_programada=Subquery(programados.values('hora_entrada')[:1]),
+            minutos_diferencia=Subquery(minutos),
+        )
 
-        # devolver horario con hora_entrada mínima (por si hay varios)
-        return min(candidatos, key=lambda x: x.hora_entrada)
 
 class Asistencia(models.Model):
     empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, related_name='asistencias')
@@ -69,9 +317,19 @@ class Asistencia(models.Model):
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default='normal')
     observaciones = models.TextField(blank=True, null=True)
 
+    objects = AsistenciaQuerySet.as_manager()
+
     class Meta:
         unique_together = ['empleado', 'fecha']
         ordering = ['-fecha', '-hora_entrada']
+        indexes = [
+            # Orden del reporte y de la paginación keyset
+            models.Index(fields=['fecha', 'hora_entrada', 'id'], name='asistencia_fecha_hora_id_idx'),
+            # Filtro por tipo dentro de un rango de fechas (reporte, exportación).
+            # (empleado, fecha) ya lo cubre el índice único y los rangos de
+            # fecha el prefijo del índice anterior.
+            models.Index(fields=['tipo', 'fecha'], name='asistencia_tipo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.empleado} - {self.fecha}"
@@ -89,99 +347,22 @@ class Asistencia(models.Model):
             self.hora_salida = now.time()
             self.save()
 
+    def _minutos_diferencia(self):
+        from .puntualidad import diferencias_minutos
+        return diferencias_minutos([self], {self.empleado_id: self.empleado.get_indice_horarios()})[0]
+
     @property
     def diferencia(self):
-        if not self.hora_entrada:
-            return None
-
-        # obtener horario aplicable
-        try:
-            horario = self.empleado.get_horario_para_fecha(self.fecha)
-        except Exception:
-            horario = None
-
-        if not horario or not horario.hora_entrada:
-            return None
-
-        # hora programada (TimeField en Horario)
-        h_prog = horario.hora_entrada
-        if isinstance(h_prog, datetime.datetime):
-            h_prog = h_prog.time()
-        if not isinstance(h_prog, datetime.time):
-            return None
+        """Diferencia contra la entrada programada ('A tiempo', 'N min tarde'...).
 
-        # Construir datetimes aware para comparar
-        try:
-            prog_naive = datetime.datetime.combine(self.fecha, h_prog)
-            prog_aware = timezone.make_aware(prog_naive, timezone.get_current_timezone())
-        except Exception:
-            return None
-
-        # Determinar datetime de entrada a partir del campo (puede ser time o datetime)
-        entrada_dt = None
-        if isinstance(self.hora_entrada, datetime.time):
-            try:
-                ent_naive = datetime.datetime.combine(self.fecha, self.hora_entrada)
-                entrada_dt = timezone.make_aware(ent_naive, timezone.get_current_timezone())
-            except Exception:
-                return None
-        elif isinstance(self.hora_entrada, datetime.datetime):
-            entrada_dt = self.hora_entrada
-            if timezone.is_naive(entrada_dt):
-                try:
-                    entrada_dt = timezone.make_aware(entrada_dt, timezone.get_current_timezone())
-                except Exception:
-                    pass
-        else:
-            return None
-
-        # Calcular diferencia en segundos
-        try:
-            diff_seconds = (entrada_dt - prog_aware).total_seconds()
-        except Exception:
-            return None
-
-        # puntual
-        if abs(diff_seconds) < 60:
-            return "A tiempo"
-
-        mins = abs(int(diff_seconds // 60))
-        return f"{mins} min tarde" if diff_seconds > 0 else f"{mins} min antes"
+        Para muchas asistencias usar `puntualidad.calcular` o el resumen diario.
+        """
+        from .puntualidad import etiqueta_minutos
+        return etiqueta_minutos(self._minutos_diferencia())
 
     def compute_diferencia_minutes(self):
-        if not self.hora_entrada:
-            return None
-
-        try:
-            horario = self.empleado.get_horario_para_fecha(self.fecha)
-        except Exception:
-            return None
-
-        if not horario or not horario.hora_entrada:
-            return None
-
-        h_prog = horario.hora_entrada
-        if isinstance(h_prog, datetime.datetime):
-            h_prog = h_prog.time()
-
-        try:
-            prog_naive = datetime.datetime.combine(self.fecha, h_prog)
-            prog_aware = timezone.make_aware(prog_naive, timezone.get_current_timezone())
-        except Exception:
-            return None
-
-        # normalización
-        if isinstance(self.hora_entrada, datetime.time):
-            ent_naive = datetime.datetime.combine(self.fecha, self.hora_entrada)
-            entrada_dt = timezone.make_aware(ent_naive, timezone.get_current_timezone())
-        else:
-            entrada_dt = self.hora_entrada
-            if timezone.is_naive(entrada_dt):
-                entrada_dt = timezone.make_aware(entrada_dt, timezone.get_current_timezone())
-
-        diff_seconds = (entrada_dt - prog_aware).total_seconds()
-
-        return int(diff_seconds // 60)
+        """Minutos contra la entrada programada (positivo = tarde); None si no aplica."""
+        return self._minutos_diferencia()
 
 class Justificante(models.Model):
     ESTADO_CHOICES = [
@@ -201,15 +382,70 @@ class Justificante(models.Model):
 
     class Meta:
         ordering = ['-fecha_envio']
+        indexes = [
+            # Bandeja de validación: filtro por estado, más recientes primero
+            models.Index(fields=['estado', '-fecha_envio'], name='justificante_estado_envio_idx'),
+        ]
 
     def __str__(self):
         return f"Justificante {self.pk} - {self.empleado} - {self.asistencia.fecha} ({self.estado})"
 
 
+class ResumenAsistencia(models.Model):
+    """Resumen diario ya calculado de cada asistencia (ver `control.resumen`).
+
+    Lo leen el dashboard, el reporte y las exportaciones en lugar de
+    recalcular `Asistencia.diferencia` fila por fila. Se mantiene al checar
+    y desde las señales de Asistencia/Justificante y de los horarios; la
+    migración 0017 lo rellena y el comando `reconstruir_resumen` lo
+    regenera completo.
+    """
+    asistencia = models.OneToOneField(Asistencia, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, related_name='resumenes')
+    fecha = models.DateField()
+    # Minutos contra la entrada programada (positivo = tarde); None sin entrada u horario
+    diferencia_minutos = models.IntegerField(null=True, blank=True)
+    minutos_trabajados = models.PositiveIntegerField(null=True, blank=True)
+    tipo = models.CharField(max_length=20, choices=Asistencia.TIPO_CHOICES, default='normal')
+    tiene_justificante = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Conteos del día por tipo (dashboard) y rangos por empleado
+            models.Index(fields=['fecha', 'tipo'], name='resumen_fecha_tipo_idx'),
+            models.Index(fields=['empleado', 'fecha'], name='resumen_empleado_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.empleado_id} - {self.fecha} ({self.tipo})"
+
+    @property
+    def diferencia(self):
+        """Mismo texto que `Asistencia.diferencia`, sin consultar horarios."""
+        from .puntualidad import etiqueta_minutos
+        return etiqueta_minutos(self.diferencia_minutos)
+
+    @property
+    def tiempo_trabajado(self):
+        if self.minutos_trabajados is None:
+            return None
+        horas, minutos = divmod(self.minutos_trabajados, 60)
+        return f"{horas}h {minutos:02d}m"
+
+
+class HorarioQuerySet(models.QuerySet):
+    def del_dia(self, dia):
+        """Horarios que incluyen el día `dia` (0=Lunes), usando el índice de `dias_mask`."""
+        return self.filter(dias_mask__in=mascaras_con_dia(dia))
+
+
 class Horario(models.Model):
     """Modelo para definir horarios de trabajo reutilizables.
 
     - dias_laborales: se guarda como cadena separada por comas (p.ej. 'Lunes,Martes')
+    - dias_mask: los mismos días como máscara de bits indexada (bit 0 = Lunes),
+      calculada en `save()`; es la columna que usan las consultas por día.
+      Un `update()` de `dias_laborales` debe actualizarla también.
     - hora_entrada / hora_salida: horarios del día (TimeField)
     """
     DIAS_CHOICES = [
@@ -224,9 +460,22 @@ class Horario(models.Model):
 
     nombre = models.CharField(max_length=100, blank=True, null=True, help_text='Nombre opcional para identificar el horario')
     dias_laborales = models.CharField(max_length=100, help_text='Días laborales separados por comas (p.ej. Lunes,Martes)')
+    dias_mask = models.PositiveSmallIntegerField(
+        default=0, db_index=True, editable=False,
+        help_text='Días laborales como máscara de bits (bit 0 = Lunes ... bit 6 = Domingo)',
+    )
     hora_entrada = models.TimeField()
     hora_salida = models.TimeField()
 
+    objects = HorarioQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.dias_mask = mascara_dias(self.dias_laborales)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'dias_laborales' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'dias_mask'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         if self.nombre:
             return f"{self.nombre} ({self.dias_laborales})"
@@ -250,18 +499,81 @@ class Pase(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     pdf_generado = models.FileField(upload_to='pases/', blank=True, null=True)
 
+    # El PDF se genera en segundo plano (ver control.pases_pdf)
+    PDF_ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('listo', 'Listo'),
+        ('fallido', 'Fallido'),
+    ]
+    pdf_estado = models.CharField(max_length=20, choices=PDF_ESTADO_CHOICES, default='pendiente')
+    pdf_intentos = models.PositiveSmallIntegerField(default=0)
+    pdf_error = models.TextField(blank=True, null=True)
+    # Nombre del PDF combinado de los pases emitidos en lote (ver control.pases_lote)
+    lote = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Listado de pases filtrado por tipo o por empleado, más recientes primero
+            models.Index(fields=['tipo', '-fecha_creacion'], name='pase_tipo_creacion_idx'),
+            models.Index(fields=['empleado', '-fecha_creacion'], name='pase_empleado_creacion_idx'),
+        ]
 
     def __str__(self):
         return f"Pase {self.folio} - {self.empleado} ({self.get_tipo_display()})"
 
 
+class Exportacion(models.Model):
+    """Trabajo de exportación del reporte de asistencias generado en segundo plano.
+
+    Solicitudes con los mismos filtros (mismo `filtros_hash`) reutilizan el
+    trabajo en curso o el archivo ya generado mientras siga vigente.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    filtros = models.JSONField(default=dict)
+    filtros_hash = models.CharField(max_length=64, db_index=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    progreso = models.PositiveIntegerField(default=0, help_text='Filas escritas')
+    total = models.PositiveIntegerField(null=True, blank=True, help_text='Filas a exportar')
+    archivo = models.FileField(upload_to='exportaciones/', blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='exportaciones')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Exportación {self.pk} ({self.estado})"
+
+    @property
+    def porcentaje(self):
+        if self.estado == 'completada':
+            return 100
+        if not self.total:
+            return 0
+        return min(99, int(self.progreso * 100 / self.total))
+
+
 class SystemConfig(models.Model):
     """Configuración sencilla editable desde admin.
 
     Usamos una tabla pequeña con una fila (primera fila usada) para valores globales.
+    Las lecturas frecuentes (p. ej. el checado) deben usar `get_cached()`.
     """
+    CACHE_KEY = 'control:systemconfig'
+    # Segundos que cada proceso reutiliza su copia sin consultar la caché compartida
+    CACHE_LOCAL_TTL = getattr(settings, 'SYSTEMCONFIG_CACHE_TTL', 5)
+    # Vida de la copia en la caché compartida: acota cualquier copia obsoleta
+    CACHE_TTL = getattr(settings, 'SYSTEMCONFIG_CACHE_SHARED_TTL', 5 * 60)
+
     retardo_minutos = models.PositiveIntegerField(default=5, help_text='Minutos de tolerancia para considerar un retardo')
 
     def __str__(self):
@@ -269,7 +581,45 @@ class SystemConfig(models.Model):
 
     @classmethod
     def get_solo(cls):
-        obj = cls.objects.first()
+        """Devuelve la fila de configuración, creándola si no existe.
+
+        La creación usa una clave primaria fija, de modo que dos procesos que
+        llegan a la vez no pueden crear filas duplicadas: el perdedor recibe el
+        IntegrityError dentro de `get_or_create` y lee la fila del ganador.
+        """
+        obj = cls.objects.order_by('pk').first()
+        if obj is None:
+            obj, _ = cls.objects.get_or_create(pk=1)
+        return obj
+
+    @classmethod
+    def get_cached(cls):
+        """Configuración cacheada para lecturas (no modificar el objeto devuelto).
+
+        Nivel 1: copia en el proceso durante `CACHE_LOCAL_TTL` segundos.
+        Nivel 2: backend de caché de Django, compartido entre workers si así
+        está configurado, durante `CACHE_TTL` segundos; `post_save` lo
+        invalida al confirmar la transacción (ver signals).
+        """
+        global _systemconfig_local
+        ahora = time.monotonic()
+        local = _systemconfig_local
+        if local is not None and local[1] > ahora:
+            return local[0]
+
+        obj = cache.get(cls.CACHE_KEY)
         if obj is None:
-            obj = cls.objects.create()
+            obj = cls.get_solo()
+            cache.set(cls.CACHE_KEY, obj, cls.CACHE_TTL)
+        _systemconfig_local = (obj, ahora + cls.CACHE_LOCAL_TTL)
         return obj
+
+    @classmethod
+    def invalidar_cache(cls):
+        global _systemconfig_local
+        _systemconfig_local = None
+        cache.delete(cls.CACHE_KEY)
+
+
+# (objeto, expira) de la copia en proceso de SystemConfig
+_systemconfig_local = None
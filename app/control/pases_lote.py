@@ -0,0 +1,294 @@
+"""
+Emisión de pases en lote.
+
+`crear_pases_lote` asigna folios consecutivos y crea todos los pases en una
+sola transacción, marcados con el nombre de su lote; `encolar_lote` genera
+en el pool local (ver `tareas`) sus PDFs, en un pool de procesos y
+escribiendo cada uno directamente a disco, y los une en un único PDF listo
+para imprimir en MEDIA_ROOT/pases/lotes/. La unión copia los objetos de
+cada PDF al archivo final a medida que los lee, así que la memoria no
+depende del tamaño del lote. El estado durable son los propios pases
+(`pdf_estado`); el comando `procesar_pases_pdf` retoma los lotes pendientes.
+"""
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject, IndirectObject, NameObject, NumberObject,
+    StreamObject,
+)
+
+from . import tareas
+from .models import Pase
+from .utils_pdf import datos_pase, guardar_pase_pdf
+
+logger = logging.getLogger(__name__)
+
+PREFIJOS_FOLIO = {'entrada': 'E', 'salida': 'S'}
+# Procesos para generar PDFs; con menos pases que PASES_POOL_MINIMO se generan en el proceso actual
+PASES_PDF_PROCESOS = getattr(settings, 'PASES_PDF_PROCESOS', min(4, os.cpu_count() or 1))
+PASES_POOL_MINIMO = 20
+LOTES_DIR = 'pases/lotes'
+
+NOMBRE_LOTE_RE = re.compile(r'^lote_[\w-]+\.pdf$')
+
+
+def prefijo_folio(tipo, fecha):
+    """Prefijo de los folios automáticos, p. ej. 'S-2025-'."""
+    return f"{PREFIJOS_FOLIO.get(tipo, 'P')}-{fecha.year}-"
+
+
+def siguiente_folio(prefijo):
+    """Siguiente número libre para los folios que empiezan con `prefijo`.
+
+    El máximo lo calcula la base de datos sobre el rango del índice de
+    `folio`; los folios capturados a mano que no terminan en número se ignoran.
+    """
+    ultimo = Pase.objects.filter(
+        folio__startswith=prefijo, folio__regex=rf'^{re.escape(prefijo)}[0-9]+$',
+    ).aggregate(
+        ultimo=Max(Cast(Substr('folio', len(prefijo) + 1), IntegerField())),
+    )['ultimo']
+    return (ultimo or 0) + 1
+
+
+def nombre_lote():
+    """Nombre nuevo para el PDF combinado de un lote."""
+    return f"lote_{timezone.now():%Y%m%d_%H%M%S_%f}.pdf"
+
+
+def crear_pases_lote(solicitudes, tipo, fecha, hora, hora_reincorporacion=None, observaciones=None, creado_por=None):
+    """Crea un pase por cada solicitud y devuelve la lista de pases creados.
+
+    `solicitudes` es una lista de dicts con `empleado` (instancia o id),
+    `asunto` y opcionalmente `observaciones`. Los folios se asignan de
+    forma consecutiva; si otro lote toma los mismos números a la vez, se
+    reintenta con los siguientes. Todos los pases comparten `lote`, el
+    nombre de su PDF combinado, y quedan con el PDF pendiente.
+    """
+    prefijo = prefijo_folio(tipo, fecha)
+    lote = nombre_lote()
+    for intento in range(3):
+        try:
+            with transaction.atomic():
+                inicio = siguiente_folio(prefijo)
+                pases = []
+                for n, solicitud in enumerate(solicitudes, start=inicio):
+                    empleado = solicitud['empleado']
+                    pases.append(Pase(
+                        empleado_id=getattr(empleado, 'pk', empleado),
+                        tipo=tipo,
+                        folio=f'{prefijo}{n:05d}',
+                        fecha=fecha,
+                        hora=hora,
+                        hora_reincorporacion=hora_reincorporacion,
+                        asunto=solicitud['asunto'],
+                        observaciones=solicitud.get('observaciones', observaciones),
+                        creado_por=creado_por,
+                        pdf_estado='pendiente',
+                        lote=lote,
+                    ))
+                Pase.objects.bulk_create(pases)
+            # MySQL no devuelve los ids de bulk_create: se recuperan por folio
+            return list(Pase.objects.filter(folio__in=[p.folio for p in pases]).order_by('folio'))
+        except IntegrityError:
+            if intento == 2:
+                raise
+            logger.info("Folios %s ocupados por otro lote, reintentando", prefijo)
+
+
+def generar_pdfs_lote(lote, procesos=None):
+    """Genera el PDF de cada pase del lote y el PDF combinado con todos ellos.
+
+    Cada PDF se escribe en la ruta de `Pase.pdf_generado`; los pases se
+    actualizan con un solo `bulk_update`. Devuelve el nombre (relativo a
+    MEDIA_ROOT) del PDF combinado.
+    """
+    pases = list(Pase.objects.filter(lote=lote).select_related('empleado').order_by('folio'))
+    media_root = str(settings.MEDIA_ROOT)
+    os.makedirs(default_storage.path('pases'), exist_ok=True)
+
+    trabajos = []
+    for pase in pases:
+        nombre = f'pases/pase_{pase.folio}_{pase.tipo}.pdf'
+        pase.pdf_generado.name = nombre
+        pase.pdf_estado, pase.pdf_error = 'listo', None
+        trabajos.append((datos_pase(pase), default_storage.path(nombre), media_root))
+
+    procesos = procesos or PASES_PDF_PROCESOS
+    if procesos > 1 and len(trabajos) >= PASES_POOL_MINIMO:
+        # spawn: no hereda hilos ni conexiones abiertas del proceso
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            rutas = list(pool.map(guardar_pase_pdf, *zip(*trabajos), chunksize=8))
+    else:
+        rutas = [guardar_pase_pdf(*trabajo) for trabajo in trabajos]
+
+    Pase.objects.bulk_update(pases, ['pdf_generado', 'pdf_estado', 'pdf_error'], batch_size=500)
+    return combinar_pdfs(rutas, lote)
+
+
+def procesar_lote(lote):
+    """Tarea en segundo plano: genera el lote o marca sus pases como fallidos."""
+    try:
+        generar_pdfs_lote(lote)
+        return True
+    except Exception as e:
+        logger.exception("Error al generar los PDFs del lote de pases %s", lote)
+        Pase.objects.filter(lote=lote).exclude(pdf_estado='listo').update(pdf_estado='fallido', pdf_error=str(e))
+        return False
+
+
+def encolar_lote(lote):
+    """Encola la generación del lote al confirmar la transacción."""
+    tareas.en_segundo_plano(procesar_lote, lote)
+
+
+def estado_lote(lote):
+    """'listo', 'pendiente' o 'fallido'; None si no existe el lote."""
+    if archivo_lote(lote):
+        return 'listo'
+    estados = set(Pase.objects.filter(lote=lote).values_list('pdf_estado', flat=True).distinct())
+    if not estados:
+        return None
+    return 'fallido' if 'fallido' in estados else 'pendiente'
+
+
+def procesar_pendientes():
+    """Genera los lotes que quedaron sin PDF combinado (p. ej. tras reiniciar el proceso)."""
+    lotes = (
+        Pase.objects.filter(lote__isnull=False, pdf_estado='pendiente')
+        .order_by('lote').values_list('lote', flat=True).distinct()
+    )
+    return sum(1 for lote in list(lotes) if procesar_lote(lote))
+
+
+class _PdfEnDisco:
+    """Escritor de PDF que manda cada objeto al archivo en cuanto lo copia.
+
+    `PdfWriter` guarda todas las páginas en memoria hasta `write()`; aquí
+    solo se conservan las posiciones de los objetos (para la tabla xref) y
+    las referencias a las páginas. El objeto 1 es el árbol de páginas y el
+    2 el catálogo, que se escriben al cerrar.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.posiciones = [None, None, None]
+        self.paginas = []
+        archivo.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _reservar(self):
+        self.posiciones.append(None)
+        return len(self.posiciones) - 1
+
+    def _escribir(self, numero, objeto):
+        self.posiciones[numero] = self.archivo.tell()
+        self.archivo.write(f'{numero} 0 obj\n'.encode())
+        objeto.write_to_stream(self.archivo, None)
+        self.archivo.write(b'\nendobj\n')
+
+    def agregar(self, ruta):
+        """Copia las páginas del PDF en `ruta` (con todo lo que referencian)."""
+        with open(ruta, 'rb') as f:
+            reader = PdfReader(f)
+            numeros, pendientes = {}, []
+
+            def referencia(ref):
+                clave = (ref.idnum, ref.generation)
+                if clave not in numeros:
+                    numeros[clave] = self._reservar()
+                    pendientes.append(ref)
+                return IndirectObject(numeros[clave], 0, None)
+
+            def copiar(objeto):
+                if isinstance(objeto, IndirectObject):
+                    return referencia(objeto)
+                if isinstance(objeto, StreamObject):
+                    # Los datos se copian tal cual (con su /Filter, si lo tienen)
+                    copia = EncodedStreamObject() if '/Filter' in objeto else DecodedStreamObject()
+                    copia._data = objeto._data
+                    for clave, valor in objeto.items():
+                        copia[NameObject(clave)] = copiar(valor)
+                    return copia
+                if isinstance(objeto, DictionaryObject):
+                    copia = DictionaryObject()
+                    for clave, valor in objeto.items():
+                        copia[NameObject(clave)] = copiar(valor)
+                    return copia
+                if isinstance(objeto, ArrayObject):
+                    return ArrayObject(copiar(valor) for valor in objeto)
+                return objeto
+
+            for pagina in reader.pages:
+                ref = pagina.indirect_reference
+                numero = referencia(ref).idnum if ref is not None else self._reservar()
+                if ref is not None:
+                    pendientes.remove(ref)
+                # Los atributos heredables ya vienen copiados en la página
+                copia = copiar(DictionaryObject({k: v for k, v in pagina.items() if k != '/Parent'}))
+                copia[NameObject('/Parent')] = IndirectObject(1, 0, None)
+                self._escribir(numero, copia)
+                self.paginas.append(numero)
+                while pendientes:
+                    ref = pendientes.pop()
+                    self._escribir(numeros[(ref.idnum, ref.generation)], copiar(ref.get_object()))
+
+    def cerrar(self):
+        kids = ArrayObject(IndirectObject(n, 0, None) for n in self.paginas)
+        self._escribir(1, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): kids,
+            NameObject('/Count'): NumberObject(len(kids)),
+        }))
+        self._escribir(2, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(1, 0, None),
+        }))
+        xref = self.archivo.tell()
+        self.archivo.write(f'xref\n0 {len(self.posiciones)}\n0000000000 65535 f \n'.encode())
+        for posicion in self.posiciones[1:]:
+            self.archivo.write(f'{posicion:010d} 00000 n \n'.encode())
+        self.archivo.write(f'trailer\n<< /Size {len(self.posiciones)} /Root 2 0 R >>\n'.encode())
+        self.archivo.write(f'startxref\n{xref}\n%%EOF\n'.encode())
+
+
+def combinar_pdfs(rutas, lote=None):
+    """Une los PDFs de `rutas` en MEDIA_ROOT/pases/lotes/ y devuelve el nombre relativo.
+
+    Cada PDF se abre, se copia al archivo final y se cierra antes del siguiente.
+    """
+    nombre = f"{LOTES_DIR}/{lote or nombre_lote()}"
+    ruta = default_storage.path(nombre)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    temporal = ruta + '.tmp'
+    try:
+        with open(temporal, 'wb') as destino:
+            escritor = _PdfEnDisco(destino)
+            for r in rutas:
+                escritor.agregar(r)
+            escritor.cerrar()
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return nombre
+
+
+def archivo_lote(nombre):
+    """Nombre (relativo a MEDIA_ROOT) de un PDF combinado, o None si no es válido o no existe."""
+    if not NOMBRE_LOTE_RE.match(nombre or ''):
+        return None
+    archivo = f'{LOTES_DIR}/{nombre}'
+    return archivo if default_storage.exists(archivo) else None
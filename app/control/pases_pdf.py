@@ -0,0 +1,101 @@
+"""
+Generación del PDF de cada pase en segundo plano.
+
+Guardar un pase solo lo marca como `pdf_estado='pendiente'` y encola el
+render en el pool local (ver `tareas`), de modo que la petición no espera
+al PDF. Los fallos se reintentan; `asegurar_pdf` lo usa la descarga para
+esperar un momento o generar el PDF en el acto si aún no está listo.
+"""
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import tareas
+from .models import Pase
+from .utils_pdf import datos_pase, guardar_pase_pdf
+
+logger = logging.getLogger(__name__)
+
+PASES_PDF_REINTENTOS = getattr(settings, 'PASES_PDF_REINTENTOS', 3)
+# Segundos que la descarga espera al worker antes de generar el PDF ella misma
+PASES_PDF_ESPERA = getattr(settings, 'PASES_PDF_ESPERA', 3)
+
+
+def encolar_pdf(pase):
+    """Marca el PDF del pase como pendiente y encola su generación."""
+    Pase.objects.filter(pk=pase.pk).update(pdf_estado='pendiente', pdf_intentos=0, pdf_error=None)
+    pase.pdf_estado, pase.pdf_intentos, pase.pdf_error = 'pendiente', 0, None
+    tareas.en_segundo_plano(generar_pdf, pase.pk)
+
+
+def renderizar(pase_id):
+    """Genera el PDF con los datos actuales del pase y lo marca como listo.
+
+    El archivo se escribe en un temporal y se reemplaza de forma atómica,
+    siempre con el mismo nombre por folio, para no dejar archivos huérfanos
+    en cada edición.
+    """
+    pase = Pase.objects.select_related('empleado').get(pk=pase_id)
+    nombre = f'pases/pase_{pase.folio}_{pase.tipo}.pdf'
+    ruta = default_storage.path(nombre)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(ruta))
+    os.close(descriptor)
+    try:
+        guardar_pase_pdf(datos_pase(pase), temporal)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    anterior = pase.pdf_generado.name
+    if anterior and anterior != nombre:
+        default_storage.delete(anterior)
+    Pase.objects.filter(pk=pase_id).update(pdf_generado=nombre, pdf_estado='listo', pdf_error=None)
+
+
+def generar_pdf(pase_id, reintentos=None):
+    """Genera el PDF reintentando con espera creciente. Devuelve True si quedó listo."""
+    reintentos = PASES_PDF_REINTENTOS if reintentos is None else reintentos
+    for intento in range(1, reintentos + 1):
+        try:
+            renderizar(pase_id)
+            return True
+        except Pase.DoesNotExist:
+            return False
+        except Exception as e:
+            logger.warning("Error generando el PDF del pase %s (intento %s): %s", pase_id, intento, e)
+            error = str(e)
+            Pase.objects.filter(pk=pase_id).update(pdf_intentos=intento, pdf_error=error)
+            if intento < reintentos:
+                time.sleep(0.5 * 2 ** (intento - 1))
+    Pase.objects.filter(pk=pase_id).update(pdf_estado='fallido')
+    return False
+
+
+def asegurar_pdf(pase, espera=None):
+    """Devuelve el pase con su PDF listo, esperando o generándolo si hace falta.
+
+    Si el worker no termina en `espera` segundos (o el PDF falló antes),
+    se genera en la propia petición con un solo intento.
+    """
+    espera = PASES_PDF_ESPERA if espera is None else espera
+    limite = time.monotonic() + espera
+    while pase.pdf_estado == 'pendiente' and time.monotonic() < limite:
+        time.sleep(0.2)
+        pase.refresh_from_db(fields=['pdf_estado', 'pdf_generado', 'pdf_error'])
+
+    if pase.pdf_estado != 'listo' or not pase.pdf_generado or not default_storage.exists(pase.pdf_generado.name):
+        generar_pdf(pase.pk, reintentos=1)
+        pase.refresh_from_db(fields=['pdf_estado', 'pdf_generado', 'pdf_error', 'pdf_intentos'])
+    return pase
+
+
+def procesar_pendientes():
+    """Genera los PDFs que quedaron pendientes (p. ej. tras reiniciar el proceso)."""
+    pendientes = Pase.objects.filter(pdf_estado='pendiente').order_by('pk').values_list('pk', flat=True)
+    return sum(1 for pk in list(pendientes) if generar_pdf(pk))
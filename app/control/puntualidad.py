@@ -0,0 +1,178 @@
+"""
+Cálculo de puntualidad para muchas asistencias a la vez.
+
+En lugar de resolver el horario y construir datetimes aware fila por fila,
+se cargan los índices de horarios de todos los empleados en bloque y se
+compara en segundos desde medianoche: una tabla `empleado x día` con la
+entrada programada y tres columnas por asistencia (empleado, día de la
+semana, segundos de la entrada). Ambas horas pertenecen al mismo día, así
+que el resultado coincide con la comparación aware salvo que un cambio de
+horario de verano caiga entre ellas.
+
+Las columnas salen de las instancias, de tuplas o, para un queryset, de la
+propia base de datos (anotaciones), sin construir modelos. Si NumPy está
+instalado la resta se hace sobre arreglos; si no, en un bucle de Python
+con el mismo resultado. `Asistencia.diferencia`, el checado y el resumen
+diario (que leen el reporte, las exportaciones y el calendario) usan este
+módulo.
+"""
+import math
+
+from django.db.models import F, QuerySet
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, ExtractMinute, ExtractSecond
+
+from .models import obtener_indices_horarios
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el bucle de Python
+    np = None
+
+NAN = float('nan')
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60 + hora.second + hora.microsecond / 1e6
+
+
+def tabla_entradas(indices):
+    """`{empleado_id: (s_lunes, ..., s_domingo)}` con la entrada programada en segundos.
+
+    NaN los días sin horario. `indices` es `{empleado_id: indice}` (ver
+    `models.obtener_indices_horarios`).
+    """
+    return {
+        empleado_id: tuple(
+            _segundos(h.hora_entrada) if h is not None and h.hora_entrada else NAN for h in indice
+        )
+        for empleado_id, indice in indices.items()
+    }
+
+
+def columnas(filas):
+    """`(empleado_ids, dias, entradas)` de asistencias.
+
+    `filas` puede ser un queryset de Asistencia (las columnas se calculan en
+    la base de datos), una lista de instancias o de tuplas
+    `(empleado_id, fecha, hora_entrada)`. `dias` sigue a `date.weekday()` y
+    `entradas` está en segundos desde medianoche (None sin entrada).
+    """
+    if isinstance(filas, QuerySet):
+        filas = filas.annotate(
+            p_dia=ExtractIsoWeekDay('fecha') - 1,
+            p_entrada=ExtractHour('hora_entrada') * 3600 + ExtractMinute('hora_entrada') * 60
+            + ExtractSecond('hora_entrada'),
+        ).values_list('empleado_id', F('p_dia'), F('p_entrada'))
+        filas = list(filas)
+        if not filas:
+            return [], [], []
+        return tuple(list(c) for c in zip(*filas))
+
+    empleado_ids, dias, entradas = [], [], []
+    for fila in filas:
+        if isinstance(fila, tuple):
+            empleado_id, fecha, hora = fila
+        else:
+            empleado_id, fecha, hora = fila.empleado_id, fila.fecha, fila.hora_entrada
+        empleado_ids.append(empleado_id)
+        dias.append(fecha.weekday())
+        entradas.append(_segundos(hora) if hora else None)
+    return empleado_ids, dias, entradas
+
+
+def _minutos_numpy(empleado_ids, dias, entradas, tabla):
+    claves = np.fromiter(tabla, dtype=np.int64, count=len(tabla))
+    orden = np.argsort(claves)
+    claves = claves[orden]
+    programadas = np.array(list(tabla.values()), dtype=np.float64).reshape(-1, 7)[orden]
+
+    ids = np.asarray(empleado_ids, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(claves, ids), max(len(claves) - 1, 0))
+    if len(claves):
+        programada = programadas[pos, np.asarray(dias, dtype=np.intp)]
+        programada[claves[pos] != ids] = np.nan
+    else:
+        programada = np.full(len(ids), np.nan)
+    return np.floor((np.asarray(entradas, dtype=np.float64) - programada) / 60)
+
+
+def _minutos_python(empleado_ids, dias, entradas, tabla):
+    sin_horario = (NAN,) * 7
+    resultado = []
+    for empleado_id, dia, entrada in zip(empleado_ids, dias, entradas):
+        programada = tabla.get(empleado_id, sin_horario)[dia]
+        if entrada is None or programada != programada:
+            resultado.append(NAN)
+        else:
+            resultado.append(math.floor((entrada - programada) / 60))
+    return resultado
+
+
+def minutos_columnas(empleado_ids, dias, entradas, tabla):
+    """Minutos de diferencia (redondeados hacia abajo; NaN si no aplica) de cada fila.
+
+    Devuelve un arreglo de NumPy si está disponible o una lista.
+    """
+    if np is not None:
+        return _minutos_numpy(empleado_ids, dias, entradas, tabla)
+    return _minutos_python(empleado_ids, dias, entradas, tabla)
+
+
+def diferencias_minutos(filas, indices=None):
+    """Minutos entre la entrada y la hora programada de cada asistencia.
+
+    Positivo = tarde. `indices` es `{empleado_id: indice}`; si no se pasa se
+    carga en bloque. Devuelve una lista alineada con `filas` (None si no
+    hay entrada u horario aplicable).
+    """
+    empleado_ids, dias, entradas = columnas(filas)
+    if indices is None:
+        indices = obtener_indices_horarios(set(empleado_ids))
+    minutos = minutos_columnas(empleado_ids, dias, entradas, tabla_entradas(indices))
+    if np is not None:
+        minutos = minutos.tolist()
+    return [None if m != m else int(m) for m in minutos]
+
+
+def minutos_para(indice, fecha, hora):
+    """`diferencias_minutos` de una sola checada con el índice semanal del empleado."""
+    return diferencias_minutos([(0, fecha, hora)], {0: indice})[0]
+
+
+def etiqueta_minutos(minutos):
+    """Texto mostrado al usuario ('A tiempo', 'N min tarde', 'N min antes').
+
+    Los minutos están redondeados hacia abajo: -1 corresponde a llegar menos
+    de un minuto antes, que es "A tiempo".
+    """
+    if minutos is None:
+        return None
+    if minutos in (0, -1):
+        return "A tiempo"
+    return f"{minutos} min tarde" if minutos > 0 else f"{-minutos} min antes"
+
+
+def etiquetas(minutos):
+    """`etiqueta_minutos` de cada valor; cada valor distinto se formatea una sola vez."""
+    textos = {}
+    resultado = []
+    for m in minutos:
+        texto = textos.get(m)
+        if texto is None and m not in textos:
+            texto = textos[m] = etiqueta_minutos(m)
+        resultado.append(texto)
+    return resultado
+
+
+def calcular(filas, indices=None):
+    """`(minutos, etiquetas)` de todas las asistencias de `filas` a la vez."""
+    minutos = diferencias_minutos(filas, indices)
+    return minutos, etiquetas(minutos)
+
+
+def minutos_trabajados(entrada, salida):
+    """Minutos entre entrada y salida del mismo día; None si falta alguna."""
+    if entrada is None or salida is None:
+        return None
+    segundos = _segundos(salida) - _segundos(entrada)
+    return int(segundos // 60) if segundos >= 0 else None
@@ -0,0 +1,336 @@
+"""
+Utilidades para el reporte y la exportación de asistencias.
+
+- Normalización de los filtros que llegan por GET.
+- Recorrido de asistencias por bloques con paginación keyset sobre
+  (fecha, hora_entrada, id), para no cargar la tabla completa en memoria.
+- Escritura del reporte XLSX con un workbook `write_only` de openpyxl.
+  La diferencia y los minutos trabajados se leen del resumen diario
+  (`ResumenAsistencia`), no se recalculan por fila.
+- Filtro, orden y estadísticas por minutos de retardo calculados en SQL
+  (`Asistencia.objects.con_puntualidad()`).
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils.dateparse import parse_date, parse_time
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from .models import Asistencia, Empleado
+
+
+TAMANO_BLOQUE = 2000
+
+# Paginación del reporte en pantalla
+REPORTE_POR_PAGINA = getattr(settings, 'REPORTE_POR_PAGINA', 50)
+REPORTE_POR_PAGINA_MAX = 500
+# Con filtros, el total se cuenta como mucho hasta este número de filas
+CONTEO_MAXIMO = 10000
+
+TIPOS_VALIDOS = {valor for valor, _ in Asistencia.TIPO_CHOICES}
+
+# Órdenes del reporte en pantalla; cada uno con su propio cursor keyset
+ORDEN_FECHA = 'fecha'
+ORDEN_RETARDO = 'retardo'
+
+
+def filtros_de_request(params):
+    """Normaliza los filtros del reporte a un dict de valores simples.
+
+    Acepta `empleado_id` (formulario del reporte) o `empleado` (enlace antiguo
+    de exportación). Valores vacíos, 'todos' o inválidos se descartan.
+    `retardo_minimo` deja solo las asistencias con más de esos minutos de retardo.
+    """
+    def fecha(nombre):
+        try:
+            valor = parse_date(params.get(nombre) or '')
+        except ValueError:
+            valor = None
+        return valor.isoformat() if valor else None
+
+    empleado_id = params.get('empleado_id') or params.get('empleado')
+    tipo = params.get('tipo')
+    retardo_minimo = (params.get('retardo_minimo') or '').strip()
+    return {
+        'fecha_inicio': fecha('fecha_inicio'),
+        'fecha_fin': fecha('fecha_fin'),
+        'empleado_id': int(empleado_id) if empleado_id and str(empleado_id).isdigit() else None,
+        'tipo': tipo if tipo in TIPOS_VALIDOS else None,
+        'retardo_minimo': int(retardo_minimo) if retardo_minimo.isdigit() else None,
+    }
+
+
+def hay_filtros(filtros):
+    return any(valor is not None for valor in filtros.values())
+
+
+def filtrar_asistencias(filtros, asistencias=None):
+    """Aplica los filtros normalizados por `filtros_de_request`."""
+    if asistencias is None:
+        asistencias = Asistencia.objects.all()
+    if filtros.get('fecha_inicio'):
+        asistencias = asistencias.filter(fecha__gte=filtros['fecha_inicio'])
+    if filtros.get('fecha_fin'):
+        asistencias = asistencias.filter(fecha__lte=filtros['fecha_fin'])
+    if filtros.get('empleado_id'):
+        asistencias = asistencias.filter(empleado_id=filtros['empleado_id'])
+    if filtros.get('tipo'):
+        asistencias = asistencias.filter(tipo=filtros['tipo'])
+    if filtros.get('retardo_minimo') is not None:
+        asistencias = asistencias.con_puntualidad().filter(minutos_diferencia__gt=filtros['retardo_minimo'])
+    return asistencias
+
+
+def estadisticas_retardo(asistencias):
+    """Retardos (más de 0 minutos tarde), promedio y máximo, en una consulta agregada."""
+    return asistencias.con_puntualidad().order_by().aggregate(
+        retardos=Count('pk', filter=Q(minutos_diferencia__gt=0)),
+        promedio=Avg('minutos_diferencia', filter=Q(minutos_diferencia__gt=0)),
+        maximo=Max('minutos_diferencia'),
+    )
+
+
+def orden_keyset():
+    """Orden descendente (fecha, hora_entrada, id) con los NULL de hora al final.
+
+    MySQL/MariaDB y SQLite ya ordenan NULL como el menor valor; solo en los
+    backends donde NULL es el mayor se fuerza `nulls_last`, para no
+    impedir el uso del índice con una expresión `IS NULL` en el ORDER BY.
+    """
+    hora = '-hora_entrada'
+    if connection.features.nulls_order_largest:
+        hora = F('hora_entrada').desc(nulls_last=True)
+    return ['-fecha', hora, '-id']
+
+
+def orden_retardo():
+    """Orden por minutos de retardo descendente (sin horario al final) e id."""
+    minutos = '-minutos_diferencia'
+    if connection.features.nulls_order_largest:
+        minutos = F('minutos_diferencia').desc(nulls_last=True)
+    return [minutos, '-id']
+
+
+def despues_de_retardo(asistencias, minutos, pk):
+    """Filas posteriores al cursor `(minutos, pk)` en `orden_retardo()`."""
+    if minutos is None:
+        return asistencias.filter(minutos_diferencia__isnull=True, id__lt=pk)
+    return asistencias.filter(
+        Q(minutos_diferencia__lt=minutos)
+        | Q(minutos_diferencia=minutos, id__lt=pk)
+        | Q(minutos_diferencia__isnull=True)
+    )
+
+
+def despues_de(asistencias, fecha, hora_entrada, pk):
+    """Filas posteriores al cursor `(fecha, hora_entrada, pk)` en `orden_keyset()`."""
+    if hora_entrada is None:
+        return asistencias.filter(
+            Q(fecha__lt=fecha) | Q(fecha=fecha, hora_entrada__isnull=True, id__lt=pk)
+        )
+    return asistencias.filter(
+        Q(fecha__lt=fecha)
+        | Q(fecha=fecha, hora_entrada__lt=hora_entrada)
+        | Q(fecha=fecha, hora_entrada=hora_entrada, id__lt=pk)
+        | Q(fecha=fecha, hora_entrada__isnull=True)
+    )
+
+
+def iterar_por_bloques(asistencias, campos, tamano=None):
+    """Recorre `asistencias` como tuplas `values_list(*campos)` en bloques keyset.
+
+    A diferencia de `.iterator()`, no depende de cursores del lado del
+    servidor (mysqlclient carga el resultado completo en memoria).
+    Las tres primeras posiciones de cada tupla son `id, fecha, hora_entrada`.
+    """
+    tamano = tamano or TAMANO_BLOQUE
+    campos = ('id', 'fecha', 'hora_entrada') + tuple(campos)
+    base = asistencias.order_by(*orden_keyset()).values_list(*campos)
+    bloque = list(base[:tamano])
+    while bloque:
+        yield bloque
+        if len(bloque) < tamano:
+            break
+        pk, fecha, hora = bloque[-1][:3]
+        bloque = list(despues_de(base, fecha, hora, pk)[:tamano])
+
+
+def codificar_cursor(fecha, hora_entrada, pk):
+    """Cursor de página como texto: 'fecha_hora_id' (hora vacía si es NULL)."""
+    return f"{fecha.isoformat()}_{hora_entrada.isoformat() if hora_entrada else ''}_{pk}"
+
+
+def codificar_cursor_retardo(minutos, pk):
+    """Cursor del orden por retardo: 'minutos_id' (minutos vacíos si es NULL)."""
+    return f"{'' if minutos is None else minutos}_{pk}"
+
+
+def decodificar_cursor(valor, orden=ORDEN_FECHA):
+    """Inverso de `codificar_cursor` (o `codificar_cursor_retardo`); None si no es válido."""
+    if orden == ORDEN_RETARDO:
+        try:
+            minutos, pk = (valor or '').split('_')
+            return (int(minutos) if minutos else None), int(pk)
+        except ValueError:
+            return None
+    try:
+        fecha, hora, pk = (valor or '').split('_')
+        fecha = parse_date(fecha)
+        hora = parse_time(hora) if hora else None
+        pk = int(pk)
+    except ValueError:
+        return None
+    if fecha is None:
+        return None
+    return fecha, hora, pk
+
+
+def por_pagina(valor):
+    """Tamaño de página pedido, acotado a [10, REPORTE_POR_PAGINA_MAX]."""
+    try:
+        return max(10, min(int(valor), REPORTE_POR_PAGINA_MAX))
+    except (TypeError, ValueError):
+        return REPORTE_POR_PAGINA
+
+
+def pagina_keyset(asistencias, cursor=None, tamano=None, orden=ORDEN_FECHA):
+    """Devuelve `(filas, siguiente_cursor)` de la página que sigue a `cursor`.
+
+    El costo de cualquier página es el mismo que el de la primera: se busca
+    en el índice (fecha, hora_entrada, id) a partir del cursor en lugar de
+    saltar filas con OFFSET. Con `orden=ORDEN_RETARDO` las filas se ordenan
+    por minutos de retardo (calculados en SQL, sin índice: conviene acotar
+    el rango de fechas).
+    """
+    tamano = tamano or REPORTE_POR_PAGINA
+    if orden == ORDEN_RETARDO:
+        asistencias = asistencias.con_puntualidad().order_by(*orden_retardo())
+        if cursor:
+            asistencias = despues_de_retardo(asistencias, *cursor)
+    else:
+        asistencias = asistencias.order_by(*orden_keyset())
+        if cursor:
+            asistencias = despues_de(asistencias, *cursor)
+    filas = list(asistencias[:tamano + 1])
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        ultima = filas[-1]
+        if orden == ORDEN_RETARDO:
+            siguiente = codificar_cursor_retardo(ultima.minutos_diferencia, ultima.pk)
+        else:
+            siguiente = codificar_cursor(ultima.fecha, ultima.hora_entrada, ultima.pk)
+    return filas, siguiente
+
+
+def conteo_aproximado(asistencias, filtrado):
+    """Devuelve `(total, exacto)` sin recorrer toda la tabla.
+
+    Sin filtros en MySQL/MariaDB se usa la estadística de la tabla; con
+    filtros se cuenta como mucho hasta `CONTEO_MAXIMO` filas.
+    """
+    if not filtrado and connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [Asistencia._meta.db_table],
+            )
+            fila = cursor.fetchone()
+        if fila and fila[0] is not None:
+            return int(fila[0]), False
+
+    total = asistencias.order_by()[:CONTEO_MAXIMO + 1].count()
+    if total > CONTEO_MAXIMO:
+        return CONTEO_MAXIMO, False
+    return total, True
+
+
+# Columnas del reporte: (encabezado, ancho de los datos). Los anchos salen de
+# la definición de los campos para no recorrer las celdas dos veces.
+_ANCHO_MAX = 50
+COLUMNAS_REPORTE = [
+    ('Fecha', len('dd/mm/aaaa')),
+    ('Empleado', Empleado._meta.get_field('nombre').max_length + Empleado._meta.get_field('apellido').max_length + 1),
+    ('Entrada', len('hh:mm:ss')),
+    ('Salida', len('hh:mm:ss')),
+    ('Diferencia (min)', len('-9999')),
+    ('Trabajado (min)', len('9999')),
+    ('Tipo', max(len(etiqueta) for _, etiqueta in Asistencia.TIPO_CHOICES)),
+    ('Observaciones', _ANCHO_MAX),
+]
+
+
+def escribir_asistencias_xlsx(asistencias, destino, progreso=None):
+    """Escribe el reporte de asistencias en `destino` (ruta o archivo binario).
+
+    Usa un workbook `write_only` y lee las filas por bloques, por lo que la
+    memoria no crece con el número de filas. `progreso(n)` se llama tras
+    cada bloque con el total de filas escritas.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Asistencias")
+
+    for i, (encabezado, ancho) in enumerate(COLUMNAS_REPORTE, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = min(max(len(encabezado), ancho), _ANCHO_MAX) + 6
+
+    ultima_col = get_column_letter(len(COLUMNAS_REPORTE))
+    ws.merged_cells.add(f"A1:{ultima_col}1")
+    titulo = WriteOnlyCell(ws, value="Reporte de Asistencias")
+    titulo.font = Font(size=16, bold=True)
+    titulo.alignment = Alignment(horizontal="center")
+    ws.append([titulo])
+
+    thin = Border(
+        left=Side(style="thin"),
+        right=Side(style="thin"),
+        top=Side(style="thin"),
+        bottom=Side(style="thin")
+    )
+
+    header_fill = PatternFill(start_color="DDDDDD", fill_type="solid")
+    header_font = Font(bold=True)
+    header_alignment = Alignment(horizontal="center")
+    encabezados = []
+    for encabezado, _ in COLUMNAS_REPORTE:
+        c = WriteOnlyCell(ws, value=encabezado)
+        c.fill = header_fill
+        c.font = header_font
+        c.alignment = header_alignment
+        c.border = thin
+        encabezados.append(c)
+    ws.append(encabezados)
+
+    def celda(valor):
+        c = WriteOnlyCell(ws, value=valor)
+        c.border = thin
+        return c
+
+    tipos = dict(Asistencia.TIPO_CHOICES)
+    campos = (
+        'empleado__nombre', 'empleado__apellido', 'hora_salida',
+        'resumen__diferencia_minutos', 'resumen__minutos_trabajados', 'tipo', 'observaciones',
+    )
+    filas = 0
+    for bloque in iterar_por_bloques(asistencias, campos):
+        for _, fecha, entrada, nombre, apellido, salida, diferencia, trabajado, tipo, observaciones in bloque:
+            ws.append([
+                celda(fecha.strftime("%d/%m/%Y")),
+                celda(f"{nombre} {apellido}"),
+                celda(entrada.strftime("%H:%M:%S") if entrada else "-"),
+                celda(salida.strftime("%H:%M:%S") if salida else "-"),
+                celda(diferencia if diferencia is not None else "-"),
+                celda(trabajado if trabajado is not None else "-"),
+                celda(tipos.get(tipo, tipo)),
+                celda(observaciones or "-"),
+            ])
+        filas += len(bloque)
+        if progreso:
+            progreso(filas)
+
+    ws.auto_filter.ref = f"A2:{ultima_col}{filas + 2}"
+    wb.save(destino)
+    return filas
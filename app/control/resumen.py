@@ -0,0 +1,148 @@
+"""
+Resumen diario de asistencia por empleado (tabla `ResumenAsistencia`).
+
+Guarda ya calculados la diferencia contra el horario, los minutos
+trabajados, el tipo y si hay justificante, para que el dashboard, el
+reporte y las exportaciones no recalculen `Asistencia.diferencia` fila por
+fila. Se mantiene de forma incremental desde el checado y las señales de
+Asistencia/Justificante. Al cambiar un horario o sus asignaciones, las
+señales regeneran en segundo plano el resumen de los empleados afectados
+(`reconstruir_empleados`); `reconstruir` (comando `reconstruir_resumen`) lo
+regenera completo. La migración 0017 tiene su propia copia del cálculo.
+"""
+from django.db import connection
+from django.db.models import Avg, Count, Exists, OuterRef, Q
+
+from . import metricas
+from .models import Asistencia, Justificante, ResumenAsistencia
+from .puntualidad import diferencias_minutos, minutos_trabajados
+
+TAMANO_BLOQUE = 1000
+
+CAMPOS_ACTUALIZABLES = [
+    'empleado', 'fecha', 'diferencia_minutos', 'minutos_trabajados', 'tipo', 'tiene_justificante',
+]
+
+
+def _con_justificante(asistencias):
+    """Asistencias con solo los campos del resumen y la marca `con_justificante`."""
+    return asistencias.only(
+        'id', 'empleado_id', 'fecha', 'hora_entrada', 'hora_salida', 'tipo',
+    ).annotate(
+        con_justificante=Exists(Justificante.objects.filter(asistencia_id=OuterRef('pk'))),
+    )
+
+
+def construir(asistencias, indices=None):
+    """`ResumenAsistencia` sin guardar para cada asistencia.
+
+    `con_justificante` se toma de la anotación de `_con_justificante`; una
+    asistencia sin ella (recién creada) no tiene justificantes.
+    """
+    asistencias = list(asistencias)
+    resumenes = []
+    for a, minutos in zip(asistencias, diferencias_minutos(asistencias, indices)):
+        resumenes.append(ResumenAsistencia(
+            asistencia_id=a.pk,
+            empleado_id=a.empleado_id,
+            fecha=a.fecha,
+            diferencia_minutos=minutos,
+            minutos_trabajados=minutos_trabajados(a.hora_entrada, a.hora_salida),
+            tipo=a.tipo,
+            tiene_justificante=getattr(a, 'con_justificante', False),
+        ))
+    return resumenes
+
+
+def guardar(resumenes):
+    """Inserta o reemplaza los resúmenes con un upsert por bloque."""
+    if not resumenes:
+        return
+    opciones = {'update_conflicts': True, 'update_fields': CAMPOS_ACTUALIZABLES}
+    # MySQL/MariaDB (ON DUPLICATE KEY UPDATE) no admite indicar la clave en conflicto
+    if connection.features.supports_update_conflicts_with_target:
+        opciones['unique_fields'] = ['asistencia']
+    ResumenAsistencia.objects.bulk_create(resumenes, batch_size=TAMANO_BLOQUE, **opciones)
+    metricas.invalidar()
+
+
+def actualizar(asistencias):
+    """Recalcula el resumen de las asistencias de un queryset.
+
+    Se usa tras escrituras que no disparan `post_save` (`update`,
+    `bulk_create`, `bulk_update`): una consulta de lectura y un upsert.
+    """
+    filas = list(_con_justificante(asistencias).order_by())
+    guardar(construir(filas))
+    return len(filas)
+
+
+def actualizar_justificante(asistencia_id):
+    """Refresca `tiene_justificante` del resumen, si existe, con un solo UPDATE.
+
+    No crea el resumen: al borrar una asistencia en cascada, el resumen
+    puede haberse borrado antes que sus justificantes.
+    """
+    ResumenAsistencia.objects.filter(asistencia_id=asistencia_id).update(
+        tiene_justificante=Exists(Justificante.objects.filter(asistencia_id=OuterRef('asistencia_id'))),
+    )
+    metricas.invalidar()
+
+
+def reconstruir(desde=None, hasta=None, tamano=None, progreso=None, empleado_ids=None):
+    """Regenera el resumen de todas las asistencias (o de un rango de fechas).
+
+    Recorre las asistencias por bloques de clave primaria, así que la
+    memoria no depende del tamaño de la tabla. `empleado_ids` limita la
+    regeneración a esos empleados. `progreso(n)` se llama tras cada bloque.
+    Devuelve el número de asistencias procesadas.
+    """
+    tamano = tamano or TAMANO_BLOQUE
+    asistencias = Asistencia.objects.all()
+    if empleado_ids is not None:
+        asistencias = asistencias.filter(empleado_id__in=list(empleado_ids))
+    if desde:
+        asistencias = asistencias.filter(fecha__gte=desde)
+    if hasta:
+        asistencias = asistencias.filter(fecha__lte=hasta)
+    asistencias = _con_justificante(asistencias).order_by('pk')
+
+    total, ultimo = 0, 0
+    while True:
+        bloque = list(asistencias.filter(pk__gt=ultimo)[:tamano])
+        if not bloque:
+            break
+        guardar(construir(bloque))
+        total += len(bloque)
+        ultimo = bloque[-1].pk
+        if progreso:
+            progreso(total)
+        if len(bloque) < tamano:
+            break
+    return total
+
+
+def reconstruir_empleados(empleado_ids):
+    """Regenera el resumen de los empleados cuyo horario cambió.
+
+    La diferencia se calcula contra el horario vigente para todas las
+    fechas (igual que `Asistencia.con_puntualidad`), así que se recorren
+    todas sus asistencias.
+    """
+    if not empleado_ids:
+        return 0
+    return reconstruir(empleado_ids=empleado_ids)
+
+
+def totales_del_dia(fecha):
+    """Conteos del día para el dashboard, con una sola consulta agregada."""
+    return ResumenAsistencia.objects.filter(fecha=fecha).aggregate(
+        registros=Count('pk'),
+        asistencias=Count('pk', filter=Q(tipo__in=('normal', 'retardo'))),
+        retardos=Count('pk', filter=Q(tipo='retardo')),
+        faltas=Count('pk', filter=Q(tipo='falta')),
+        justificadas=Count('pk', filter=Q(tipo='justificada')),
+        sin_salida=Count('pk', filter=Q(tipo__in=('normal', 'retardo'), minutos_trabajados__isnull=True)),
+        con_justificante=Count('pk', filter=Q(tiene_justificante=True)),
+        retardo_promedio=Avg('diferencia_minutos', filter=Q(tipo='retardo')),
+    )
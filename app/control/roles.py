@@ -0,0 +1,67 @@
+"""
+Roles (grupos de Django) del usuario sin consultas repetidas.
+
+Los nombres de los grupos de cada usuario se guardan en la caché compartida
+y, dentro de una petición, sobre el propio objeto `user`: las vistas, el
+filtro `has_group` del navbar y el login consultan la base de datos como
+mucho una vez por usuario hasta que cambian sus grupos. Las señales de
+`control.signals` invalidan la entrada al añadir o quitar grupos de un
+usuario y al renombrar o borrar un grupo, una vez confirmada la transacción.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+ADMINISTRACION = 'administracion'
+EMPLEADO = 'empleado'
+SUPERVISORES = 'supervisores'
+
+# Tiempo de vida de los grupos cacheados (se invalidan por señales)
+ROLES_TTL = getattr(settings, 'ROLES_TTL', 60 * 60)
+
+_ATRIBUTO = '_grupos_control'
+
+
+def _clave(user_id):
+    return f'control:roles:{user_id}'
+
+
+def grupos(user):
+    """Nombres de los grupos del usuario (conjunto vacío si no está autenticado)."""
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    nombres = getattr(user, _ATRIBUTO, None)
+    if nombres is None:
+        clave = _clave(user.pk)
+        nombres = cache.get(clave)
+        if nombres is None:
+            nombres = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(clave, nombres, ROLES_TTL)
+        setattr(user, _ATRIBUTO, nombres)
+    return nombres
+
+
+def tiene_grupo(user, nombre):
+    return nombre in grupos(user)
+
+
+def es_administracion(user):
+    return tiene_grupo(user, ADMINISTRACION)
+
+
+def clave_rol(user):
+    """Identificador del conjunto de roles, para cachear lo que solo depende de ellos."""
+    if user is None or not user.is_authenticated:
+        return 'anonimo'
+    return ','.join(sorted(grupos(user))) or 'sin-grupo'
+
+
+def olvidar(user_ids):
+    """Elimina de la caché los grupos de los usuarios dados."""
+    claves = [_clave(pk) for pk in user_ids if pk is not None]
+    if claves:
+        cache.delete_many(claves)
+
+
+def olvidar_en_instancia(user):
+    """Descarta los grupos memorizados en el objeto `user` (p. ej. tras `groups.add`)."""
+    user.__dict__.pop(_ATRIBUTO, None)
@@ -9,9 +9,10 @@ problemas de orden.
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
 from django.apps import apps
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver as receiver2
 from django.conf import settings
+from django.db import transaction
 
 
 @receiver(post_migrate)
@@ -53,3 +54,150 @@ def justificar_asistencia_on_approval(sender, instance, created, **kwargs):
 			asistencia.tipo = 'justificada'
 			asistencia.save()
 
+
+# Resumen diario (ver `control.resumen`): las escrituras con `save()` se
+# reflejan aquí; `update`/`bulk_*` del checado lo actualizan explícitamente.
+@receiver2(post_save, sender='control.Asistencia')
+def actualizar_resumen_on_asistencia(sender, instance, created, raw=False, **kwargs):
+	if raw:
+		return
+	from . import resumen
+	if created:
+		# Recién creada: no tiene justificantes y no hace falta releerla
+		resumen.guardar(resumen.construir([instance]))
+	else:
+		resumen.actualizar(sender.objects.filter(pk=instance.pk))
+
+
+@receiver2(post_save, sender='control.Justificante')
+@receiver2(post_delete, sender='control.Justificante')
+def actualizar_resumen_on_justificante(sender, instance, **kwargs):
+	if kwargs.get('raw'):
+		return
+	from . import resumen
+	resumen.actualizar_justificante(instance.asistencia_id)
+
+
+
+# Índice de horarios por empleado: invalidar la caché cuando cambian los
+# horarios o sus asignaciones (ver `models.obtener_indice_horarios`). Los
+# empleados afectados se leen ya, pero la caché se limpia al confirmar la
+# transacción: antes, un checado concurrente volvería a cachear el horario viejo.
+# Después se regenera en segundo plano su resumen diario (ver `control.resumen`).
+def _empleados_de_horario(horario):
+	return list(horario.empleados.values_list('pk', flat=True))
+
+
+def _invalidar_indice(empleado_ids):
+	from . import resumen, tareas
+	from .models import invalidar_indice_horarios
+
+	def al_confirmar():
+		invalidar_indice_horarios(empleado_ids)
+		tareas.en_segundo_plano(resumen.reconstruir_empleados, empleado_ids)
+
+	transaction.on_commit(al_confirmar)
+
+
+@receiver2(post_save, sender='control.Horario')
+def invalidar_indice_on_horario_save(sender, instance, created, **kwargs):
+	"""Un Horario editado afecta a todos los empleados que lo tienen asignado."""
+	if created:
+		return
+	_invalidar_indice(_empleados_de_horario(instance))
+
+
+@receiver2(pre_delete, sender='control.Horario')
+def invalidar_indice_on_horario_delete(sender, instance, **kwargs):
+	"""Capturar los empleados antes de que se borren las filas de la tabla intermedia."""
+	_invalidar_indice(_empleados_de_horario(instance))
+
+
+@receiver2(m2m_changed, sender='control.Empleado_horarios')
+def invalidar_indice_on_asignacion(sender, instance, action, reverse, pk_set, **kwargs):
+	"""Asignar/quitar horarios (desde el empleado o desde el horario)."""
+	if action not in ('post_add', 'post_remove', 'pre_clear'):
+		return
+	if not reverse:
+		empleado_ids = [instance.pk]
+	elif pk_set:
+		empleado_ids = list(pk_set)
+	else:
+		empleado_ids = _empleados_de_horario(instance)
+	_invalidar_indice(empleado_ids)
+
+
+# Caché RFC -> empleado del checado: evictar al guardar o borrar un Empleado.
+# Al confirmar, para que ningún worker vuelva a cachear el valor anterior.
+@receiver2(post_save, sender='control.Empleado')
+@receiver2(post_delete, sender='control.Empleado')
+def olvidar_rfc_on_empleado_change(sender, instance, **kwargs):
+	from .checkin import olvidar_empleado
+	empleado_id = instance.pk
+	transaction.on_commit(lambda: olvidar_empleado(empleado_id))
+
+
+@receiver2(post_save, sender='control.SystemConfig')
+@receiver2(post_delete, sender='control.SystemConfig')
+def invalidar_systemconfig_cache(sender, **kwargs):
+	"""Invalidar la configuración cacheada (la caché compartida avisa al resto de workers).
+
+	Al confirmar la transacción: antes, otra petición volvería a cachear la fila anterior.
+	"""
+	transaction.on_commit(sender.invalidar_cache)
+
+
+# Grupos cacheados por usuario (ver `control.roles`). Se olvidan al confirmar
+# la transacción: antes, otra petición podría volver a cachear los grupos viejos.
+def _usuarios_de_grupo(grupo):
+	return list(grupo.user_set.values_list('pk', flat=True))
+
+
+def _olvidar_roles(user_ids):
+	from . import roles
+	transaction.on_commit(lambda: roles.olvidar(user_ids))
+
+
+@receiver2(m2m_changed, sender='auth.User_groups')
+def olvidar_roles_on_asignacion(sender, instance, action, reverse, pk_set, **kwargs):
+	"""Añadir/quitar grupos (desde el usuario o desde el grupo)."""
+	if action not in ('post_add', 'post_remove', 'pre_clear'):
+		return
+	from . import roles
+	if not reverse:
+		roles.olvidar_en_instancia(instance)
+		user_ids = [instance.pk]
+	elif pk_set:
+		user_ids = list(pk_set)
+	else:
+		user_ids = _usuarios_de_grupo(instance)
+	_olvidar_roles(user_ids)
+
+
+@receiver2(post_save, sender='auth.Group')
+@receiver2(pre_delete, sender='auth.Group')
+def olvidar_roles_on_grupo(sender, instance, created=False, **kwargs):
+	"""Renombrar o borrar un grupo afecta a todos sus usuarios."""
+	if created:
+		return
+	_olvidar_roles(_usuarios_de_grupo(instance))
+
+
+# Métricas del dashboard (ver `control.metricas`). Guardar una Asistencia
+# ya invalida desde `resumen.guardar` (igual que `update`/`bulk_*` y `faltas`).
+@receiver2(post_save, sender='control.Empleado')
+@receiver2(post_delete, sender='control.Empleado')
+@receiver2(post_save, sender='control.Horario')
+@receiver2(post_delete, sender='control.Horario')
+@receiver2(post_delete, sender='control.Asistencia')
+def invalidar_metricas_on_escritura(sender, **kwargs):
+	from . import metricas
+	metricas.invalidar()
+
+
+@receiver2(m2m_changed, sender='control.Empleado_horarios')
+def invalidar_metricas_on_asignacion(sender, action, **kwargs):
+	"""Asignar o quitar horarios cambia el conteo de empleados sin horario."""
+	if action in ('post_add', 'post_remove', 'post_clear'):
+		from . import metricas
+		metricas.invalidar()
@@ -0,0 +1,85 @@
+// Sugerencias de empleados para los campos con data-autocompletar-empleado
+// (URL de control:buscar_empleados). Si el campo tiene data-destino, el id del
+// empleado elegido se copia a ese campo oculto; si el texto no corresponde a
+// una sugerencia, el campo oculto queda vacío. Con data-elegidos (varios
+// empleados) cada sugerencia elegida se agrega a ese contenedor con su propio
+// campo oculto `data-nombre` y el texto se limpia para buscar el siguiente.
+document.querySelectorAll('[data-autocompletar-empleado]').forEach(function (campo) {
+    if (campo.dataset.autocompletarListo) {
+        return;
+    }
+    campo.dataset.autocompletarListo = '1';
+
+    const url = campo.dataset.autocompletarEmpleado;
+    const lista = document.getElementById(campo.getAttribute('list'));
+    const destino = campo.dataset.destino ? document.getElementById(campo.dataset.destino) : null;
+    const elegidos = campo.dataset.elegidos ? document.getElementById(campo.dataset.elegidos) : null;
+    let ids = {};
+    let espera = null;
+    let peticion = null;
+
+    function agregar(id, etiqueta) {
+        if (!elegidos.querySelector('[data-empleado="' + id + '"]')) {
+            const elegido = document.createElement('span');
+            elegido.className = 'badge bg-secondary me-1 mb-1';
+            elegido.dataset.empleado = id;
+            elegido.textContent = etiqueta + ' ';
+            const valor = document.createElement('input');
+            valor.type = 'hidden';
+            valor.name = campo.dataset.nombre;
+            valor.value = id;
+            const quitar = document.createElement('button');
+            quitar.type = 'button';
+            quitar.className = 'btn-close btn-close-white btn-sm ms-1';
+            quitar.setAttribute('aria-label', 'Quitar');
+            elegido.append(valor, quitar);
+            elegidos.append(elegido);
+        }
+        campo.value = '';
+    }
+
+    function elegir() {
+        if (destino) {
+            destino.value = ids[campo.value] || '';
+        }
+        if (elegidos && ids[campo.value]) {
+            agregar(ids[campo.value], campo.value);
+        }
+    }
+
+    if (elegidos) {
+        elegidos.addEventListener('click', function (evento) {
+            if (evento.target.matches('.btn-close')) {
+                evento.target.closest('[data-empleado]').remove();
+            }
+        });
+    }
+
+    campo.addEventListener('input', function () {
+        elegir();
+        clearTimeout(espera);
+        const texto = campo.value.trim();
+        if (!texto || ids[campo.value]) {
+            return;
+        }
+        espera = setTimeout(function () {
+            if (peticion) {
+                peticion.abort();
+            }
+            peticion = new AbortController();
+            fetch(url + '?' + new URLSearchParams({q: texto}), {signal: peticion.signal})
+                .then(response => response.json())
+                .then(function (data) {
+                    ids = {};
+                    lista.replaceChildren(...data.resultados.map(function (empleado) {
+                        ids[empleado.etiqueta] = empleado.id;
+                        const opcion = document.createElement('option');
+                        opcion.value = empleado.etiqueta;
+                        return opcion;
+                    }));
+                    elegir();
+                })
+                .catch(() => {});
+        }, 150);
+    });
+});
@@ -0,0 +1,48 @@
+"""
+Ejecución local de tareas en segundo plano.
+
+Un pool de hilos por proceso, sin broker externo. Las tareas se encolan al
+confirmar la transacción (`on_commit`) para que el hilo vea las filas
+recién creadas. El estado durable vive en la base de datos (p. ej.
+`Exportacion.estado`), de modo que un comando de gestión puede retomar lo
+que quedó pendiente si el proceso se reinicia.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TAREAS_WORKERS', 2),
+                thread_name_prefix='control-tareas',
+            )
+        return _executor
+
+
+def _ejecutar(funcion, args):
+    close_old_connections()
+    try:
+        funcion(*args)
+    except Exception:
+        logger.exception("Error en tarea en segundo plano %s", getattr(funcion, '__name__', funcion))
+    finally:
+        # Igual que al terminar una petición: se cierra (o vuelve al pool) salvo
+        # que CONN_MAX_AGE permita reutilizarla en la siguiente tarea del hilo
+        close_old_connections()
+
+
+def en_segundo_plano(funcion, *args):
+    """Ejecuta `funcion(*args)` en el pool cuando se confirme la transacción actual."""
+    transaction.on_commit(lambda: _get_executor().submit(_ejecutar, funcion, args))
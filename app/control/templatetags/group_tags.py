@@ -1,5 +1,7 @@
 from django import template
 
+from control import roles
+
 register = template.Library()
 
 
@@ -9,10 +11,21 @@ def has_group(user, group_name):
 
     Safe to call with AnonymousUser.
     Usage in template: {% if user|has_group:"administracion" %}
+    Groups are loaded once per user (see `control.roles`).
     """
     try:
-        if not user or not user.is_authenticated:
-            return False
-        return user.groups.filter(name=group_name).exists()
+        return roles.tiene_grupo(user, group_name)
     except Exception:
         return False
+
+
+@register.filter(name='clave_rol')
+def clave_rol(user):
+    """Cache key fragment for markup that only depends on the user's roles.
+
+    Usage in template: {% cache 3600 fragment_name user|clave_rol %}
+    """
+    try:
+        return roles.clave_rol(user)
+    except Exception:
+        return 'anonimo'
@@ -1,3 +1,1245 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db.models import QuerySet
+from django.template import Context, Template
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from PyPDF2 import PdfReader
+
+from . import (
+    checkin, exportaciones, faltas, forms, models, pases_lote, pases_pdf, puntualidad, reportes, resumen, roles,
+    tareas, tiempo_real, utils_pdf,
+)
+from .management.commands.benchmark_pdf import crear_template_sintetico
+from .models import (
+    DIAS_SEMANA, Asistencia, Empleado, Exportacion, Horario, Justificante, Pase, ResumenAsistencia, SystemConfig,
+)
+
+
+LUNES = datetime.date(2025, 11, 24)
+SABADO = datetime.date(2025, 11, 29)
+ENTRE_SEMANA = ','.join(DIAS_SEMANA[:5])
+TODA_LA_SEMANA = ','.join(DIAS_SEMANA)
+
+
+def crear_admin(username):
+    """Usuario del grupo administracion."""
+    user = User.objects.create_user(username, password='x')
+    user.groups.add(Group.objects.get_or_create(name='administracion')[0])
+    return user
+
+
+def crear_horario(dias=TODA_LA_SEMANA, entrada=datetime.time(8, 0), salida=datetime.time(16, 0), **campos):
+    return Horario.objects.create(dias_laborales=dias, hora_entrada=entrada, hora_salida=salida, **campos)
+
+
+def crear_empleado(username, rfc, horarios=(), nombre='N', apellido='A', puesto='P', **campos):
+    """Empleado con su propio usuario, asignado a `horarios`."""
+    user = User.objects.create_user(username, password='x')
+    empleado = Empleado.objects.create(user=user, nombre=nombre, apellido=apellido, puesto=puesto, rfc=rfc, **campos)
+    if horarios:
+        empleado.horarios.add(*horarios)
+    return empleado
+
+
+def crear_empleados(prefijo, cantidad, rfc, nombre='N{}', horarios=(), **campos):
+    """`cantidad` empleados; `{}` en `rfc` y `nombre` se sustituye por el índice."""
+    return [
+        crear_empleado(f'{prefijo}{i}', rfc.format(i), horarios, nombre=nombre.format(i), **campos)
+        for i in range(cantidad)
+    ]
+
+
+class ControlTestCase(TestCase):
+    """Cada prueba empieza con las cachés vacías (índice de horarios, métricas y RFC)."""
+
+    def setUp(self):
+        cache.clear()
+        checkin._rfc_cache.clear()
+
+    def usar_media_temporal(self, **ajustes):
+        """MEDIA_ROOT en un directorio temporal que se borra al terminar la prueba."""
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, **ajustes)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def crear_templates_pase(self):
+        """Plantillas sintéticas de pase de entrada y de salida en MEDIA_ROOT."""
+        self.addCleanup(utils_pdf.limpiar_cache_templates)
+        os.makedirs(os.path.join(self.media, 'pases_form'))
+        for tipo, nombre in utils_pdf.TEMPLATES_PASE.items():
+            crear_template_sintetico(os.path.join(self.media, 'pases_form', nombre), f'PASE DE {tipo.upper()}')
+        utils_pdf.limpiar_cache_templates()
+
+
+class IndiceHorariosTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.matutino = crear_horario(ENTRE_SEMANA, datetime.time(9, 0), datetime.time(17, 0), nombre='Matutino')
+        self.temprano = crear_horario('Lunes', datetime.time(7, 0), datetime.time(15, 0), nombre='Temprano')
+        self.empleado = crear_empleado(
+            'empleado1', 'RAAA800101AB1', [self.matutino, self.temprano], nombre='Ana', apellido='Ramos',
+            puesto='Analista',
+        )
+
+    def test_elige_horario_mas_temprano_del_dia(self):
+        self.assertEqual(self.empleado.get_horario_para_fecha(LUNES), self.temprano)
+        self.assertEqual(self.empleado.get_horario_para_fecha(LUNES + datetime.timedelta(days=1)), self.matutino)
+        self.assertIsNone(self.empleado.get_horario_para_fecha(SABADO))
+
+    def test_mascara_de_dias_indexada(self):
+        self.assertEqual(self.matutino.dias_mask, 0b0011111)
+        self.assertEqual(set(Horario.objects.del_dia(0)), {self.matutino, self.temprano})
+        self.assertEqual(list(Horario.objects.del_dia(5)), [])
+
+        self.temprano.dias_laborales = 'Domingo,Sábado'
+        self.temprano.save(update_fields=['dias_laborales'])
+        self.temprano.refresh_from_db()
+        self.assertEqual(self.temprano.dias_mask, 0b1100000)
+        self.assertEqual(list(Horario.objects.del_dia(6)), [self.temprano])
+
+        self.client.force_login(crear_admin('admin_hor'))
+        respuesta = self.client.get(reverse('control:listar_horarios'), {'dia': 5})
+        self.assertEqual(list(respuesta.context['horarios']), [self.temprano])
+
+    def test_indice_cacheado_sin_consultas(self):
+        self.empleado.get_horario_para_fecha(LUNES)
+        with self.assertNumQueries(0):
+            self.empleado.get_horario_para_fecha(LUNES)
+            self.empleado.get_horario_para_fecha(SABADO)
+
+    def test_invalidacion_al_cambiar_horarios(self):
+        self.assertEqual(self.empleado.get_horario_para_fecha(LUNES), self.temprano)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empleado.horarios.remove(self.temprano)
+        self.assertEqual(self.empleado.get_horario_para_fecha(LUNES), self.matutino)
+
+        self.matutino.dias_laborales = 'Sábado'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.matutino.save()
+            # Hasta confirmar la transacción se sigue usando el índice cacheado
+            self.assertEqual(self.empleado.get_horario_para_fecha(LUNES), self.matutino)
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(self.empleado.get_horario_para_fecha(LUNES))
+        self.assertEqual(self.empleado.get_horario_para_fecha(SABADO), self.matutino)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.matutino.delete()
+        self.assertIsNone(self.empleado.get_horario_para_fecha(SABADO))
+
+
+class CheckinTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleado = crear_empleado(
+            'kiosko1', 'GACC800101AB1', [crear_horario()], nombre='Carlos', apellido='Garcia', puesto='Operador',
+        )
+        SystemConfig.invalidar_cache()
+        SystemConfig.get_solo()
+
+    def momento(self, hora, minuto):
+        return timezone.make_aware(datetime.datetime.combine(LUNES, datetime.time(hora, minuto)))
+
+    def test_entrada_calcula_tipo_antes_de_escribir(self):
+        resultado = checkin.registrar_entrada('gacc800101ab1', self.momento(8, 20))
+        self.assertEqual(resultado['tipo'], 'retardo')
+        self.assertEqual(resultado['diferencia_minutos'], 20)
+        asistencia = Asistencia.objects.get(empleado=self.empleado, fecha=LUNES)
+        self.assertEqual(asistencia.tipo, 'retardo')
+        self.assertEqual(asistencia.hora_entrada, datetime.time(8, 20))
+
+    def test_entrada_duplicada_y_salida(self):
+        checkin.registrar_entrada(self.empleado.rfc, self.momento(7, 58))
+        with self.assertRaises(checkin.ChecadoError):
+            checkin.registrar_entrada(self.empleado.rfc, self.momento(7, 59))
+
+        checkin.registrar_salida(self.empleado.rfc, self.momento(16, 5))
+        with self.assertRaises(checkin.ChecadoError):
+            checkin.registrar_salida(self.empleado.rfc, self.momento(16, 6))
+        asistencia = Asistencia.objects.get(empleado=self.empleado, fecha=LUNES)
+        self.assertEqual(asistencia.tipo, 'normal')
+        self.assertEqual(asistencia.hora_salida, datetime.time(16, 5))
+
+    def test_salida_sin_entrada(self):
+        with self.assertRaises(checkin.ChecadoError):
+            checkin.registrar_salida(self.empleado.rfc, self.momento(16, 0))
+
+    def test_presupuesto_de_consultas_por_checada(self):
+        self.empleado.get_horario_para_fecha()
+        SystemConfig.get_cached()
+        # RFC + INSERT + upsert del resumen (SAVEPOINT/RELEASE por el TestCase)
+        with self.assertNumQueries(5):
+            respuesta = self.client.post(reverse('control:registrar_entrada'), {'rfc': self.empleado.rfc})
+        self.assertEqual(respuesta.json()['status'], 'success')
+
+        # RFC ya en caché: UPDATE condicional + lectura y upsert del resumen
+        with self.assertNumQueries(3):
+            respuesta = self.client.post(reverse('control:registrar_salida'), {'rfc': self.empleado.rfc})
+        self.assertEqual(respuesta.json()['status'], 'success')
+
+    def test_rfc_inexistente(self):
+        respuesta = self.client.post(reverse('control:registrar_entrada'), {'rfc': 'NOEXISTE'})
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class RegistroLoteTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleados = crear_empleados(
+            'lote', 3, 'LOTE80010{}AB1', 'Nombre{}', [crear_horario()], apellido='Lote', puesto='Operador',
+        )
+        self.dia = timezone.localdate() - datetime.timedelta(days=1)
+
+    def evento(self, empleado, hora, direccion):
+        momento = datetime.datetime.combine(self.dia, hora)
+        return {'rfc': empleado.rfc.lower(), 'timestamp': momento.isoformat(), 'direccion': direccion}
+
+    def test_lote_conserva_hora_original_y_es_idempotente(self):
+        eventos = [
+            self.evento(self.empleados[0], datetime.time(16, 0), 'salida'),
+            self.evento(self.empleados[0], datetime.time(7, 55), 'entrada'),
+            self.evento(self.empleados[1], datetime.time(8, 30), 'entrada'),
+            {'rfc': 'NOEXISTE', 'timestamp': self.dia.isoformat() + 'T08:00:00', 'direccion': 'entrada'},
+            {'rfc': self.empleados[2].rfc, 'timestamp': 'ayer', 'direccion': 'entrada'},
+        ]
+        resultados = checkin.registrar_lote(eventos)
+        self.assertEqual([r['status'] for r in resultados],
+                         ['registrado', 'registrado', 'registrado', 'error', 'error'])
+
+        a0 = Asistencia.objects.get(empleado=self.empleados[0], fecha=self.dia)
+        self.assertEqual((a0.hora_entrada, a0.hora_salida, a0.tipo), (datetime.time(7, 55), datetime.time(16, 0), 'normal'))
+        a1 = Asistencia.objects.get(empleado=self.empleados[1], fecha=self.dia)
+        self.assertEqual(a1.tipo, 'retardo')
+
+        resultados = checkin.registrar_lote(eventos)
+        self.assertEqual([r['status'] for r in resultados],
+                         ['duplicado', 'duplicado', 'duplicado', 'error', 'error'])
+        self.assertEqual(Asistencia.objects.filter(fecha=self.dia).count(), 2)
+
+    def test_lote_bloquea_las_filas_que_reescribe(self):
+        checkin.registrar_lote([self.evento(self.empleados[0], datetime.time(8, 0), 'entrada')])
+        bloquear = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=bloquear) as bloqueo:
+            resultados = checkin.registrar_lote([self.evento(self.empleados[0], datetime.time(16, 0), 'salida')])
+        self.assertEqual(resultados[0]['status'], 'registrado')
+        self.assertEqual([llamada.args[0].model for llamada in bloqueo.call_args_list], [Asistencia])
+        self.assertEqual(Asistencia.objects.get(empleado=self.empleados[0], fecha=self.dia).hora_salida,
+                         datetime.time(16, 0))
+
+    def test_lote_exige_token_del_kiosco(self):
+        eventos = [self.evento(self.empleados[0], datetime.time(8, 0), 'entrada')]
+        url = reverse('control:registrar_lote')
+        with override_settings(KIOSCO_TOKEN=''):
+            respuesta = self.client.post(
+                url, {'eventos': eventos}, content_type='application/json', HTTP_X_KIOSCO_TOKEN=''
+            )
+        self.assertEqual(respuesta.status_code, 403)
+        with override_settings(KIOSCO_TOKEN='secreto'):
+            respuesta = self.client.post(
+                url, {'eventos': eventos}, content_type='application/json', HTTP_X_KIOSCO_TOKEN='otro'
+            )
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertFalse(Asistencia.objects.exists())
+
+    @override_settings(KIOSCO_TOKEN='secreto')
+    def test_lote_consultas_no_dependen_del_tamano(self):
+        SystemConfig.invalidar_cache()
+        SystemConfig.get_cached()
+        eventos = [self.evento(e, datetime.time(8, 0), 'entrada') for e in self.empleados]
+        eventos += [self.evento(e, datetime.time(16, 0), 'salida') for e in self.empleados]
+        # RFCs + asistencias + horarios + bulk_create + resumen (con SAVEPOINT/RELEASE)
+        with self.assertNumQueries(8):
+            respuesta = self.client.post(
+                reverse('control:registrar_lote'), {'eventos': eventos}, content_type='application/json',
+                HTTP_X_KIOSCO_TOKEN='secreto',
+            )
+        self.assertEqual([r['status'] for r in respuesta.json()['resultados']], ['registrado'] * 6)
+
+
+class RfcTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleado = crear_empleado('rfc1', ' rama 870404ghi ', nombre='Ana', apellido='Ramos', puesto='Analista')
+
+    def test_rfc_se_guarda_normalizado(self):
+        self.empleado.refresh_from_db()
+        self.assertEqual(self.empleado.rfc, 'RAMA870404GHI')
+
+    def test_busqueda_cacheada_y_evictada(self):
+        self.assertEqual(checkin.resolver_empleado_id('rama870404ghi'), self.empleado.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(checkin.resolver_empleado_id('RAMA870404GHI'), self.empleado.pk)
+
+        self.empleado.rfc = 'RAMA870404XXX'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empleado.save()
+        with self.assertRaises(checkin.ChecadoError):
+            checkin.resolver_empleado_id('RAMA870404GHI')
+
+    def test_eviccion_de_otro_worker(self):
+        self.assertEqual(checkin.resolver_empleado_ids(['RAMA870404GHI']), {'RAMA870404GHI': self.empleado.pk})
+        # Otro worker cambia el RFC: aquí solo se ve la nueva versión compartida
+        Empleado.objects.filter(pk=self.empleado.pk).update(rfc='RAMA870404XXX')
+        cache.set(checkin.CLAVE_VERSION_RFC, 'otro-worker', None)
+        self.assertEqual(checkin.resolver_empleado_ids(['RAMA870404GHI']), {})
+        with self.assertRaises(checkin.ChecadoError):
+            checkin.resolver_empleado_id('RAMA870404GHI')
+
+
+class BuscarEmpleadosTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = crear_admin('admin_bus')
+        datos = [('José Luis', 'Núñez', 'NUJL800101AB1'), ('Josefina', 'Pérez', 'PEJO800101AB1'),
+                 ('Ana', 'Josué', 'JOAN800101AB1')]
+        self.empleados = [
+            crear_empleado(f'bus{i}', rfc, nombre=nombre, apellido=apellido)
+            for i, (nombre, apellido, rfc) in enumerate(datos)
+        ]
+
+    def buscar(self, q, **params):
+        respuesta = self.client.get(reverse('control:buscar_empleados'), dict(params, q=q))
+        return [r['id'] for r in respuesta.json()['resultados']]
+
+    def test_normalizacion_y_rango(self):
+        self.assertEqual(models.normalizar_busqueda('  José  NÚÑEZ-Ruiz '), 'jose nunez ruiz')
+        self.assertEqual(self.empleados[0].apellido_busqueda, 'nunez jose luis')
+        self.assertEqual(models.rango_prefijo('ana', models.ALFABETO_BUSQUEDA), ('ana', 'anb'))
+        self.assertEqual(models.rango_prefijo('az', models.ALFABETO_BUSQUEDA), ('az', 'b'))
+        self.assertEqual(models.rango_prefijo('zz', models.ALFABETO_BUSQUEDA), ('zz', None))
+
+    def test_busca_por_prefijo_sin_acentos(self):
+        self.client.force_login(self.admin)
+        jose, josefina, ana = (e.pk for e in self.empleados)
+        # Primero por nombre, luego por apellido
+        self.assertEqual(self.buscar('JOS'), [jose, josefina, ana])
+        self.assertEqual(self.buscar('jose l'), [jose])
+        self.assertEqual(self.buscar('nuñ'), [jose])
+        self.assertEqual(self.buscar('pejo8'), [josefina])
+        self.assertEqual(self.buscar('jos', limite=1), [jose])
+        self.assertEqual(self.buscar(''), [])
+        # Sesión + usuario + una consulta por columna (nombre, apellido, RFC)
+        with self.assertNumQueries(5):
+            self.buscar('x')
+
+        self.client.force_login(User.objects.create_user('no_admin_bus', password='x'))
+        self.assertEqual(self.client.get(reverse('control:buscar_empleados'), {'q': 'jos'}).status_code, 403)
+
+    def test_formularios_usan_el_buscador(self):
+        def horario(texto):
+            return forms.HorarioForm({
+                'empleado_busqueda': texto, 'dias': ['Lunes'], 'hora_entrada': '08:00', 'hora_salida': '16:00',
+            })
+
+        form = horario('Josefi')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.empleado_validado, self.empleados[1])
+        form = horario(self.empleados[0].etiqueta_busqueda())
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.empleado_validado, self.empleados[0])
+        # Ambiguo: más de un empleado empieza con 'jos'
+        self.assertFalse(horario('jos').is_valid())
+
+        # El pase ya no lista a todos los empleados: solo el elegido
+        pase = Pase(empleado=self.empleados[2], tipo='salida', folio='B-1', hora=datetime.time(10, 0), asunto='A')
+        html = str(forms.PaseForm(instance=pase)['empleado'])
+        self.assertIn('Ana Josué (JOAN800101AB1)', html)
+        self.assertNotIn('Josefina', html)
+
+        # Pases en lote: solo los elegidos, cada uno en su campo oculto
+        lote = forms.PaseLoteForm({'empleados': [self.empleados[0].pk, self.empleados[2].pk]})
+        with self.assertNumQueries(1):
+            html = str(lote['empleados'])
+        self.assertIn('data-autocompletar-empleado', html)
+        self.assertEqual(html.count('type="hidden" name="empleados"'), 2)
+        self.assertNotIn('Josefina', html)
+        lote.is_valid()
+        self.assertEqual(set(lote.cleaned_data['empleados']), {self.empleados[0], self.empleados[2]})
+        self.assertEqual(str(forms.PaseLoteForm()['empleados']).count('type="hidden"'), 0)
+
+
+class SystemConfigTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        SystemConfig.invalidar_cache()
+
+    def test_get_solo_no_duplica(self):
+        self.assertEqual(SystemConfig.get_solo().pk, SystemConfig.get_solo().pk)
+        self.assertEqual(SystemConfig.objects.count(), 1)
+
+    def test_lectura_cacheada_e_invalidada_al_guardar(self):
+        self.assertEqual(SystemConfig.get_cached().retardo_minutos, 5)
+        with self.assertNumQueries(0):
+            SystemConfig.get_cached()
+
+        cfg = SystemConfig.get_solo()
+        cfg.retardo_minutos = 12
+        with self.captureOnCommitCallbacks() as callbacks:
+            cfg.save()
+            # Dentro de la transacción no se toca la copia compartida
+            self.assertEqual(cache.get(SystemConfig.CACHE_KEY).retardo_minutos, 5)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(SystemConfig.get_cached().retardo_minutos, 12)
+
+
+class RolesTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.administracion = Group.objects.get_or_create(name='administracion')[0]
+        self.empleado = Group.objects.get_or_create(name='empleado')[0]
+        self.user = User.objects.create_user('roles1', password='x')
+        self.user.groups.add(self.administracion)
+
+    def test_una_consulta_por_usuario(self):
+        user = User.objects.get(pk=self.user.pk)
+        plantilla = Template(
+            '{% load group_tags %}{% if user|has_group:"administracion" %}A{% endif %}'
+            '{% if user|has_group:"empleado" %}E{% endif %}{% if user|has_group:"administracion" %}A{% endif %}'
+        )
+        with self.assertNumQueries(1):
+            self.assertTrue(roles.es_administracion(user))
+            self.assertEqual(plantilla.render(Context({'user': user})), 'AA')
+        # Otra petición (otro objeto user): sale de la caché compartida
+        otra_peticion = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(roles.es_administracion(otra_peticion))
+
+    def test_invalidacion_al_cambiar_grupos(self):
+        self.assertTrue(roles.es_administracion(self.user))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.administracion)
+        self.assertFalse(roles.es_administracion(self.user))
+
+        # Desde el lado del grupo
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empleado.user_set.add(self.user)
+        self.assertTrue(roles.tiene_grupo(User.objects.get(pk=self.user.pk), 'empleado'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.empleado.user_set.clear()
+        self.assertFalse(roles.tiene_grupo(User.objects.get(pk=self.user.pk), 'empleado'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.administracion)
+        self.assertTrue(roles.es_administracion(User.objects.get(pk=self.user.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.administracion.delete()
+        self.assertFalse(roles.es_administracion(User.objects.get(pk=self.user.pk)))
+
+    def test_invalidacion_espera_al_commit(self):
+        self.assertTrue(roles.es_administracion(User.objects.get(pk=self.user.pk)))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.groups.remove(self.administracion)
+            # Otra petición durante la transacción sigue viendo la caché anterior
+            self.assertTrue(roles.es_administracion(User.objects.get(pk=self.user.pk)))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(roles.es_administracion(User.objects.get(pk=self.user.pk)))
+
+    def test_login_redirige_segun_grupo(self):
+        respuesta = self.client.post(reverse('control:login'), {'username': 'roles1', 'password': 'x'})
+        self.assertRedirects(respuesta, '/control/admin/dashboard/', fetch_redirect_response=False)
+
+
+class DashboardCacheTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = crear_admin('dash1')
+        horario = crear_horario(entrada=datetime.time(0, 0), salida=datetime.time(23, 59))
+        self.empleado = crear_empleado('dash2', 'DASH800101AB1', [horario], nombre='D', apellido='Uno')
+        self.client.force_login(self.admin)
+
+    def dashboard(self):
+        return self.client.get(reverse('control:admin_dashboard'))
+
+    def test_sin_consultas_si_no_cambia_nada(self):
+        self.dashboard()
+        # Solo sesión + usuario: grupos, navbar y métricas salen de la caché
+        with self.assertNumQueries(2):
+            respuesta = self.dashboard()
+        self.assertEqual((respuesta.context['total_empleados'], respuesta.context['empleados_sin_horario']), (1, 0))
+        self.assertContains(respuesta, reverse('control:listar_horarios'))
+
+    def test_escrituras_invalidan(self):
+        self.dashboard()
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_empleado('dash3', 'DASH800102AB1', nombre='D', apellido='Dos')
+        contexto = self.dashboard().context
+        self.assertEqual((contexto['total_empleados'], contexto['empleados_sin_horario']), (2, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkin.registrar_entrada(self.empleado.rfc)
+        self.assertEqual(self.dashboard().context['hoy']['asistencias'], 1)
+
+    def test_navbar_por_rol(self):
+        self.dashboard()
+        self.client.force_login(self.empleado.user)
+        self.empleado.user.groups.add(Group.objects.get_or_create(name='empleado')[0])
+        respuesta = self.client.get(reverse('control:empleado_dashboard'))
+        self.assertNotContains(respuesta, reverse('control:listar_horarios'))
+
+
+class AsistenciaEventsTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = crear_admin('admin1')
+        horario = crear_horario(ENTRE_SEMANA)
+        self.empleados = crear_empleados('cal', 3, 'CALX80010{}AB1', horarios=[horario], apellido='Cal')
+        self.client.force_login(self.admin)
+
+    def crear_asistencias(self, dias):
+        for d in range(dias):
+            for i, empleado in enumerate(self.empleados):
+                Asistencia.objects.create(
+                    empleado=empleado, fecha=LUNES + datetime.timedelta(days=d),
+                    hora_entrada=datetime.time(8, i * 7),
+                )
+
+    def eventos(self, **params):
+        params.setdefault('start', '2025-11-01T00:00:00-06:00')
+        params.setdefault('end', '2025-12-31T00:00:00-06:00')
+        return self.client.get(reverse('control:asistencia_events'), params)
+
+    def test_consultas_constantes(self):
+        self.crear_asistencias(2)
+        self.eventos()  # calienta la caché de índices de horarios y de grupos
+        # sesión + usuario + asistencias + justificantes
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.eventos().json()), 6)
+
+        Asistencia.objects.filter(fecha__gte=LUNES).delete()
+        self.crear_asistencias(20)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.eventos().json()), 60)
+
+    def test_diferencia_coincide_con_propiedad(self):
+        self.crear_asistencias(7)
+        por_id = {e['id']: e['extendedProps']['diferencia'] for e in self.eventos().json()}
+        for a in Asistencia.objects.all():
+            self.assertEqual(por_id[a.id], a.diferencia)
+
+    def test_respeta_ventana(self):
+        self.crear_asistencias(3)
+        respuesta = self.eventos(start=LUNES.isoformat(), end=(LUNES + datetime.timedelta(days=1)).isoformat())
+        self.assertEqual({e['start'] for e in respuesta.json()}, {LUNES.isoformat()})
+
+
+class ExportacionExcelTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = crear_admin('admin2')
+        self.empleado = crear_empleado('exp1', 'MARM850202ABC', nombre='Maria', apellido='Martinez')
+        horas = [datetime.time(8, 0), None, datetime.time(9, 30), datetime.time(8, 0)]
+        for d in range(6):
+            for j, hora in enumerate(horas[:3 if d % 2 else 1]):
+                otro = self.empleado if j == 0 else Empleado.objects.get_or_create(
+                    rfc=f'EXPX80010{j}AB1',
+                    defaults={'user': User.objects.create_user(f'exp_otro{d}{j}'), 'nombre': 'O', 'apellido': str(j), 'puesto': 'P'},
+                )[0]
+                Asistencia.objects.create(empleado=otro, fecha=LUNES + datetime.timedelta(days=d), hora_entrada=hora)
+
+    def test_bloques_keyset_recorren_todo_en_orden(self):
+        esperado = list(
+            Asistencia.objects.order_by(*reportes.orden_keyset()).values_list('id', flat=True)
+        )
+        obtenido = [
+            fila[0]
+            for bloque in reportes.iterar_por_bloques(Asistencia.objects.all(), (), tamano=2)
+            for fila in bloque
+        ]
+        self.assertEqual(obtenido, esperado)
+
+    def test_exportacion_por_bloques(self):
+        destino = io.BytesIO()
+        asistencias = reportes.filtrar_asistencias(reportes.filtros_de_request({'empleado_id': str(self.empleado.pk)}))
+        with mock.patch.object(reportes, 'TAMANO_BLOQUE', 3):
+            self.assertEqual(reportes.escribir_asistencias_xlsx(asistencias, destino), 6)
+        ws = load_workbook(io.BytesIO(destino.getvalue())).active
+        filas = list(ws.iter_rows(min_row=3, values_only=True))
+        self.assertEqual(len(filas), 6)
+        self.assertEqual(filas[0][1], 'Maria Martinez')
+        self.assertEqual(ws.auto_filter.ref, 'A2:H8')
+
+    def test_exportacion_solo_admin(self):
+        self.client.force_login(User.objects.create_user('noadmin', password='x'))
+        respuesta = self.client.post(reverse('control:solicitar_exportacion'))
+        self.assertEqual(respuesta.status_code, 403)
+
+
+class ExportacionEnSegundoPlanoTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usar_media_temporal()
+        self.admin = crear_admin('admin3')
+        empleado = crear_empleado('bg1', 'DIAL800101AB1', nombre='Luis', apellido='Diaz')
+        for d in range(5):
+            Asistencia.objects.create(empleado=empleado, fecha=LUNES + datetime.timedelta(days=d), hora_entrada=datetime.time(8, 0))
+        self.client.force_login(self.admin)
+
+    def solicitar(self, **filtros):
+        return self.client.post(reverse('control:solicitar_exportacion'), filtros)
+
+    def test_trabajo_genera_archivo_y_se_reutiliza(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            datos = self.solicitar(fecha_inicio=LUNES.isoformat()).json()
+        self.assertTrue(datos['creada'])
+        self.assertEqual(len(callbacks), 1)
+
+        # Misma petición mientras está pendiente: mismo trabajo, sin encolar otro
+        self.assertEqual(self.solicitar(fecha_inicio=LUNES.isoformat()).json()['id'], datos['id'])
+
+        exportaciones.procesar_pendientes()
+        estado = self.client.get(datos['url_estado']).json()
+        self.assertEqual((estado['estado'], estado['progreso'], estado['porcentaje']), ('completada', 5, 100))
+
+        repetida = self.solicitar(fecha_inicio=LUNES.isoformat()).json()
+        self.assertEqual((repetida['id'], repetida['creada']), (datos['id'], False))
+        self.assertNotEqual(self.solicitar(tipo='retardo').json()['id'], datos['id'])
+
+        respuesta = self.client.get(estado['url_descarga'])
+        ws = load_workbook(io.BytesIO(b''.join(respuesta.streaming_content))).active
+        self.assertEqual(ws.max_row, 7)
+
+    def test_trabajo_pendiente_perdido_se_vuelve_a_encolar(self):
+        datos = self.solicitar(tipo='falta').json()
+        # Reciente: se reutiliza sin encolar de nuevo
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.solicitar(tipo='falta').json()['id'], datos['id'])
+        self.assertEqual(callbacks, [])
+
+        # La tarea se perdió (reinicio): la siguiente solicitud la encola otra vez
+        Exportacion.objects.filter(pk=datos['id']).update(
+            fecha_actualizacion=timezone.now() - exportaciones.EXPORTACION_REENCOLAR * 2,
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            repetida = self.solicitar(tipo='falta').json()
+        self.assertEqual((repetida['id'], repetida['creada'], len(callbacks)), (datos['id'], False, 1))
+        self.assertEqual(repetida['estado'], 'pendiente')
+
+    def test_trabajo_reclamado_una_sola_vez(self):
+        datos = self.solicitar().json()
+        self.assertTrue(exportaciones.procesar_exportacion(datos['id']))
+        self.assertFalse(exportaciones.procesar_exportacion(datos['id']))
+
+    def test_url_de_exportacion_encola_y_redirige(self):
+        url = reverse('control:exportar_asistencias_excel')
+        with self.captureOnCommitCallbacks() as callbacks:
+            respuesta = self.client.get(url, {'tipo': 'normal'})
+        self.assertEqual(len(callbacks), 1)
+        exportacion = Exportacion.objects.get()
+        self.assertEqual(exportacion.filtros['tipo'], 'normal')
+        self.assertRedirects(
+            respuesta, f"{reverse('control:reporte_asistencias')}?tipo=normal&exportacion={exportacion.pk}",
+        )
+        reporte = self.client.get(respuesta.url)
+        self.assertEqual(
+            reporte.context['url_estado_exportacion'], reverse('control:estado_exportacion', args=[exportacion.pk]),
+        )
+        self.assertNotIn('exportacion', reporte.context['params_pagina'])
+
+        # Enlace antiguo `?exportar=excel`: mismo trabajo; ya generado, va directo a la descarga
+        exportaciones.procesar_pendientes()
+        respuesta = self.client.get(reverse('control:reporte_asistencias'), {'exportar': 'excel', 'tipo': 'normal'})
+        self.assertRedirects(
+            respuesta, reverse('control:descargar_exportacion', args=[exportacion.pk]), fetch_redirect_response=False,
+        )
+        self.assertEqual(Exportacion.objects.count(), 1)
+
+        self.client.force_login(User.objects.create_user('noadmin_exp', password='x'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class PuntualidadTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        manana = crear_horario(ENTRE_SEMANA)
+        tarde = crear_horario('Sábado', datetime.time(14, 30), datetime.time(18, 0))
+        self.empleados = crear_empleados('pun', 2, 'PUNT80010{}AB1')
+        self.empleados[0].horarios.add(manana, tarde)
+        horas = [
+            datetime.time(8, 0), datetime.time(8, 4, 59, 500000), datetime.time(7, 59, 30),
+            datetime.time(7, 30), None, datetime.time(15, 0), datetime.time(9, 0),
+        ]
+        for d, hora in enumerate(horas):
+            for empleado in self.empleados:
+                Asistencia.objects.create(
+                    empleado=empleado, fecha=LUNES + datetime.timedelta(days=d), hora_entrada=hora,
+                    tipo='falta' if hora is None else 'normal',
+                )
+
+    def test_lote_coincide_con_propiedad(self):
+        asistencias = list(Asistencia.objects.select_related('empleado').order_by('pk'))
+        minutos, textos = puntualidad.calcular(asistencias)
+        self.assertEqual(textos, [a.diferencia for a in asistencias])
+        self.assertEqual(minutos, [a.compute_diferencia_minutes() for a in asistencias])
+        # Empleado sin horarios, día sin horario y falta sin entrada
+        self.assertEqual(
+            [m for a, m in zip(asistencias, minutos) if a.empleado_id == self.empleados[0].pk],
+            [0, 4, -1, -30, None, 30, None],
+        )
+        self.assertEqual({m for a, m in zip(asistencias, minutos) if a.empleado_id == self.empleados[1].pk}, {None})
+
+    def test_queryset_y_sin_numpy(self):
+        asistencias = Asistencia.objects.order_by('pk')
+        esperado = puntualidad.diferencias_minutos(list(asistencias))
+        # El queryset calcula las columnas en la base de datos (una consulta + índices)
+        self.assertEqual(puntualidad.diferencias_minutos(asistencias), esperado)
+        with mock.patch.object(puntualidad, 'np', None):
+            self.assertEqual(puntualidad.diferencias_minutos(list(asistencias)), esperado)
+            self.assertEqual(puntualidad.diferencias_minutos(asistencias), esperado)
+
+    def test_anotacion_sql_coincide(self):
+        asistencias = Asistencia.objects.order_by('pk')
+        self.assertEqual(
+            [a.minutos_diferencia for a in asistencias.con_puntualidad()],
+            puntualidad.diferencias_minutos(asistencias),
+        )
+        self.assertEqual(
+            list(Asistencia.objects.con_puntualidad().filter(minutos_diferencia__gt=0).values_list(
+                'minutos_diferencia', 'hora_programada').order_by('minutos_diferencia')),
+            [(4, datetime.time(8, 0)), (30, datetime.time(14, 30))],
+        )
+
+    def test_reporte_filtra_y_ordena_por_retardo(self):
+        self.client.force_login(crear_admin('admin_pun'))
+        url = reverse('control:reporte_asistencias')
+
+        respuesta = self.client.get(url, {'retardo_minimo': 0, 'orden': 'retardo'})
+        self.assertEqual([a.minutos_diferencia for a in respuesta.context['asistencias']], [30, 4])
+        self.assertEqual(respuesta.context['retardos'], {'retardos': 2, 'promedio': 17.0, 'maximo': 30})
+
+        # Orden por retardo paginado: sin horario al final y sin filas repetidas
+        vistos = []
+        params = {'orden': 'retardo', 'por_pagina': 10}
+        while True:
+            respuesta = self.client.get(url, params)
+            vistos += [a.minutos_diferencia for a in respuesta.context['asistencias']]
+            if not respuesta.context['siguiente_cursor']:
+                break
+            params['cursor'] = respuesta.context['siguiente_cursor']
+        self.assertEqual(vistos, [30, 4, 0, -1, -30] + [None] * 9)
+
+        # La exportación aplica el mismo filtro
+        destino = io.BytesIO()
+        reportes.escribir_asistencias_xlsx(
+            reportes.filtrar_asistencias(reportes.filtros_de_request({'retardo_minimo': '10'})), destino,
+        )
+        ws = load_workbook(io.BytesIO(destino.getvalue())).active
+        self.assertEqual(len(list(ws.iter_rows(min_row=3, values_only=True))), 1)
+
+
+class ResumenAsistenciaTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = crear_admin('admin_res')
+        self.horario = crear_horario()
+        self.empleado = crear_empleado('res1', 'VEGR800101AB1', [self.horario], nombre='Rosa', apellido='Vega')
+        SystemConfig.invalidar_cache()
+
+    def momento(self, fecha, hora, minuto):
+        return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time(hora, minuto)))
+
+    def test_migracion_rellena_con_el_mismo_calculo(self):
+        self.empleado.horarios.add(crear_horario('Lunes', datetime.time(7, 30), datetime.time(15, 0)))
+        sin_horario = crear_empleado('res2', 'VEGR800102AB1')
+        filas = [
+            (self.empleado, LUNES, datetime.time(7, 45, 30), datetime.time(15, 10), 'normal'),
+            (self.empleado, LUNES + datetime.timedelta(days=1), datetime.time(8, 20), None, 'retardo'),
+            (self.empleado, LUNES + datetime.timedelta(days=2), None, None, 'falta'),
+            (sin_horario, LUNES, datetime.time(9, 0), datetime.time(8, 0), 'normal'),
+        ]
+        asistencias = [
+            Asistencia.objects.create(empleado=e, fecha=f, hora_entrada=entrada, hora_salida=salida, tipo=tipo)
+            for e, f, entrada, salida, tipo in filas
+        ]
+        Justificante.objects.create(empleado=self.empleado, asistencia=asistencias[1], motivo='Cita')
+
+        campos = ('asistencia_id', 'empleado_id', 'fecha', 'diferencia_minutos', 'minutos_trabajados', 'tipo',
+                  'tiene_justificante')
+        esperado = sorted(
+            tuple(getattr(r, c) for c in campos)
+            for r in resumen.construir(resumen._con_justificante(Asistencia.objects.all()))
+        )
+        ResumenAsistencia.objects.all().delete()
+        migracion = importlib.import_module('control.migrations.0017_rellenar_resumen_asistencia')
+        migracion.rellenar_resumen(django_apps, None)
+        self.assertEqual(sorted(ResumenAsistencia.objects.values_list(*campos)), esperado)
+        self.assertEqual(esperado[0][3:5], (15, 444))
+
+    def test_se_mantiene_al_checar_y_con_justificantes(self):
+        checkin.registrar_entrada(self.empleado.rfc, self.momento(LUNES, 8, 25))
+        asistencia = Asistencia.objects.get(empleado=self.empleado, fecha=LUNES)
+        fila = ResumenAsistencia.objects.get(asistencia=asistencia)
+        self.assertEqual((fila.diferencia_minutos, fila.minutos_trabajados, fila.tipo), (25, None, 'retardo'))
+        self.assertEqual(fila.diferencia, '25 min tarde')
+
+        checkin.registrar_salida(self.empleado.rfc, self.momento(LUNES, 16, 40))
+        fila.refresh_from_db()
+        self.assertEqual((fila.minutos_trabajados, fila.tiempo_trabajado), (495, '8h 15m'))
+
+        justificante = Justificante.objects.create(empleado=self.empleado, asistencia=asistencia, motivo='Tráfico')
+        fila.refresh_from_db()
+        self.assertEqual((fila.tipo, fila.tiene_justificante), ('retardo', True))
+
+        justificante.estado = 'aprobado'
+        justificante.save()
+        fila.refresh_from_db()
+        self.assertEqual(fila.tipo, 'justificada')
+
+        justificante.delete()
+        fila.refresh_from_db()
+        self.assertFalse(fila.tiene_justificante)
+
+        asistencia.delete()
+        self.assertFalse(ResumenAsistencia.objects.exists())
+
+    def test_falta_completada_por_checada_y_lote(self):
+        # Una fila sin entrada se completa con UPDATE, que no dispara post_save
+        Asistencia.objects.create(empleado=self.empleado, fecha=LUNES, tipo='falta')
+        checkin.registrar_entrada(self.empleado.rfc, self.momento(LUNES, 7, 50))
+        self.assertEqual(
+            ResumenAsistencia.objects.values_list('diferencia_minutos', 'tipo').get(fecha=LUNES), (-10, 'normal'),
+        )
+
+        dia = timezone.localdate() - datetime.timedelta(days=1)
+        checkin.registrar_lote([
+            {'rfc': self.empleado.rfc, 'timestamp': f'{dia.isoformat()}T08:10:00', 'direccion': 'entrada'},
+            {'rfc': self.empleado.rfc, 'timestamp': f'{dia.isoformat()}T12:10:00', 'direccion': 'salida'},
+        ])
+        self.assertEqual(
+            ResumenAsistencia.objects.values_list('diferencia_minutos', 'minutos_trabajados').get(fecha=dia), (10, 240),
+        )
+
+    def test_cambio_de_horario_regenera_el_resumen(self):
+        Asistencia.objects.create(empleado=self.empleado, fecha=LUNES, hora_entrada=datetime.time(8, 20))
+        self.assertEqual(ResumenAsistencia.objects.get(fecha=LUNES).diferencia_minutos, 20)
+
+        en_linea = mock.patch.object(tareas, 'en_segundo_plano', side_effect=lambda funcion, *args: funcion(*args))
+        self.horario.hora_entrada = datetime.time(8, 30)
+        with en_linea, self.captureOnCommitCallbacks(execute=True):
+            self.horario.save()
+        self.assertEqual(ResumenAsistencia.objects.get(fecha=LUNES).diferencia_minutos, -10)
+
+        # La columna mostrada (resumen) coincide con la que usan el filtro y el orden
+        self.client.force_login(self.admin)
+        fila = self.client.get(reverse('control:reporte_asistencias'), {'orden': 'retardo'}).context['asistencias'][0]
+        self.assertEqual((fila.resumen.diferencia_minutos, fila.minutos_diferencia), (-10, -10))
+
+        with en_linea, self.captureOnCommitCallbacks(execute=True):
+            self.empleado.horarios.clear()
+        self.assertIsNone(ResumenAsistencia.objects.get(fecha=LUNES).diferencia_minutos)
+
+    def test_reconstruir_y_dashboard(self):
+        for d, hora in enumerate([datetime.time(8, 0), datetime.time(8, 30), None]):
+            Asistencia.objects.create(
+                empleado=self.empleado, fecha=LUNES + datetime.timedelta(days=d),
+                hora_entrada=hora, tipo='falta' if hora is None else 'normal',
+            )
+        ResumenAsistencia.objects.all().delete()
+
+        self.assertEqual(resumen.reconstruir(desde=LUNES + datetime.timedelta(days=1), tamano=1), 2)
+        self.assertEqual(ResumenAsistencia.objects.count(), 2)
+        self.assertEqual(resumen.reconstruir(tamano=2), 3)
+        self.assertEqual(
+            list(ResumenAsistencia.objects.order_by('fecha').values_list('diferencia_minutos', flat=True)),
+            [0, 30, None],
+        )
+
+        Asistencia.objects.create(
+            empleado=self.empleado, fecha=timezone.localdate(), hora_entrada=datetime.time(8, 0), tipo='retardo',
+        )
+        self.client.force_login(self.admin)
+        hoy = self.client.get(reverse('control:admin_dashboard')).context['hoy']
+        self.assertEqual((hoy['asistencias'], hoy['retardos'], hoy['sin_salida'], hoy['faltas']), (1, 1, 1, 0))
+
+
+class GenerarFaltasTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        entre_semana = crear_horario(ENTRE_SEMANA)
+        sabado = crear_horario('Sábado', datetime.time(9, 0), datetime.time(13, 0))
+        self.empleados = [
+            crear_empleado(
+                f'falta{i}', f'FALT80010{i}AB1', horarios, nombre=f'F{i}', apellido='Falta',
+                estado='inactivo' if i == 3 else 'activo',
+            )
+            for i, horarios in enumerate([[entre_semana], [entre_semana, sabado], [], [entre_semana]])
+        ]
+        # Dados de alta antes del periodo que se revisa
+        User.objects.filter(username__startswith='falta').update(
+            date_joined=timezone.make_aware(datetime.datetime(2025, 1, 1)),
+        )
+        Asistencia.objects.create(empleado=self.empleados[0], fecha=LUNES, hora_entrada=datetime.time(8, 0))
+
+    def test_crea_faltas_de_dias_laborales_y_es_idempotente(self):
+        domingo = LUNES + datetime.timedelta(days=6)
+        with mock.patch.object(faltas, 'FALTAS_EMPLEADOS_POR_GRUPO', 1):
+            self.assertEqual(faltas.generar_faltas(LUNES, domingo), 4 + 6)
+        self.assertEqual(faltas.generar_faltas(LUNES, domingo), 0)
+
+        creadas = Asistencia.objects.filter(tipo='falta')
+        self.assertEqual(set(creadas.values_list('empleado_id', flat=True)), {self.empleados[0].pk, self.empleados[1].pk})
+        self.assertFalse(creadas.filter(empleado=self.empleados[0], fecha=LUNES).exists())
+        self.assertTrue(creadas.filter(empleado=self.empleados[1], fecha=SABADO).exists())
+        self.assertFalse(creadas.filter(fecha=domingo).exists())
+        self.assertEqual(ResumenAsistencia.objects.filter(tipo='falta').count(), 10)
+
+    def test_no_genera_faltas_antes_del_alta(self):
+        miercoles = LUNES + datetime.timedelta(days=2)
+        User.objects.filter(pk=self.empleados[1].user_id).update(
+            date_joined=timezone.make_aware(datetime.datetime.combine(miercoles, datetime.time(12, 0))),
+        )
+        faltas.generar_faltas(LUNES, LUNES + datetime.timedelta(days=6))
+        self.assertEqual(
+            sorted(Asistencia.objects.filter(tipo='falta', empleado=self.empleados[1]).values_list('fecha', flat=True)),
+            [miercoles, miercoles + datetime.timedelta(days=1), miercoles + datetime.timedelta(days=2), SABADO],
+        )
+
+    def test_no_genera_el_dia_en_curso(self):
+        hoy = timezone.localdate()
+        self.assertEqual(faltas.generar_faltas(hoy, hoy + datetime.timedelta(days=7)), 0)
+        self.assertFalse(Asistencia.objects.filter(fecha__gte=hoy).exists())
+
+
+class TiempoRealTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = crear_admin('admin_tr')
+        horario = crear_horario(entrada=datetime.time(0, 0), salida=datetime.time(23, 59))
+        self.empleados = crear_empleados('tr', 3, 'TREA80010{}AB1', 'T{}', [horario], apellido='Real')
+        # La fila de configuración ya existe: crearla en el checado añadiría su propio on_commit
+        SystemConfig.get_solo()
+
+    def checar(self, empleado, direccion):
+        funcion = checkin.registrar_entrada if direccion == 'entrada' else checkin.registrar_salida
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            funcion(empleado.rfc)
+        # Publicación de la checada (en el mismo hilo) e invalidación de las métricas del dashboard
+        self.assertEqual(len(callbacks), 2)
+        return tiempo_real.secuencia_actual()
+
+    def test_contadores_incrementales_y_eventos(self):
+        self.checar(self.empleados[0], 'entrada')
+        self.assertEqual(
+            {k: v for k, v in tiempo_real.contadores().items() if k != 'fecha'},
+            {'presentes': 1, 'retardos': 1, 'ausentes': 2, 'salidas': 0, 'esperados': 3},
+        )
+
+        self.checar(self.empleados[1], 'entrada')
+        ultimo = self.checar(self.empleados[0], 'salida')
+        # Ya inicializados: los contadores salen de la caché, sin consultas
+        with self.assertNumQueries(0):
+            datos = tiempo_real.contadores()
+        self.assertEqual((datos['presentes'], datos['ausentes'], datos['salidas']), (2, 1, 1))
+
+        eventos, actual = tiempo_real.eventos_desde(0)
+        self.assertEqual(actual, ultimo)
+        self.assertEqual([(e['direccion'], e['empleado']) for e in eventos],
+                         [('entrada', 'T0 Real'), ('entrada', 'T1 Real'), ('salida', 'T0 Real')])
+        self.assertEqual(tiempo_real.eventos_desde(actual), ([], actual))
+
+    def test_lote_se_publica_en_bloque_sin_checadas_atrasadas(self):
+        mediodia = timezone.make_aware(datetime.datetime.combine(LUNES, datetime.time(12, 0)))
+        ayer = timezone.localtime(mediodia - datetime.timedelta(days=1))
+        atrasada = timezone.localtime(mediodia - datetime.timedelta(seconds=tiempo_real.TIEMPO_REAL_ANTIGUEDAD_MAX + 60))
+        checadas = [('entrada', e.pk, ayer.date(), ayer.time(), 'normal', 0) for e in self.empleados]
+        checadas += [('entrada', e.pk, LUNES, datetime.time(11, 59), 'normal', 0) for e in self.empleados[:2]]
+        checadas.append(('entrada', self.empleados[2].pk, LUNES, atrasada.time(), 'retardo', 30))
+
+        with mock.patch('django.utils.timezone.now', return_value=mediodia):
+            tiempo_real.contadores()
+            # Solo la consulta de nombres: contadores y eventos van a la caché en bloque
+            with self.assertNumQueries(1):
+                numeros = tiempo_real.publicar_checadas(checadas)
+            datos = tiempo_real.contadores()
+
+        self.assertEqual(numeros, [1, 2])
+        eventos, _ = tiempo_real.eventos_desde(0)
+        self.assertEqual([e['empleado'] for e in eventos], ['T0 Real', 'T1 Real'])
+        # La atrasada del mismo día cuenta, pero no se anuncia; las de ayer no cuentan
+        self.assertEqual((datos['presentes'], datos['retardos']), (3, 1))
+
+    async def test_flujo_sse_solo_admin(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.admin)
+        ahora = timezone.localtime()
+        await sync_to_async(tiempo_real.publicar_checadas)([
+            ('entrada', self.empleados[2].pk, ahora.date(), ahora.time(), 'normal', 5),
+        ])
+        respuesta = await cliente.get(reverse('control:flujo_checadas'))
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        partes = []
+        async for parte in respuesta.streaming_content:
+            partes.append(parte.decode())
+            if len(partes) == 3:
+                break
+        self.assertTrue(partes[0].startswith('retry:'))
+        self.assertIn('event: contadores', partes[1])
+        self.assertIn('id: 1\nevent: checada', partes[2])
+
+        otro = AsyncClient()
+        await otro.aforce_login(await sync_to_async(User.objects.create_user)('no_admin_tr'))
+        self.assertEqual((await otro.get(reverse('control:flujo_checadas'))).status_code, 403)
+
+
+class ReportePaginadoTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = crear_admin('admin4')
+        for i, empleado in enumerate(crear_empleados('rep', 9, 'REPX80010{}AB1', 'R{}', apellido='Rep')):
+            for d in range(3):
+                hora = None if (d + i) % 4 == 0 else datetime.time(8, (d * i) % 3)
+                Asistencia.objects.create(empleado=empleado, fecha=LUNES + datetime.timedelta(days=d), hora_entrada=hora)
+        self.client.force_login(self.admin)
+
+    def test_recorre_todas_las_paginas_conservando_filtros(self):
+        esperado = list(
+            Asistencia.objects.filter(fecha__gte=LUNES).order_by(*reportes.orden_keyset()).values_list('id', flat=True)
+        )
+        vistos = []
+        params = {'fecha_inicio': LUNES.isoformat(), 'por_pagina': 10}
+        while True:
+            respuesta = self.client.get(reverse('control:reporte_asistencias'), params)
+            vistos += [a.id for a in respuesta.context['asistencias']]
+            self.assertIn('fecha_inicio=', respuesta.context['params_pagina'])
+            cursor = respuesta.context['siguiente_cursor']
+            if not cursor:
+                break
+            params['cursor'] = cursor
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(respuesta.context['total'], 27)
+        self.assertTrue(respuesta.context['total_exacto'])
+
+
+class PasePdfTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usar_media_temporal()
+        self.crear_templates_pase()
+        self.ruta = os.path.join(self.media, 'pases_form', utils_pdf.TEMPLATES_PASE['salida'])
+
+    def pase(self, folio):
+        return Pase(
+            empleado=Empleado(nombre='Ana', apellido='Ruiz'), tipo='salida', folio=folio,
+            fecha=LUNES, hora=datetime.time(12, 30), asunto='Trámite',
+        )
+
+    def texto(self, pdf):
+        return PdfReader(pdf).pages[0].extract_text()
+
+    def test_template_se_reutiliza_sin_modificarse(self):
+        primero = self.texto(utils_pdf.generar_pase_pdf(self.pase('S-1')))
+        template = utils_pdf.obtener_template('salida')
+        segundo = self.texto(utils_pdf.generar_pase_pdf(self.pase('S-2')))
+
+        self.assertIs(utils_pdf.obtener_template('salida'), template)
+        for texto in (primero, segundo):
+            self.assertIn('PASE DE SALIDA', texto)
+            self.assertIn('ANA RUIZ', texto)
+            self.assertIn('24 DE NOVIEMBRE DE 2025', texto)
+        self.assertIn('S-1', primero)
+        self.assertIn('S-2', segundo)
+        self.assertNotIn('S-1', segundo)
+
+    def test_template_se_recarga_si_cambia_el_archivo(self):
+        template = utils_pdf.obtener_template('salida')
+        crear_template_sintetico(self.ruta, 'PASE MODIFICADO')
+        os.utime(self.ruta, ns=(template.mtime + 10**9, template.mtime + 10**9))
+
+        self.assertIsNot(utils_pdf.obtener_template('salida'), template)
+        self.assertIn('PASE MODIFICADO', self.texto(utils_pdf.generar_pase_pdf(self.pase('S-3'))))
+
+    def test_template_inexistente(self):
+        os.remove(self.ruta)
+        with self.assertRaises(FileNotFoundError):
+            utils_pdf.generar_pase_pdf(self.pase('S-4'))
+
+
+class PasesLoteTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usar_media_temporal()
+        self.crear_templates_pase()
+        self.admin = crear_admin('admin4')
+        self.empleados = crear_empleados('lote', 3, 'LOTE80010{}AB1', 'Emp{}', apellido='Lote')
+
+    def crear(self, **kwargs):
+        return pases_lote.crear_pases_lote(
+            [{'empleado': e, 'asunto': f'Asunto {e.nombre}'} for e in self.empleados],
+            tipo='salida', fecha=LUNES, hora=datetime.time(12, 0), creado_por=self.admin, **kwargs,
+        )
+
+    def test_folios_consecutivos_despues_del_ultimo(self):
+        for folio in ('S-2025-00007', 'S-2025-0003', 'S-2025-MANUAL'):
+            Pase.objects.create(
+                empleado=self.empleados[0], tipo='salida', folio=folio,
+                fecha=LUNES, hora=datetime.time(9, 0), asunto='Previo',
+            )
+        with self.assertNumQueries(1):
+            self.assertEqual(pases_lote.siguiente_folio('S-2025-'), 8)
+        pases = self.crear()
+        self.assertEqual([p.folio for p in pases], ['S-2025-00008', 'S-2025-00009', 'S-2025-00010'])
+        self.assertEqual([p.asunto for p in pases], ['Asunto Emp0', 'Asunto Emp1', 'Asunto Emp2'])
+        self.assertEqual({(p.lote, p.pdf_estado) for p in pases}, {(pases[0].lote, 'pendiente')})
+
+    def test_pdf_combinado_en_pool_de_procesos(self):
+        pases = self.crear()
+        with mock.patch.object(pases_lote, 'PASES_POOL_MINIMO', 0):
+            nombre = pases_lote.generar_pdfs_lote(pases[0].lote, procesos=2)
+
+        with open(os.path.join(self.media, nombre), 'rb') as f:
+            paginas = PdfReader(f, strict=True).pages
+            self.assertEqual(len(paginas), 3)
+            self.assertIn('S-2025-00002', paginas[1].extract_text())
+        for pase in Pase.objects.all():
+            self.assertEqual(pase.pdf_estado, 'listo')
+            self.assertTrue(os.path.exists(pase.pdf_generado.path))
+
+    def test_lote_fallido(self):
+        lote = self.crear()[0].lote
+        with mock.patch.object(pases_lote, 'guardar_pase_pdf', side_effect=OSError('disco lleno')):
+            self.assertFalse(pases_lote.procesar_lote(lote))
+        self.assertEqual(pases_lote.estado_lote(lote), 'fallido')
+        self.assertEqual(set(Pase.objects.values_list('pdf_estado', 'pdf_error')), {('fallido', 'disco lleno')})
+        self.assertEqual(pases_lote.procesar_pendientes(), 0)
+
+    def test_vista_encola_lote_y_descarga(self):
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            respuesta = self.client.post(reverse('control:crear_pases_lote'), {
+                'empleados': [e.pk for e in self.empleados[:2]],
+                'tipo': 'entrada', 'fecha': LUNES.isoformat(), 'hora': '08:30', 'asunto': 'Capacitación',
+            })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(Pase.objects.filter(tipo='entrada').count(), 2)
+        # La petición no genera los PDFs: solo encola el lote
+        self.assertEqual(len(callbacks), 1)
+        estado = reverse('control:estado_lote_pases', args=[respuesta.context['lote']])
+        self.assertEqual(self.client.get(estado).json()['estado'], 'pendiente')
+
+        # Reinicio antes de ejecutar la tarea: el comando retoma el lote
+        self.assertEqual(pases_lote.procesar_pendientes(), 1)
+        datos = self.client.get(estado).json()
+        self.assertEqual(datos['estado'], 'listo')
+
+        descarga = self.client.get(datos['url_descarga'])
+        self.assertEqual(descarga['Content-Type'], 'application/pdf')
+        self.assertEqual(len(PdfReader(io.BytesIO(b''.join(descarga.streaming_content))).pages), 2)
+        self.assertEqual(self.client.get(reverse('control:descargar_lote_pases', args=['otro.pdf'])).status_code, 404)
+
+
+class PasePdfAsincronoTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usar_media_temporal()
+        self.crear_templates_pase()
+        self.admin = crear_admin('admin5')
+        self.empleado = crear_empleado('asinc', 'SOLE800101AB1', nombre='Eva', apellido='Sol')
+        self.client.force_login(self.admin)
+
+    def crear_pase(self, folio='S-1'):
+        with self.captureOnCommitCallbacks() as callbacks:
+            respuesta = self.client.post(reverse('control:crear_pase'), {
+                'empleado': self.empleado.pk, 'tipo': 'salida', 'folio': folio,
+                'fecha': LUNES.isoformat(), 'hora': '12:00', 'asunto': 'Banco',
+            })
+        self.assertRedirects(respuesta, reverse('control:listar_pases'))
+        self.assertEqual(len(callbacks), 1)
+        return Pase.objects.get(folio=folio)
+
+    def test_guardar_no_genera_pdf_en_la_peticion(self):
+        pase = self.crear_pase()
+        self.assertEqual(pase.pdf_estado, 'pendiente')
+        self.assertFalse(pase.pdf_generado)
+
+        self.assertEqual(pases_pdf.procesar_pendientes(), 1)
+        pase.refresh_from_db()
+        self.assertEqual(pase.pdf_estado, 'listo')
+        self.assertTrue(os.path.exists(pase.pdf_generado.path))
+
+    def test_descarga_genera_el_pdf_si_no_esta_listo(self):
+        pase = self.crear_pase()
+        with mock.patch.object(pases_pdf, 'PASES_PDF_ESPERA', 0):
+            respuesta = self.client.get(reverse('control:descargar_pase_pdf', args=[pase.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('S-1', PdfReader(io.BytesIO(b''.join(respuesta.streaming_content))).pages[0].extract_text())
+        pase.refresh_from_db()
+        self.assertEqual(pase.pdf_estado, 'listo')
+
+    def test_reintentos_y_fallo(self):
+        pase = self.crear_pase()
+        real = pases_pdf.guardar_pase_pdf
+        with mock.patch.object(pases_pdf.time, 'sleep'):
+            with mock.patch.object(pases_pdf, 'guardar_pase_pdf', side_effect=[OSError('disco lleno'), real]):
+                self.assertTrue(pases_pdf.generar_pdf(pase.pk, reintentos=3))
+            pase.refresh_from_db()
+            self.assertEqual((pase.pdf_estado, pase.pdf_intentos), ('listo', 1))
+
+            with mock.patch.object(pases_pdf, 'guardar_pase_pdf', side_effect=OSError('disco lleno')):
+                self.assertFalse(pases_pdf.generar_pdf(pase.pk, reintentos=2))
+            pase.refresh_from_db()
+            self.assertEqual((pase.pdf_estado, pase.pdf_intentos, pase.pdf_error), ('fallido', 2, 'disco lleno'))
+
+
+class DescargasTests(ControlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usar_media_temporal(DESCARGAS_X_ACCEL_PREFIX='')
+        self.admin = crear_admin('admin6')
+        self.dueno = User.objects.create_user('dueno', password='x')
+        self.otro = User.objects.create_user('otro', password='x')
+        empleado = Empleado.objects.create(user=self.dueno, nombre='Ida', apellido='Paz', puesto='P', rfc='PAZI800101AB1')
+        asistencia = Asistencia.objects.create(empleado=empleado, fecha=LUNES, hora_entrada=datetime.time(8, 20))
+        self.contenido = b'%PDF-1.4 ' + bytes(range(256)) * 4
+        self.justificante = Justificante(empleado=empleado, asistencia=asistencia, motivo='Cita')
+        self.justificante.ruta_archivo.save('cita.pdf', ContentFile(self.contenido))
+        self.url = reverse('control:descargar_justificante', args=[self.justificante.pk])
+
+    def test_permisos_de_dueno_y_administracion(self):
+        self.client.force_login(self.otro)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        for usuario in (self.dueno, self.admin):
+            self.client.force_login(usuario)
+            respuesta = self.client.get(self.url)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(b''.join(respuesta.streaming_content), self.contenido)
+
+    def test_etag_y_rangos(self):
+        self.client.force_login(self.dueno)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        parcial = self.client.get(self.url, HTTP_RANGE='bytes=9-18')
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(parcial['Content-Range'], f'bytes 9-18/{len(self.contenido)}')
+        self.assertEqual(b''.join(parcial.streaming_content), self.contenido[9:19])
+
+        final = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(final.streaming_content), self.contenido[-5:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.contenido)}-').status_code, 416)
+        # If-Range con otro ETag: se envía el archivo completo
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"viejo"').status_code, 200)
+
+    def test_x_accel_redirect(self):
+        self.client.force_login(self.admin)
+        with override_settings(DESCARGAS_X_ACCEL_PREFIX='/protegido/'):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta['X-Accel-Redirect'], '/protegido/' + self.justificante.ruta_archivo.name)
+        self.assertEqual(respuesta.content, b'')
@@ -0,0 +1,236 @@
+"""
+Checadas en tiempo real para el dashboard de administración (Server-Sent Events).
+
+Las checadas se publican en la caché al confirmar su transacción, en el
+mismo hilo (`publicar_al_confirmar`): los contadores del día y, para las
+recientes, un evento con un número de secuencia y un TTL corto. Un lote de
+checadas cuesta lo mismo que una: una consulta para los nombres, un
+incremento por contador y un solo `set_many` con los eventos. Las checadas
+atrasadas (un kiosco que estuvo sin conexión) solo cuentan en los
+contadores; no se anuncian como si acabaran de ocurrir.
+
+Los contadores se calculan con una consulta la primera vez y a partir de
+ahí solo se incrementan; se vuelven a tomar de la base de datos cada
+`TIEMPO_REAL_RESINCRONIZAR` segundos para corregir cualquier desvío. El
+flujo SSE de cada cliente solo lee la caché.
+
+Con varios procesos la caché debe ser compartida (memcached, redis): con
+`LocMemCache` cada worker solo ve las checadas que atendió él mismo.
+El flujo es asíncrono, así que debe servirse por ASGI (`asgi.py`).
+"""
+import asyncio
+import datetime
+import json
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Asistencia, Empleado, mascaras_con_dia
+
+TIEMPO_REAL_RESINCRONIZAR = getattr(settings, 'TIEMPO_REAL_RESINCRONIZAR', 600)
+# Tiempo que un evento sigue disponible para clientes que se reconectan
+TIEMPO_REAL_EVENTOS_TTL = getattr(settings, 'TIEMPO_REAL_EVENTOS_TTL', 600)
+# Antigüedad máxima (segundos) de una checada para anunciarla como evento en vivo
+TIEMPO_REAL_ANTIGUEDAD_MAX = getattr(settings, 'TIEMPO_REAL_ANTIGUEDAD_MAX', TIEMPO_REAL_EVENTOS_TTL)
+# Segundos entre lecturas de la caché y duración máxima de cada conexión
+# (EventSource se reconecta solo y continúa desde `Last-Event-ID`)
+SSE_INTERVALO = getattr(settings, 'SSE_INTERVALO', 1)
+SSE_DURACION = getattr(settings, 'SSE_DURACION', 300)
+SSE_LATIDO = 15
+# Eventos recientes que recibe un cliente al conectarse
+EVENTOS_INICIALES = 10
+EVENTOS_MAXIMOS = 200
+
+CLAVE_SECUENCIA = 'control:tiempo_real:secuencia'
+CONTADORES = ('entradas', 'retardos', 'salidas', 'esperados')
+
+
+def _clave_evento(numero):
+    return f'control:tiempo_real:evento:{numero}'
+
+
+def _claves_contadores(fecha):
+    prefijo = f'control:tiempo_real:{fecha.isoformat()}'
+    return {nombre: f'{prefijo}:{nombre}' for nombre in CONTADORES + ('base',)}
+
+
+def _contar(fecha):
+    """Contadores del día tomados de la base de datos."""
+    asistencias = Asistencia.objects.filter(fecha=fecha)
+    return {
+        'entradas': asistencias.filter(hora_entrada__isnull=False).count(),
+        'retardos': asistencias.filter(tipo='retardo').count(),
+        'salidas': asistencias.filter(hora_salida__isnull=False).count(),
+        'esperados': Empleado.objects.filter(
+            estado='activo', horarios__dias_mask__in=mascaras_con_dia(fecha.weekday()),
+        ).distinct().count(),
+    }
+
+
+def _inicializar(fecha):
+    """Carga los contadores si no están (o toca resincronizar). True si se cargaron."""
+    claves = _claves_contadores(fecha)
+    if cache.get(claves['base']):
+        return False
+    # Solo quien gana la marca consulta; el resto sigue con los valores anteriores
+    if not cache.add(claves['base'], True, TIEMPO_REAL_RESINCRONIZAR):
+        return False
+    # Los contadores viven más que la marca para que `incr` no falle entre resincronizaciones
+    cache.set_many({claves[n]: v for n, v in _contar(fecha).items()}, TIEMPO_REAL_RESINCRONIZAR * 2)
+    return True
+
+
+def _incrementar(fecha, incrementos):
+    """Suma `{contador: n}` a los contadores del día (un `incr` por contador)."""
+    if _inicializar(fecha):
+        # La consulta ya incluye las checadas que se están publicando
+        return
+    claves = _claves_contadores(fecha)
+    for nombre, n in incrementos.items():
+        try:
+            cache.incr(claves[nombre], n)
+        except ValueError:
+            cache.delete(claves['base'])
+            _inicializar(fecha)
+            return
+
+
+def contadores(fecha=None):
+    """`{presentes, retardos, ausentes, salidas, esperados}` del día."""
+    fecha = fecha or timezone.localdate()
+    _inicializar(fecha)
+    claves = _claves_contadores(fecha)
+    valores = cache.get_many([claves[n] for n in CONTADORES])
+    datos = {n: valores.get(claves[n], 0) for n in CONTADORES}
+    return {
+        'fecha': fecha.isoformat(),
+        'presentes': datos['entradas'],
+        'retardos': datos['retardos'],
+        'ausentes': max(datos['esperados'] - datos['entradas'], 0),
+        'salidas': datos['salidas'],
+        'esperados': datos['esperados'],
+    }
+
+
+def publicar_checadas(checadas):
+    """Registra checadas confirmadas para los clientes conectados.
+
+    Cada checada es una tupla `(direccion, empleado_id, fecha, hora[, tipo,
+    diferencia_minutos])`. Las del día suman a los contadores; solo las de
+    los últimos `TIEMPO_REAL_ANTIGUEDAD_MAX` segundos se publican como
+    eventos. Devuelve los números de secuencia asignados.
+    """
+    ahora = timezone.localtime()
+    hoy = ahora.date()
+    limite = ahora.replace(tzinfo=None) - datetime.timedelta(seconds=TIEMPO_REAL_ANTIGUEDAD_MAX)
+
+    incrementos = Counter()
+    recientes = []
+    for checada in checadas:
+        direccion, empleado_id, fecha, hora, tipo, diferencia_minutos = (tuple(checada) + (None, None))[:6]
+        if fecha != hoy:
+            continue
+        if direccion == 'entrada':
+            incrementos['entradas'] += 1
+            if tipo == 'retardo':
+                incrementos['retardos'] += 1
+        else:
+            incrementos['salidas'] += 1
+        if datetime.datetime.combine(fecha, hora) >= limite:
+            recientes.append((direccion, empleado_id, fecha, hora, tipo, diferencia_minutos))
+
+    if incrementos:
+        _incrementar(hoy, incrementos)
+    if not recientes:
+        return []
+
+    nombres = {
+        e['pk']: f"{e['nombre']} {e['apellido']}".strip()
+        for e in Empleado.objects.filter(pk__in={c[1] for c in recientes}).values('pk', 'nombre', 'apellido')
+    }
+    # Se reservan todos los números de secuencia del lote con un solo incremento
+    cache.add(CLAVE_SECUENCIA, 0, None)
+    ultimo = cache.incr(CLAVE_SECUENCIA, len(recientes))
+    numeros = range(ultimo - len(recientes) + 1, ultimo + 1)
+    cache.set_many({
+        _clave_evento(numero): {
+            'id': numero,
+            'direccion': direccion,
+            'empleado': nombres.get(empleado_id, ''),
+            'fecha': fecha.isoformat(),
+            'hora': hora.strftime('%H:%M:%S'),
+            'tipo': tipo,
+            'diferencia_minutos': diferencia_minutos,
+        }
+        for numero, (direccion, empleado_id, fecha, hora, tipo, diferencia_minutos) in zip(numeros, recientes)
+    }, TIEMPO_REAL_EVENTOS_TTL)
+    return list(numeros)
+
+
+def publicar_al_confirmar(checadas):
+    """Publica las checadas (tuplas de argumentos) al confirmar la transacción.
+
+    Son una consulta y unas cuantas operaciones de caché por lote, así que
+    se hacen en el propio hilo: en el pool de tareas esperarían detrás de
+    exportaciones y PDFs.
+    Un fallo al publicar se registra y no afecta al checado.
+    """
+    transaction.on_commit(lambda: publicar_checadas(checadas), robust=True)
+
+
+def secuencia_actual():
+    return cache.get(CLAVE_SECUENCIA) or 0
+
+
+def eventos_desde(ultimo):
+    """Eventos posteriores a `ultimo` (los que sigan en caché) y el nuevo último id."""
+    actual = secuencia_actual()
+    if ultimo > actual:
+        # La caché se vació: la secuencia volvió a empezar
+        ultimo = 0
+    if actual == ultimo:
+        return [], ultimo
+    numeros = range(max(ultimo + 1, actual - EVENTOS_MAXIMOS + 1), actual + 1)
+    encontrados = cache.get_many([_clave_evento(n) for n in numeros])
+    eventos = [encontrados[_clave_evento(n)] for n in numeros if _clave_evento(n) in encontrados]
+    return eventos, actual
+
+
+def _mensaje(evento, datos, ident=None):
+    lineas = [f'id: {ident}'] if ident is not None else []
+    lineas += [f'event: {evento}', f'data: {json.dumps(datos)}']
+    return '\n'.join(lineas) + '\n\n'
+
+
+async def flujo(ultimo=None, duracion=None):
+    """Flujo SSE: contadores al conectar y después cada checada nueva.
+
+    Sin `ultimo` (primera conexión) se envían los `EVENTOS_INICIALES` más
+    recientes. La conexión se cierra tras `duracion` segundos.
+    """
+    loop = asyncio.get_running_loop()
+    fin = loop.time() + (SSE_DURACION if duracion is None else duracion)
+    if ultimo is None:
+        ultimo = max(await sync_to_async(secuencia_actual)() - EVENTOS_INICIALES, 0)
+
+    yield f'retry: {SSE_INTERVALO * 3000}\n\n'
+    yield _mensaje('contadores', await sync_to_async(contadores)())
+    silencio = 0
+    while loop.time() < fin:
+        eventos, ultimo = await sync_to_async(eventos_desde)(ultimo)
+        for evento in eventos:
+            yield _mensaje('checada', evento, ident=evento['id'])
+        if eventos:
+            yield _mensaje('contadores', await sync_to_async(contadores)())
+            silencio = 0
+        else:
+            silencio += SSE_INTERVALO
+            if silencio >= SSE_LATIDO:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ': latido\n\n'
+                silencio = 0
+        await asyncio.sleep(SSE_INTERVALO)
@@ -11,19 +11,25 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     # Rutas para la gestión de empleados
     path('admin/dashboard/', views.dashboard, name='admin_dashboard'),
+    path('admin/dashboard/flujo/', views.flujo_checadas, name='flujo_checadas'),
     path('crear/', views.crear_empleado, name='crear'),
     path('listar/', views.listar_empleados, name='listar'),
     path('<int:empleado_id>/editar/', views.editar_empleado, name='editar'),
     path('<int:empleado_id>/eliminar/', views.eliminar_empleado, name='eliminar'),
     path('asistencia/reporte/', views.reporte_asistencias, name='reporte_asistencias'),
     path('asistencia/reporte/exportar/', views.exportar_asistencias_excel, name='exportar_asistencias_excel'),
+    path('asistencia/reporte/exportaciones/', views.solicitar_exportacion, name='solicitar_exportacion'),
+    path('asistencia/reporte/exportaciones/<int:exportacion_id>/', views.estado_exportacion, name='estado_exportacion'),
+    path('asistencia/reporte/exportaciones/<int:exportacion_id>/descargar/', views.descargar_exportacion, name='descargar_exportacion'),
     path('empleados/sin-horario/', views.empleados_sin_horario, name='empleados_sin_horario'),
+    path('empleados/buscar/', views.buscar_empleados, name='buscar_empleados'),
 
 
     # Rutas para el control de asistencia
     path('', views.registro_asistencia, name='registro_asistencia'),
     path('entrada/', views.registrar_entrada, name='registrar_entrada'),
     path('salida/', views.registrar_salida, name='registrar_salida'),
+    path('lote/', views.registrar_lote, name='registrar_lote'),
     # Horarios CRUD para administradores
     path('horarios/', views.listar_horarios, name='listar_horarios'),
     path('horarios/crear/', views.crear_horario, name='crear_horario'),
@@ -37,11 +43,15 @@ urlpatterns = [
     
     # Validación de justificantes (solo admin)
     path('admin/justificantes/', views.validar_justificantes, name='validar_justificantes'),
+    path('justificantes/<int:justificante_id>/archivo/', views.descargar_justificante, name='descargar_justificante'),
     path('admin/justificantes/<int:justificante_id>/aprobar/', views.aprobar_justificante, name='aprobar_justificante'),
     path('admin/justificantes/<int:justificante_id>/rechazar/', views.rechazar_justificante, name='rechazar_justificante'),
     
     # Pases de entrada/salida
     path('pases/crear/', views.crear_pase, name='crear_pase'),
+    path('pases/lote/', views.crear_pases_lote, name='crear_pases_lote'),
+    path('pases/lote/<str:nombre>/', views.descargar_lote_pases, name='descargar_lote_pases'),
+    path('pases/lote/<str:nombre>/estado/', views.estado_lote_pases, name='estado_lote_pases'),
     path('pases/', views.listar_pases, name='listar_pases'),
     path('pases/<int:pase_id>/', views.ver_pase, name='ver_pase'),
     path('pases/<int:pase_id>/editar/', views.editar_pase, name='editar_pase'),
@@ -1,243 +1,283 @@
 """
 Utilidades para generar PDFs de pases de entrada/salida
 Superpone datos sobre los templates PDF existentes
+
+Los templates se leen una sola vez por proceso y se conservan en memoria
+junto con su geometría y la posición de cada campo; se vuelven a cargar
+solo si cambia la fecha de modificación del archivo.
 """
 from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, ContentStream, DecodedStreamObject, DictionaryObject, NameObject
 from reportlab.pdfgen import canvas
 from io import BytesIO
 from django.conf import settings
 import os
+import threading
+
+
+TEMPLATES_PASE = {
+    'entrada': 'pase-de-entrada.pdf',
+    'salida': 'PASE-DE-SALIDA.pdf',
+}
+
+MESES_ES = {
+    1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL',
+    5: 'MAYO', 6: 'JUNIO', 7: 'JULIO', 8: 'AGOSTO',
+    9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
+}
+
+# Caracteres por renglón de observaciones (se usan como mucho dos renglones)
+OBSERVACIONES_ANCHO = 70
+
+
+class _Template:
+    """Template de pase ya interpretado, con su geometría y layout de campos."""
+
+    def __init__(self, tipo, ruta, mtime):
+        with open(ruta, 'rb') as f:
+            # El reader resuelve objetos bajo demanda: se conserva el contenido en memoria
+            self.reader = PdfReader(BytesIO(f.read()))
+        self.tipo = tipo
+        self.ruta = ruta
+        self.mtime = mtime
+        self.paginas = list(self.reader.pages)
+        # Contenido de cada página aislado entre q/Q, listo para anteponerlo
+        # al overlay sin volver a interpretar el content stream del template
+        self.contenidos = [_contenido_aislado(page) for page in self.paginas]
+
+        # Tamaño real de la primera página
+        media_box = self.paginas[0].mediabox
+        self.ancho = float(media_box.width)
+        self.alto = float(media_box.height)
+        self.layout = _calcular_layout(tipo, self.ancho, self.alto, len(self.paginas))
+        self.renglon = self.alto * 0.04
+
+        # PdfReader no es seguro entre hilos al resolver objetos
+        self.lock = threading.Lock()
+
+
+def _contenido_aislado(page):
+    contenido = page.get_contents()
+    if contenido is None:
+        return None
+    if isinstance(contenido, ArrayObject):
+        data = b"\n".join(s.get_object().get_data() for s in contenido)
+    else:
+        data = contenido.get_data()
+    return b"q\n" + data + b"\nQ\n"
+
+
+def _calcular_layout(tipo, page_width, page_height, num_paginas):
+    """Posiciones absolutas `(campo, x, y)` de cada dato para el tipo de pase.
+
+    Usa porcentajes del tamaño de página, por lo que es adaptable a
+    cualquier tamaño de PDF. Cada pase lleva dos secciones: original y
+    copia para el trabajador, desplazada hacia abajo.
+    """
+    if tipo == 'entrada':
+        folio_x, folio_y = page_width * 0.78, page_height * 0.82
+        nombre_x, nombre_y = page_width * 0.26, page_height * 0.808
+        hora_x, hora_y = page_width * 0.26, page_height * 0.788
+        fecha_x, fecha_y = page_width * 0.72, page_height * 0.788
+        asunto_x, asunto_y = page_width * 0.26, page_height * 0.747
+        obs_x, obs_y = page_width * 0.26, page_height * 0.694
+
+        # Copia en la parte inferior de la misma página
+        y_offset = page_height * 0.425
+        return [
+            ('folio', folio_x, folio_y),
+            ('nombre', nombre_x, nombre_y),
+            ('hora', hora_x, hora_y),
+            ('fecha', fecha_x, fecha_y),
+            ('asunto', asunto_x, asunto_y),
+            ('observaciones', obs_x, obs_y),
+            ('folio', folio_x, folio_y - y_offset),
+            ('nombre', nombre_x, nombre_y - y_offset),
+            ('hora', hora_x, hora_y - y_offset),
+            ('fecha', fecha_x, fecha_y - y_offset),
+            ('asunto', asunto_x, (asunto_y - y_offset) - page_height * 0.01),
+            ('observaciones', obs_x, (obs_y - y_offset) - page_height * 0.01),
+        ]
+
+    folio_x, folio_y = page_width * 0.78, page_height * 0.78
+    nombre_x, nombre_y = page_width * 0.26, page_height * 0.762
+    hora_x, hora_y = page_width * 0.26, page_height * 0.748
+    reincorp_x, reincorp_y = page_width * 0.72, page_height * 0.788
+    fecha_x, fecha_y = page_width * 0.26, page_height * 0.65
+    asunto_x, asunto_y = page_width * 0.26, page_height * 0.70
+    obs_x, obs_y = page_width * 0.26, page_height * 0.67
+    layout = [
+        ('folio', folio_x, folio_y),
+        ('nombre', nombre_x, nombre_y),
+        ('hora', hora_x, hora_y),
+        ('reincorporacion', reincorp_x, reincorp_y),
+        ('fecha', fecha_x, fecha_y),
+        ('asunto', asunto_x, asunto_y),
+        ('observaciones', obs_x, obs_y),
+    ]
+    if num_paginas == 1:
+        # Si todo está en una página, la copia va con un offset vertical
+        y_offset = page_height * 0.44
+        layout += [
+            ('folio', folio_x, folio_y - y_offset),
+            ('nombre', nombre_x, nombre_y - y_offset),
+            ('hora', hora_x, (hora_y - y_offset) - page_height * 0.006),
+            ('reincorporacion', reincorp_x, reincorp_y - y_offset),
+            ('fecha', fecha_x, fecha_y - y_offset),
+            ('asunto', asunto_x, (asunto_y - y_offset) + page_height * 0.001),
+            ('observaciones', obs_x, (obs_y - y_offset) - page_height * 0.005),
+        ]
+    return layout
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def obtener_template(tipo, media_root=None):
+    """Template interpretado para `tipo`, recargado si el archivo cambió.
+
+    `media_root` permite usarlo en procesos hijos sin depender de settings.
+    """
+    nombre = TEMPLATES_PASE['salida' if tipo == 'salida' else 'entrada']
+    template_path = os.path.join(media_root or settings.MEDIA_ROOT, 'pases_form', nombre)
+    try:
+        mtime = os.stat(template_path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Template no encontrado: {template_path}")
+
+    template = _templates.get(tipo)
+    if template is not None and template.ruta == template_path and template.mtime == mtime:
+        return template
+    with _templates_lock:
+        template = _templates.get(tipo)
+        if template is None or template.ruta != template_path or template.mtime != mtime:
+            template = _Template(tipo, template_path, mtime)
+            _templates[tipo] = template
+    return template
+
+
+def limpiar_cache_templates():
+    """Descarta los templates en memoria (se recargan en el siguiente pase)."""
+    with _templates_lock:
+        _templates.clear()
+
+
+def datos_pase(pase):
+    """Textos a imprimir en el pase, como un dict de valores simples."""
+    fecha = pase.fecha
+    return {
+        'tipo': pase.tipo,
+        'folio': str(pase.folio),
+        'nombre': f"{pase.empleado.nombre} {pase.empleado.apellido}".upper(),
+        'hora': pase.hora.strftime("%H:%M"),
+        'reincorporacion': pase.hora_reincorporacion.strftime("%H:%M") if pase.hora_reincorporacion else None,
+        'fecha': f"{fecha.day} DE {MESES_ES[fecha.month]} DE {fecha.year}",
+        'asunto': str(pase.asunto).upper(),
+        'observaciones': str(pase.observaciones or "NINGUNA").upper(),
+    }
+
+
+def _overlay(template, datos):
+    """Página con los datos del pase, lista para superponer al template."""
+    packet = BytesIO()
+    can = canvas.Canvas(packet, pagesize=(template.ancho, template.alto))
+    can.setFont("Helvetica", 11)
+
+    observaciones = datos['observaciones']
+    if len(observaciones) > OBSERVACIONES_ANCHO:
+        lineas = [
+            observaciones[i:i + OBSERVACIONES_ANCHO]
+            for i in range(0, len(observaciones), OBSERVACIONES_ANCHO)
+        ][:2]
+    else:
+        lineas = [observaciones]
+
+    for campo, x, y in template.layout:
+        if campo == 'observaciones':
+            for linea in lineas:
+                can.drawString(x, y, linea)
+                y -= template.renglon
+        elif datos.get(campo):
+            can.drawString(x, y, datos[campo])
+
+    can.save()
+    packet.seek(0)
+    page = PdfReader(packet).pages[0]
+
+    # Las fuentes del overlay se renombran para no chocar con las del template
+    fuentes = page['/Resources'].get_object()['/Font'].get_object()
+    renombres = {nombre: NameObject('/Pase' + nombre[1:]) for nombre in fuentes}
+    contenido = ContentStream(page.get_contents(), page.pdf)
+    for operandos, _ in contenido.operations:
+        for i, operando in enumerate(operandos):
+            if operando in renombres:
+                operandos[i] = renombres[operando]
+    return contenido.get_data(), {renombres[n]: f for n, f in fuentes.items()}
+
+
+def _combinar(writer, page, contenido_template, contenido_overlay, fuentes):
+    """Superpone el overlay a una página ya clonada en `writer`."""
+    contenidos = ArrayObject()
+    for data in (contenido_template, contenido_overlay):
+        if data is not None:
+            stream = DecodedStreamObject()
+            stream.set_data(data)
+            contenidos.append(writer._add_object(stream.flate_encode()))
+    page[NameObject('/Contents')] = contenidos
+
+    recursos = page['/Resources'].get_object() if '/Resources' in page else DictionaryObject()
+    recursos = DictionaryObject(recursos)
+    fuentes_pagina = DictionaryObject(recursos.get('/Font', DictionaryObject()).get_object())
+    for nombre, fuente in fuentes.items():
+        fuentes_pagina[nombre] = fuente.clone(writer)
+    recursos[NameObject('/Font')] = fuentes_pagina
+    page[NameObject('/Resources')] = recursos
+
+
+def _escribir_pase(datos, destino, media_root=None):
+    template = obtener_template(datos['tipo'], media_root)
+    contenido_overlay, fuentes = _overlay(template, datos)
+
+    writer = PdfWriter()
+    with template.lock:
+        # add_page clona la página en el writer: el template en caché no se modifica
+        paginas = [writer.add_page(page) for page in template.paginas]
+    for page, contenido_template in zip(paginas, template.contenidos):
+        _combinar(writer, page, contenido_template, contenido_overlay, fuentes)
+    writer.write(destino)
+
+
+def renderizar_pase(datos):
+    """Genera el PDF de un pase a partir de `datos_pase` y devuelve un BytesIO."""
+    output = BytesIO()
+    _escribir_pase(datos, output)
+    output.seek(0)
+    return output
+
+
+def guardar_pase_pdf(datos, ruta, media_root=None):
+    """Genera el PDF de un pase directamente en el archivo `ruta`.
+
+    Solo recibe valores simples, por lo que puede ejecutarse en un proceso
+    hijo (ver `control.pases_lote`).
+    """
+    with open(ruta, 'wb') as f:
+        _escribir_pase(datos, f, media_root)
+    return ruta
 
 
 def generar_pase_pdf(pase):
     """
     Genera un PDF del pase superponiendo los datos sobre el template existente.
-    
+
     Args:
         pase: Instancia del modelo Pase
-    
+
     Returns:
         BytesIO con el PDF generado
     """
-    
-    # Seleccionar template según tipo de pase
-    if pase.tipo == 'salida':
-        template_path = os.path.join(settings.MEDIA_ROOT, 'pases_form', 'PASE-DE-SALIDA.pdf')
-    else:
-        template_path = os.path.join(settings.MEDIA_ROOT, 'pases_form', 'pase-de-entrada.pdf')
-    
-    if not os.path.exists(template_path):
-        raise FileNotFoundError(f"Template no encontrado: {template_path}")
-    
-    # Leer PDF template
-    with open(template_path, 'rb') as f:
-        reader = PdfReader(f)
-        writer = PdfWriter()
-        
-        # Obtener tamaño real de la primera página
-        first_page = reader.pages[0]
-        media_box = first_page.mediabox
-        page_width = float(media_box.width)
-        page_height = float(media_box.height)
-        
-        # Procesar cada página
-        for page_idx, page in enumerate(reader.pages):
-            # Crear overlay con reportlab usando el tamaño exacto
-            packet = BytesIO()
-            can = canvas.Canvas(packet, pagesize=(page_width, page_height))
-            
-            # Configurar fuente y tamaño
-            can.setFont("Helvetica", 11)
-            
-            # Preparar datos
-            empleado_nombre = f"{pase.empleado.nombre} {pase.empleado.apellido}".upper()
-            hora_str = pase.hora.strftime("%H:%M")
-            
-            meses_es = {
-                1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL',
-                5: 'MAYO', 6: 'JUNIO', 7: 'JULIO', 8: 'AGOSTO',
-                9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
-            }
-            dia = pase.fecha.day
-            mes = meses_es[pase.fecha.month]
-            ano = pase.fecha.year
-            fecha_str = f"{dia} DE {mes} DE {ano}"
-            
-            asunto_str = str(pase.asunto).upper()
-            observaciones_str = str(pase.observaciones or "NINGUNA").upper()
-            
-            # Usar porcentajes del tamaño de página para posicionar elementos
-            # Esto hace que sea adaptable a cualquier tamaño de PDF
-            
-            if pase.tipo == 'entrada':
-                # FOLIO - sobre la línea en blanco a la derecha de "FOLIO:"
-                folio_x = page_width * 0.78
-                folio_y = page_height * 0.82
-                can.drawString(folio_x, folio_y, str(pase.folio))
-                
-                # NOMBRE - sobre la línea en blanco después de "NOMBRE:"
-                nombre_x = page_width * 0.26
-                nombre_y = page_height * 0.808
-                can.drawString(nombre_x, nombre_y, empleado_nombre)
-                
-                # HORA DE ENTRADA - sobre la línea en blanco
-                hora_x = page_width * 0.26
-                hora_y = page_height * 0.788
-                can.drawString(hora_x, hora_y, hora_str)
-                
-                # FECHA - sobre la línea en blanco lado derecho
-                fecha_x = page_width * 0.72
-                fecha_y = page_height * 0.788
-                can.drawString(fecha_x, fecha_y, fecha_str)
-                
-                # ASUNTO - sobre la línea en blanco después de "ASUNTO:"
-                asunto_x = page_width * 0.26
-                asunto_y = page_height * 0.747
-                can.drawString(asunto_x, asunto_y, asunto_str)
-                
-                # OBSERVACIONES - sobre las líneas en blanco
-                obs_x = page_width * 0.26
-                obs_y = page_height * 0.694
-                
-                if len(observaciones_str) > 70:
-                    lineas = [observaciones_str[i:i+70] for i in range(0, len(observaciones_str), 70)]
-                    y_pos = obs_y
-                    for linea in lineas[:2]:
-                        can.drawString(obs_x, y_pos, linea)
-                        y_pos -= page_height * 0.04
-                else:
-                    can.drawString(obs_x, obs_y, observaciones_str)
-                
-                # SEGUNDA SECCIÓN (COPIA/TRABAJADOR) - misma página
-                # Aplicar offset para la copia en la parte inferior (subir un poco)
-                y_offset = page_height * 0.425
-                
-                # FOLIO - copia
-                can.drawString(folio_x, folio_y - y_offset, str(pase.folio))
-                
-                # NOMBRE - copia
-                can.drawString(nombre_x, nombre_y - y_offset, empleado_nombre)
-                
-                # HORA DE ENTRADA - copia
-                can.drawString(hora_x, hora_y - y_offset, hora_str)
-                
-                # FECHA - copia
-                can.drawString(fecha_x, fecha_y - y_offset, fecha_str)
-                
-                # ASUNTO - copia
-                can.drawString(asunto_x, (asunto_y - y_offset) - page_height * 0.01, asunto_str)
-                
-                # OBSERVACIONES - copia
-                obs_y_copy = (obs_y - y_offset) - page_height * 0.01
-                if len(observaciones_str) > 70:
-                    lineas = [observaciones_str[i:i+70] for i in range(0, len(observaciones_str), 70)]
-                    y_pos = obs_y_copy
-                    for linea in lineas[:2]:
-                        can.drawString(obs_x, y_pos, linea)
-                        y_pos -= page_height * 0.04
-                else:
-                    can.drawString(obs_x, obs_y_copy, observaciones_str)
-            
-            elif pase.tipo == 'salida':
-                # PRIMERA SECCIÓN (ORIGINAL)
-                # FOLIO - sobre la línea en blanco a la derecha
-                folio_x = page_width * 0.78
-                folio_y = page_height * 0.78
-                can.drawString(folio_x, folio_y, str(pase.folio))
-                
-                # NOMBRE - sobre la línea en blanco
-                nombre_x = page_width * 0.26
-                nombre_y = page_height * 0.762
-                can.drawString(nombre_x, nombre_y, empleado_nombre)
-                
-                # HORA DE SALIDA - sobre la línea en blanco
-                hora_x = page_width * 0.26
-                hora_y = page_height * 0.748
-                can.drawString(hora_x, hora_y, hora_str)
-                
-                # HORA DE REINCORPORACIÓN (si aplica)
-                if pase.hora_reincorporacion:
-                    hora_reincorp = pase.hora_reincorporacion.strftime("%H:%M")
-                    reincorp_x = page_width * 0.72
-                    reincorp_y = page_height * 0.788
-                    can.drawString(reincorp_x, reincorp_y, hora_reincorp)
-                
-                # FECHA - sobre la línea en blanco
-                fecha_x = page_width * 0.26
-                fecha_y = page_height * 0.65
-                can.drawString(fecha_x, fecha_y, fecha_str)
-                
-                # ASUNTO - sobre la línea en blanco
-                asunto_x = page_width * 0.26
-                asunto_y = page_height * 0.70
-                can.drawString(asunto_x, asunto_y, asunto_str)
-                
-                # OBSERVACIONES - sobre las líneas en blanco
-                obs_x = page_width * 0.26
-                obs_y = page_height * 0.67
-                
-                if len(observaciones_str) > 70:
-                    lineas = [observaciones_str[i:i+70] for i in range(0, len(observaciones_str), 70)]
-                    y_pos = obs_y
-                    for linea in lineas[:2]:
-                        can.drawString(obs_x, y_pos, linea)
-                        y_pos -= page_height * 0.04
-                else:
-                    can.drawString(obs_x, obs_y, observaciones_str)
-                
-                # SEGUNDA SECCIÓN (COPIA/TRABAJADOR)
-                if len(reader.pages) == 1:
-                    # Si todo está en una página, usar offset vertical muy arriba
-                    y_offset = page_height * 0.44
-                    
-                    # FOLIO - copia
-                    can.drawString(folio_x, folio_y - y_offset, str(pase.folio))
-                    
-                    # NOMBRE - copia
-                    can.drawString(nombre_x, nombre_y - y_offset, empleado_nombre)
-                    
-                    # HORA DE SALIDA - copia (subir 0.3 puntos)
-                    can.drawString(hora_x, (hora_y - y_offset) - page_height * 0.006, hora_str)
-                    
-                    # HORA DE REINCORPORACIÓN - copia
-                    if pase.hora_reincorporacion:
-                        can.drawString(reincorp_x, reincorp_y - y_offset, hora_reincorp)
-                    
-                    # FECHA - copia
-                    can.drawString(fecha_x, fecha_y - y_offset, fecha_str)
-                    
-                    # ASUNTO - copia (subir 2 puntos)
-                    can.drawString(asunto_x, (asunto_y - y_offset) + page_height * 0.001 , asunto_str)
-                    
-                    # OBSERVACIONES - copia (subir 0.5 puntos)
-                    obs_y_copy = (obs_y - y_offset) - page_height * 0.005
-                    if len(observaciones_str) > 70:
-                        lineas = [observaciones_str[i:i+70] for i in range(0, len(observaciones_str), 70)]
-                        y_pos = obs_y_copy
-                        for linea in lineas[:2]:
-                            can.drawString(obs_x, y_pos, linea)
-                            y_pos -= page_height * 0.04
-                    else:
-                        can.drawString(obs_x, obs_y_copy, observaciones_str)
-            
-            # Finalizar canvas
-            can.save()
-            packet.seek(0)
-            
-            # Leer el overlay
-            overlay_reader = PdfReader(packet)
-            overlay_page = overlay_reader.pages[0]
-            
-            # Combinar páginas
-            page.merge_page(overlay_page)
-            writer.add_page(page)
-        
-        # Generar PDF final
-        output = BytesIO()
-        writer.write(output)
-        output.seek(0)
-        
-        return output
+    return renderizar_pase(datos_pase(pase))
 
 
 def obtener_templates_disponibles():
@@ -1,44 +1,56 @@
 from django.shortcuts import render
-from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.models import Group
 from django.utils import timezone
 from django.contrib.auth.views import LoginView
 from django.db import IntegrityError
-from datetime import datetime, date
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.clickjacking import xframe_options_sameorigin
+from django.db.models import Prefetch
+from asgiref.sync import sync_to_async
+from datetime import datetime
 import datetime as _dt
+import json
 import logging
-from .models import Empleado, Asistencia, Horario, Justificante, SystemConfig, Pase
-from .forms import EmpleadoCreationForm, EmpleadoForm, JustificanteRetardoForm, HorarioForm, PaseForm
-from .utils_pdf import generar_pase_pdf
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
+from .models import DIAS_SEMANA, Empleado, Asistencia, Horario, Justificante, SystemConfig, Pase, Exportacion
+from .forms import EmpleadoCreationForm, EmpleadoForm, JustificanteRetardoForm, HorarioForm, PaseForm, PaseLoteForm
+from . import checkin, descargas, exportaciones, metricas, pases_lote, pases_pdf, roles, tiempo_real
+from .roles import es_administracion
+from .reportes import (
+    ORDEN_FECHA, ORDEN_RETARDO, conteo_aproximado, decodificar_cursor,
+    estadisticas_retardo, filtrar_asistencias, filtros_de_request, hay_filtros, pagina_keyset, por_pagina,
+)
 
 
 # Configurar logger para la aplicación
 logger = logging.getLogger(__name__)
 
+# Sugerencias del buscador de empleados: por defecto y máximo por petición
+BUSQUEDA_EMPLEADOS_LIMITE = getattr(settings, 'BUSQUEDA_EMPLEADOS_LIMITE', 10)
+BUSQUEDA_EMPLEADOS_LIMITE_MAX = 50
+
 class CustomLoginView(LoginView):
     template_name = 'control/login.html'
     
     def get_success_url(self):
-        user = self.request.user
-        
-        if user.groups.filter(name='administracion').exists():
+        # Una sola consulta (o ninguna, si está en caché) para todos los grupos
+        grupos = roles.grupos(self.request.user)
+
+        if roles.ADMINISTRACION in grupos:
             return '/control/admin/dashboard/'
-        elif user.groups.filter(name='empleado').exists():
+        elif roles.EMPLEADO in grupos:
             return '/control/empleado/dashboard/'
-        elif user.groups.filter(name='supervisores').exists():
+        elif roles.SUPERVISORES in grupos:
             return '/supervisores/panel/'
         else:
             return '/default/'  # Página por defecto
 
-def es_administracion(user):
-    return user.groups.filter(name='administracion').exists()
-
 # Create your views here.
 def home(request):
     """Vista principal de la app `control` para verificar que la app responde."""
@@ -59,7 +71,8 @@ def dashboard(request):
     """Dashboard para administradores.
 
     Muestra métricas básicas del sistema (número de empleados, activos) y
-    solo está disponible para usuarios del grupo 'administracion'.
+    los totales del día leídos del resumen diario de asistencias.
+    Solo está disponible para usuarios del grupo 'administracion'.
     """
     user = request.user
     # comprobar pertenencia al grupo administracion
@@ -80,29 +93,48 @@ def dashboard(request):
             except ValueError:
                 messages.error(request, 'Valor inválido para minutos de retardo')
 
-    total_empleados = Empleado.objects.count()
-    activos = Empleado.objects.filter(estado='activo').count()
-
-    # 🔥 NUEVO: obtener empleados sin horario asignado
-    empleados_sin_horario = Empleado.objects.filter(horarios__isnull=True)
+    # Conteos y totales del día cacheados hasta la próxima escritura (ver `metricas`)
+    datos = metricas.dashboard(timezone.localdate())
 
     # Obtener umbral actual para mostrar en el dashboard
     try:
-        cfg = SystemConfig.get_solo()
+        cfg = SystemConfig.get_cached()
         retardo_actual = cfg.retardo_minutos
     except Exception:
         retardo_actual = 0
 
     context = {
-        'total_empleados': total_empleados,
-        'empleados_activos': activos,
+        'total_empleados': datos['empleados']['total'],
+        'empleados_activos': datos['empleados']['activos'],
         'retardo_minutos': retardo_actual,
-
-        # 🔥 NUEVO: enviar la lista al template
-        'empleados_sin_horario': empleados_sin_horario,
+        'hoy': datos['hoy'],
+        'empleados_sin_horario': datos['empleados']['sin_horario'],
     }
     return render(request, 'control/administracion/dashboard.html', context)
 
+
+@login_required
+async def flujo_checadas(request):
+    """Flujo Server-Sent Events del dashboard: checadas y contadores del día.
+
+    Vista asíncrona (servida por `asgi.py`): cada cliente conectado es una
+    corrutina que lee la caché, no un hilo ocupado ni consultas a la base
+    de datos por cliente. `Last-Event-ID` permite continuar tras reconectar.
+    """
+    user = await request.auser()
+    if not await sync_to_async(es_administracion)(user):
+        return HttpResponseForbidden('No tienes permiso para ver esta página')
+
+    ultimo = request.headers.get('Last-Event-ID', '')
+    response = StreamingHttpResponse(
+        tiempo_real.flujo(int(ultimo) if ultimo.isdigit() else None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx no debe acumular el flujo en su búfer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def crear_empleado(request):
     """Crear un nuevo empleado (crea también el usuario asociado).
@@ -210,13 +242,24 @@ def eliminar_empleado(request, empleado_id):
 
 @login_required
 def listar_horarios(request):
-    """Lista los horarios -- acceso solo administradores."""
+    """Lista los horarios -- acceso solo administradores.
+
+    `?dia=` (0=Lunes ... 6=Domingo) deja solo los horarios que cubren ese día.
+    """
     user = request.user
     if not es_administracion(user):
         return HttpResponseForbidden('No tienes permiso para ver esta página')
 
     horarios = Horario.objects.all().order_by('nombre')
-    return render(request, 'control/administracion/horarios_list.html', {'horarios': horarios})
+    dia = request.GET.get('dia', '')
+    dia = int(dia) if dia.isdigit() and int(dia) < len(DIAS_SEMANA) else None
+    if dia is not None:
+        horarios = horarios.del_dia(dia)
+    return render(request, 'control/administracion/horarios_list.html', {
+        'horarios': horarios,
+        'dias_semana': list(enumerate(DIAS_SEMANA)),
+        'dia': dia,
+    })
 
 
 @login_required
@@ -280,6 +323,37 @@ def empleados_sin_horario(request):
     })
 
 
+@login_required
+def buscar_empleados(request):
+    """Sugerencias para los campos de empleado de los formularios (solo administradores).
+
+    `?q=` es el inicio del nombre, del apellido o del RFC (sin distinguir
+    acentos ni mayúsculas) y `?limite=` el número máximo de resultados.
+    Responde `{"resultados": [{id, nombre, rfc, puesto, estado, etiqueta}]}`.
+    """
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para ver esta página')
+
+    try:
+        limite = max(1, min(int(request.GET.get('limite')), BUSQUEDA_EMPLEADOS_LIMITE_MAX))
+    except (TypeError, ValueError):
+        limite = BUSQUEDA_EMPLEADOS_LIMITE
+    empleados = Empleado.objects.only('pk', 'nombre', 'apellido', 'rfc', 'puesto', 'estado').buscar(
+        request.GET.get('q', ''), limite,
+    )
+    return JsonResponse({'resultados': [
+        {
+            'id': e.pk,
+            'nombre': str(e),
+            'rfc': e.rfc,
+            'puesto': e.puesto,
+            'estado': e.estado,
+            'etiqueta': e.etiqueta_busqueda(),
+        }
+        for e in empleados
+    ]})
+
+
 def registro_asistencia(request):
     """Vista completamente pública para el registro de asistencias."""
 
@@ -292,67 +366,18 @@ def registrar_entrada(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
-    # Priorizar RFC enviado en el POST (permitir kioscos/public access)
-    rfc = request.POST.get('rfc')
-    empleado = None
-
-    if rfc:
-        try:
-            empleado = Empleado.objects.get(rfc__iexact=rfc)
-        except Empleado.DoesNotExist:
-            return JsonResponse({'status': 'error', 'message': 'No se encontró empleado con ese RFC'}, status=404)
-
-    # Verificar si ya existe una asistencia para hoy
-    asistencia, created = Asistencia.objects.get_or_create(
-        empleado=empleado,
-        fecha=date.today()
-    )
-    if asistencia.hora_entrada:
-        return JsonResponse({
-            'status': 'error',
-            'message': 'Ya has registrado tu entrada hoy'
-        })
-
-    # Registrar la hora de entrada
-    asistencia.registrar_entrada()
-
-    # Verificar si es un retardo en base al horario asignado al empleado.
-    # `hora_entrada` puede ser `time` (TimeField) o `datetime`.
-    # Calcular minutos de diferencia usando el helper del modelo
+    # RFC enviado en el POST (kioscos/public access)
     try:
-        mins = asistencia.compute_diferencia_minutes()
-    except Exception:
-        mins = None
-
-    # Obtener umbral de retardo desde configuración
-    try:
-        cfg = SystemConfig.get_solo()
-        umbral = int(cfg.retardo_minutos or 0)
-    except Exception:
-        umbral = 0
-    
-    print("DEBUG >>> hora_entrada:", asistencia.hora_entrada)
-    print("DEBUG >>> mins calculados:", mins)
-    print("DEBUG >>> tipo mins:", type(mins))
-    print("DEBUG >>> umbral minutos:", umbral)
-    print("DEBUG >>> ENTRO AL IF?:", mins is not None and mins > umbral)
-
-    # Si la diferencia supera el umbral, marcar retardo
-    if mins is not None and mins > umbral:
-        asistencia.tipo = 'retardo'
-        asistencia.save()
-
-    # Formatear hora para la respuesta (hora almacenada es TimeField)
-    hora_str = None
-    if isinstance(asistencia.hora_entrada, _dt.time):
-        hora_str = asistencia.hora_entrada.strftime('%H:%M:%S')
+        resultado = checkin.registrar_entrada(request.POST.get('rfc'))
+    except checkin.ChecadoError as e:
+        return JsonResponse({'status': 'error', 'message': e.mensaje}, status=e.status or 200)
 
     return JsonResponse({
         'status': 'success',
         'message': 'Entrada registrada exitosamente',
-        'hora': hora_str,
-        'diferencia_minutos': mins,
-        'umbral_minutos': umbral,
+        'hora': resultado['hora'].strftime('%H:%M:%S'),
+        'diferencia_minutos': resultado['diferencia_minutos'],
+        'umbral_minutos': resultado['umbral_minutos'],
     })
 
 
@@ -361,61 +386,48 @@ def registrar_salida(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
-    # Priorizar RFC enviado en el POST
-    rfc = request.POST.get('rfc')
-    empleado = None
+    try:
+        resultado = checkin.registrar_salida(request.POST.get('rfc'))
+    except checkin.ChecadoError as e:
+        return JsonResponse({'status': 'error', 'message': e.mensaje}, status=e.status or 200)
 
-    if rfc:
-        try:
-            empleado = Empleado.objects.get(rfc__iexact=rfc)
-        except Empleado.DoesNotExist:
-            return JsonResponse({'status': 'error', 'message': 'No se encontró empleado con ese RFC'}, status=404)
+    return JsonResponse({
+        'status': 'success',
+        'message': 'Salida registrada exitosamente',
+        # Mostrar la hora en la zona local del servidor
+        'hora': resultado['hora'].strftime('%H:%M:%S'),
+    })
 
-    # Buscar la asistencia de hoy
-    try:
-        asistencia = Asistencia.objects.get(
-            empleado=empleado,
-            fecha=date.today()
-        )
-
-        if not asistencia.hora_entrada:
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Debes registrar primero tu entrada'
-            })
 
-        if asistencia.hora_salida:
-            return JsonResponse({
-                'status': 'error',
-                'message': 'Ya has registrado tu salida hoy'
-            })
+def registrar_lote(request):
+    """Registrar un lote de checadas acumuladas por un kiosco sin conexión.
+
+    Cuerpo JSON: `{"eventos": [{"rfc": ..., "timestamp": ISO-8601, "direccion": "entrada"|"salida"}]}`.
+    Devuelve un resultado por evento; reenviar el mismo lote es seguro.
+    Exige `settings.KIOSCO_TOKEN` en la cabecera `X-Kiosco-Token`; sin token
+    configurado el endpoint queda deshabilitado.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
-        # Registrar la hora de salida
-        asistencia.registrar_salida()
+    token = getattr(settings, 'KIOSCO_TOKEN', '')
+    if not token or not constant_time_compare(request.headers.get('X-Kiosco-Token', ''), token):
+        return JsonResponse({'status': 'error', 'message': 'Kiosco no autorizado'}, status=403)
 
-        # Obtener hora_salida como time
-        hora_salida = None
-        if asistencia.hora_salida:
-            if isinstance(asistencia.hora_salida, _dt.time):
-                hora_salida = asistencia.hora_salida
-            else:
-                try:
-                    hora_salida = timezone.localtime(asistencia.hora_salida).time()
-                except Exception:
-                    hora_salida = None
-
-        return JsonResponse({
-            'status': 'success',
-            'message': 'Salida registrada exitosamente',
-            # Mostrar la hora en la zona local del servidor
-            'hora': hora_salida.strftime('%H:%M:%S') if hora_salida else None
-        })
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'JSON inválido'}, status=400)
+    eventos = datos.get('eventos') if isinstance(datos, dict) else None
+    if not isinstance(eventos, list):
+        return JsonResponse({'status': 'error', 'message': "Se esperaba una lista en 'eventos'"}, status=400)
 
-    except Asistencia.DoesNotExist:
-        return JsonResponse({
-            'status': 'error',
-            'message': 'No se encontró registro de entrada para hoy'
-        })
+    try:
+        resultados = checkin.registrar_lote(eventos)
+    except checkin.ChecadoError as e:
+        return JsonResponse({'status': 'error', 'message': e.mensaje}, status=e.status or 400)
+
+    return JsonResponse({'status': 'success', 'resultados': resultados})
 
 
 @login_required
@@ -452,29 +464,65 @@ def ver_asistencias(request):
     return render(request, 'control/asistencias/empleado_dashboard.html', context)
 
 
+# Ventana máxima (en días) que puede pedir el calendario en una sola llamada
+EVENTOS_VENTANA_MAX_DIAS = 400
+
+
+def _parsear_fecha_calendario(valor):
+    """Acepta 'YYYY-MM-DD' o el ISO datetime que envía FullCalendar en start/end."""
+    if not valor:
+        return None
+    try:
+        momento = parse_datetime(valor)
+    except ValueError:
+        momento = None
+    if momento is not None:
+        return timezone.localtime(momento).date() if timezone.is_aware(momento) else momento.date()
+    try:
+        return parse_date(valor[:10])
+    except ValueError:
+        return None
+
+
 @login_required
 def asistencia_events(request):
     """Devuelve eventos de asistencias en formato JSON para el calendario.
 
     - Si el usuario es administrador y se pasa ?empleado_id=NN filtra por ese empleado.
     - Si no es administrador, devuelve solo las asistencias del empleado asociado al user.
+    - Respeta la ventana `start`/`end` (fin exclusivo) que envía FullCalendar.
     Cada evento contiene `extendedProps` con información necesaria para el modal.
+    Los justificantes se cargan en bloque y la diferencia sale del resumen
+    diario: el número de consultas no depende del número de asistencias.
     """
     user = request.user
+    es_admin = es_administracion(user)
 
     # Base queryset
-    if es_administracion(user):
-        asistencias = Asistencia.objects.all().select_related('empleado')
+    if es_admin:
+        asistencias = Asistencia.objects.all()
         empleado_id = request.GET.get('empleado_id')
         if empleado_id:
             asistencias = asistencias.filter(empleado_id=empleado_id)
     else:
-        try:
-            empleado = Empleado.objects.get(user=user)
-            asistencias = Asistencia.objects.filter(empleado=empleado).select_related('empleado')
-        except Empleado.DoesNotExist:
+        empleado = Empleado.objects.filter(user=user).only('pk').first()
+        if empleado is None:
             return JsonResponse([], safe=False)
-
+        asistencias = Asistencia.objects.filter(empleado=empleado)
+
+    # Ventana del calendario (por defecto el último año)
+    fin = _parsear_fecha_calendario(request.GET.get('end')) or (timezone.localdate() + _dt.timedelta(days=1))
+    inicio = _parsear_fecha_calendario(request.GET.get('start')) or (fin - _dt.timedelta(days=366))
+    inicio = max(inicio, fin - _dt.timedelta(days=EVENTOS_VENTANA_MAX_DIAS))
+
+    asistencias = list(
+        asistencias.filter(fecha__gte=inicio, fecha__lt=fin)
+        .select_related('empleado', 'resumen')
+        .prefetch_related(Prefetch(
+            'justificantes',
+            queryset=Justificante.objects.only('id', 'asistencia_id', 'ruta_archivo', 'fecha_envio'),
+        ))
+    )
     eventos = []
     # Mapeo de colores según tipo
     tipo_color = {
@@ -486,7 +534,10 @@ def asistencia_events(request):
 
     for a in asistencias:
         color = tipo_color.get(a.tipo, '#6c757d')
-        title = a.tipo.title() if not es_administracion(user) else f"{a.empleado.nombre} {a.empleado.apellido} - {a.tipo.title()}"
+        title = a.tipo.title() if not es_admin else f"{a.empleado.nombre} {a.empleado.apellido} - {a.tipo.title()}"
+        # justificantes ya viene ordenado por -fecha_envio (el más reciente primero)
+        justificantes = a.justificantes.all()
+        justificante = justificantes[0] if justificantes else None
 
         eventos.append({
             'id': a.id,
@@ -499,10 +550,13 @@ def asistencia_events(request):
                 'empleado': str(a.empleado) if a.empleado else None,
                 'hora_entrada': a.hora_entrada.strftime('%I:%M %p') if a.hora_entrada else None,
                 'hora_salida': a.hora_salida.strftime('%I:%M %p') if a.hora_salida else None,
-                'diferencia': a.diferencia if hasattr(a, 'diferencia') else None,
+                'diferencia': a.resumen.diferencia if hasattr(a, 'resumen') else None,
                 'tipo': a.tipo,
                 'observaciones': a.observaciones,
-                'justificante_url': a.justificantes.first().ruta_archivo.url if a.justificantes.exists() and a.justificantes.first().ruta_archivo else None,
+                'justificante_url': (
+                    reverse('control:descargar_justificante', args=[justificante.pk])
+                    if justificante and justificante.ruta_archivo else None
+                ),
                 'asistencia_id': a.id
             }
         })
@@ -512,43 +566,61 @@ def asistencia_events(request):
 
 @login_required
 def reporte_asistencias(request):
+    """Generar reporte de asistencias (solo administradores).
 
+    Paginado por keyset sobre (fecha, hora_entrada, id): `?cursor=` indica la
+    última fila de la página anterior y `?por_pagina=` el tamaño de página.
+    Con `?orden=retardo` se ordena por minutos de retardo, con su propio cursor.
+    `?exportacion=<id>` muestra el progreso de ese trabajo de exportación.
+    """
     if request.GET.get("exportar") == "excel":
         return exportar_asistencias_excel(request)
 
-    """Generar reporte de asistencias (solo administradores)."""
-    if not request.user.groups.filter(name='administracion').exists():
+    if not es_administracion(request.user):
         return HttpResponseForbidden('No tienes permiso para ver esta página')
 
-    # Obtener parámetros de filtrado
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    empleado_id = request.GET.get('empleado_id')
-    tipo = request.GET.get('tipo')
-
-    # Construir el query base
-    asistencias = Asistencia.objects.all().select_related('empleado')
-
-    # Aplicar filtros si existen
-    if fecha_inicio:
-        asistencias = asistencias.filter(fecha__gte=fecha_inicio)
-    if fecha_fin:
-        asistencias = asistencias.filter(fecha__lte=fecha_fin)
-    if empleado_id:
-        asistencias = asistencias.filter(empleado_id=empleado_id)
-    if tipo:
-        asistencias = asistencias.filter(tipo=tipo)
+    filtros = filtros_de_request(request.GET)
+    filtrado = hay_filtros(filtros)
+    asistencias = filtrar_asistencias(filtros, Asistencia.objects.select_related('empleado', 'resumen'))
+
+    orden = ORDEN_RETARDO if request.GET.get('orden') == ORDEN_RETARDO else ORDEN_FECHA
+    tamano = por_pagina(request.GET.get('por_pagina'))
+    cursor = decodificar_cursor(request.GET.get('cursor'), orden)
+    pagina, siguiente_cursor = pagina_keyset(asistencias, cursor, tamano, orden)
+    total, total_exacto = conteo_aproximado(asistencias, filtrado=filtrado)
+    # Sin filtros se recorrería la tabla completa calculando el retardo de cada fila
+    retardos = estadisticas_retardo(asistencias) if filtrado else None
+
+    # Parámetros actuales (filtros y tamaño) para construir los enlaces de página
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    exportacion_id = params.pop('exportacion', [None])[-1]
+    url_estado_exportacion = (
+        reverse('control:estado_exportacion', args=[int(exportacion_id)])
+        if exportacion_id and exportacion_id.isdigit() else None
+    )
 
     # Obtener lista de empleados para el filtro
     empleados = Empleado.objects.filter(estado='activo').order_by('nombre')
 
     return render(request, 'control/asistencias/reporte.html', {
-        'asistencias': asistencias,
+        'asistencias': pagina,
         'empleados': empleados,
-        'fecha_inicio': fecha_inicio,
-        'fecha_fin': fecha_fin,
-        'empleado_id': empleado_id,
-        'tipo': tipo
+        'fecha_inicio': request.GET.get('fecha_inicio'),
+        'fecha_fin': request.GET.get('fecha_fin'),
+        'empleado_id': request.GET.get('empleado_id'),
+        'tipo': request.GET.get('tipo'),
+        'retardo_minimo': filtros['retardo_minimo'],
+        'orden': orden,
+        'retardos': retardos,
+        'por_pagina': tamano,
+        'opciones_por_pagina': [25, 50, 100, 250, 500],
+        'es_primera_pagina': cursor is None,
+        'siguiente_cursor': siguiente_cursor,
+        'params_pagina': params.urlencode(),
+        'total': total,
+        'total_exacto': total_exacto,
+        'url_estado_exportacion': url_estado_exportacion,
     })
 
 
@@ -625,6 +697,20 @@ def validar_justificantes(request):
         return redirect('control:admin_dashboard')
 
 
+@login_required
+@xframe_options_sameorigin
+def descargar_justificante(request, justificante_id):
+    """Archivo de un justificante: solo para administración o el empleado que lo subió."""
+    justificante = get_object_or_404(Justificante.objects.select_related('empleado'), pk=justificante_id)
+    if not es_administracion(request.user) and justificante.empleado.user_id != request.user.id:
+        return HttpResponseForbidden('No tienes permiso para ver este justificante.')
+    if not justificante.ruta_archivo:
+        raise Http404('El justificante no tiene archivo')
+    return descargas.servir_archivo(
+        request, justificante.ruta_archivo.name, adjunto=bool(request.GET.get('descargar')),
+    )
+
+
 @login_required
 def aprobar_justificante(request, justificante_id):
     """Aprobar un justificante."""
@@ -669,98 +755,76 @@ def rechazar_justificante(request, justificante_id):
     })
 
 
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from datetime import datetime
-from .models import Asistencia, Empleado
-
 @login_required
 def exportar_asistencias_excel(request):
+    """Exporta el reporte de asistencias filtrado a XLSX (solo administradores).
 
-    fecha_inicio = request.GET.get("fecha_inicio")
-    fecha_fin = request.GET.get("fecha_fin")
-    empleado_id = request.GET.get("empleado")
-    tipo = request.GET.get("tipo")
-
-    asistencias = Asistencia.objects.select_related("empleado").all()
-
-    if fecha_inicio:
-        asistencias = asistencias.filter(fecha__gte=fecha_inicio)
-
-    if fecha_fin:
-        asistencias = asistencias.filter(fecha__lte=fecha_fin)
-
-    if empleado_id and empleado_id != "todos":
-        asistencias = asistencias.filter(empleado_id=empleado_id)
-
-    if tipo and tipo != "todos":
-        asistencias = asistencias.filter(tipo=tipo)
-
-    # Crear Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Asistencias"
-
-    ws.merge_cells("A1:F1")
-    titulo = ws["A1"]
-    titulo.value = "Reporte de Asistencias"
-    titulo.font = Font(size=16, bold=True)
-    titulo.alignment = Alignment(horizontal="center")
+    El archivo lo genera un trabajo en segundo plano (`control.exportaciones`)
+    con los filtros de la URL: si ya está listo se redirige a la descarga; si
+    no, al reporte con los mismos filtros, que muestra el progreso del trabajo.
+    """
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para ver esta página')
 
-    encabezados = ["Fecha", "Empleado", "Entrada", "Salida", "Tipo", "Observaciones"]
-    ws.append(encabezados)
+    exportacion, _ = exportaciones.solicitar_exportacion(filtros_de_request(request.GET), request.user)
+    if exportacion.estado == 'completada':
+        return redirect('control:descargar_exportacion', exportacion_id=exportacion.pk)
+
+    params = request.GET.copy()
+    params.pop('exportar', None)
+    params['exportacion'] = exportacion.pk
+    return redirect(f"{reverse('control:reporte_asistencias')}?{params.urlencode()}")
+
+
+def _exportacion_json(exportacion):
+    datos = {
+        'id': exportacion.pk,
+        'estado': exportacion.estado,
+        'progreso': exportacion.progreso,
+        'total': exportacion.total,
+        'porcentaje': exportacion.porcentaje,
+        'url_estado': reverse('control:estado_exportacion', args=[exportacion.pk]),
+        'url_descarga': None,
+        'error': exportacion.error,
+    }
+    if exportacion.estado == 'completada':
+        datos['url_descarga'] = reverse('control:descargar_exportacion', args=[exportacion.pk])
+    return datos
 
-    header_fill = PatternFill(start_color="DDDDDD", fill_type="solid")
-    header_font = Font(bold=True)
-    header_alignment = Alignment(horizontal="center")
 
-    for col in range(1, len(encabezados) + 1):
-        c = ws.cell(row=2, column=col)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = header_alignment
+@login_required
+def solicitar_exportacion(request):
+    """Encola la exportación del reporte con los filtros recibidos (POST).
 
-    for a in asistencias:
-        ws.append([
-            a.fecha.strftime("%d/%m/%Y"),
-            str(a.empleado),
-            a.hora_entrada.strftime("%H:%M:%S") if a.hora_entrada else "-",
-            a.hora_salida.strftime("%H:%M:%S") if a.hora_salida else "-",
-            a.get_tipo_display(),
-            a.observaciones or "-"
-        ])
-
-    thin = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin")
-    )
+    Filtros idénticos reutilizan el trabajo en curso o el archivo ya generado.
+    """
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para ver esta página')
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido'}, status=405)
 
-    max_row = ws.max_row
-    max_col = ws.max_column
+    exportacion, creada = exportaciones.solicitar_exportacion(filtros_de_request(request.POST), request.user)
+    return JsonResponse(dict(_exportacion_json(exportacion), creada=creada), status=202 if creada else 200)
 
-    for row in ws.iter_rows(min_row=2, max_row=max_row, min_col=1, max_col=max_col):
-        for cell in row:
-            cell.border = thin
 
-    for col in ws.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            val = str(cell.value)
-            if val:
-                max_len = max(max_len, len(val))
-        ws.column_dimensions[col_letter].width = max_len + 6
+@login_required
+def estado_exportacion(request, exportacion_id):
+    """Estado y progreso de un trabajo de exportación (para sondeo desde el navegador)."""
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para ver esta página')
+    exportacion = get_object_or_404(Exportacion, pk=exportacion_id)
+    return JsonResponse(_exportacion_json(exportacion))
 
-    ws.auto_filter.ref = f"A2:{get_column_letter(max_col)}{max_row}"
 
-    response = HttpResponse(content_type="application/ms-excel")
-    response["Content-Disposition"] = 'attachment; filename="reporte_asistencias.xlsx"'
-    wb.save(response)
-    return response
+@login_required
+def descargar_exportacion(request, exportacion_id):
+    """Descarga el XLSX de un trabajo completado."""
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para ver esta página')
+    exportacion = get_object_or_404(Exportacion, pk=exportacion_id, estado='completada')
+    if not exportacion.archivo:
+        return HttpResponse('El archivo aún no ha sido generado.', status=404)
+    return descargas.servir_archivo(request, exportacion.archivo.name, 'reporte_asistencias.xlsx')
 
 
 # ============= VISTAS PARA PASES DE ENTRADA/SALIDA =============
@@ -780,17 +844,10 @@ def crear_pase(request):
             pase.creado_por = request.user
             pase.save()
             
-            # Generar y guardar PDF
-            try:
-                pdf_content = generar_pase_pdf(pase)
-                nombre_archivo = f'pase_{pase.folio}_{pase.tipo}.pdf'
-                pase.pdf_generado.save(nombre_archivo, pdf_content, save=True)
-                
-                messages.success(request, f'Pase {pase.folio} creado exitosamente.')
-                return redirect('control:listar_pases')
-            except Exception as e:
-                messages.error(request, f'Error al generar PDF: {str(e)}')
-                pase.delete()
+            # El PDF se genera en segundo plano
+            pases_pdf.encolar_pdf(pase)
+            messages.success(request, f'Pase {pase.folio} creado exitosamente.')
+            return redirect('control:listar_pases')
     else:
         form = PaseForm()
     
@@ -826,6 +883,7 @@ def listar_pases(request):
 
 
 @login_required
+@xframe_options_sameorigin
 def descargar_pase_pdf(request, pase_id):
     """Descarga el PDF del pase."""
     pase = get_object_or_404(Pase, pk=pase_id)
@@ -833,12 +891,77 @@ def descargar_pase_pdf(request, pase_id):
     if not es_administracion(request.user):
         return HttpResponseForbidden('No tienes permiso para descargar pases.')
     
-    if not pase.pdf_generado:
-        return HttpResponse('El PDF aún no ha sido generado.', status=404)
+    # Si el worker aún no termina, esperar un momento o generarlo aquí mismo
+    pase = pases_pdf.asegurar_pdf(pase)
+    if pase.pdf_estado != 'listo':
+        return HttpResponse(f'No se pudo generar el PDF: {pase.pdf_error or "error desconocido"}', status=503)
     
-    response = HttpResponse(pase.pdf_generado.read(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="pase_{pase.folio}.pdf"'
-    return response
+    return descargas.servir_archivo(
+        request, pase.pdf_generado.name, f'pase_{pase.folio}.pdf',
+        adjunto=not request.GET.get('inline'), content_type='application/pdf',
+    )
+
+
+@login_required
+def crear_pases_lote(request):
+    """Crea el mismo pase para varios empleados y encola el PDF combinado para imprimir.
+    Solo accesible por administradores.
+    """
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para crear pases.')
+
+    if request.method == 'POST':
+        form = PaseLoteForm(request.POST)
+        if form.is_valid():
+            datos = form.cleaned_data
+            pases = pases_lote.crear_pases_lote(
+                [{'empleado': empleado, 'asunto': datos['asunto']} for empleado in datos['empleados']],
+                tipo=datos['tipo'],
+                fecha=datos['fecha'],
+                hora=datos['hora'],
+                hora_reincorporacion=datos['hora_reincorporacion'],
+                observaciones=datos['observaciones'] or None,
+                creado_por=request.user,
+            )
+            # Los PDFs y el combinado se generan en segundo plano
+            lote = pases[0].lote
+            pases_lote.encolar_lote(lote)
+            messages.success(request, f'Se crearon {len(pases)} pases.')
+            return render(request, 'control/administracion/pases_lote_resultado.html', {
+                'pases': Pase.objects.filter(lote=lote).select_related('empleado').order_by('folio'),
+                'lote': lote,
+            })
+    else:
+        form = PaseLoteForm()
+
+    return render(request, 'control/administracion/crear_pases_lote.html', {'form': form})
+
+
+@login_required
+def estado_lote_pases(request, nombre):
+    """Estado del PDF combinado de un lote de pases (para sondeo desde el navegador)."""
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para ver pases.')
+
+    estado = pases_lote.estado_lote(nombre)
+    if estado is None:
+        raise Http404('Lote no encontrado')
+    return JsonResponse({
+        'estado': estado,
+        'url_descarga': reverse('control:descargar_lote_pases', args=[nombre]) if estado == 'listo' else None,
+    })
+
+
+@login_required
+def descargar_lote_pases(request, nombre):
+    """Descarga el PDF combinado de un lote de pases."""
+    if not es_administracion(request.user):
+        return HttpResponseForbidden('No tienes permiso para descargar pases.')
+
+    archivo = pases_lote.archivo_lote(nombre)
+    if archivo is None:
+        raise Http404('Lote no encontrado')
+    return descargas.servir_archivo(request, archivo, nombre, content_type='application/pdf')
 
 
 @login_required
@@ -865,15 +988,10 @@ def editar_pase(request, pase_id):
         if form.is_valid():
             pase = form.save()
             
-            # Regenerar PDF
-            try:
-                pdf_content = generar_pase_pdf(pase)
-                nombre_archivo = f'pase_{pase.folio}_{pase.tipo}.pdf'
-                pase.pdf_generado.save(nombre_archivo, pdf_content, save=True)
-                messages.success(request, 'Pase actualizado y PDF regenerado.')
-                return redirect('control:ver_pase', pase_id=pase.id)
-            except Exception as e:
-                messages.error(request, f'Error al regenerar PDF: {str(e)}')
+            # Regenerar PDF en segundo plano
+            pases_pdf.encolar_pdf(pase)
+            messages.success(request, 'Pase actualizado. El PDF se está regenerando.')
+            return redirect('control:ver_pase', pase_id=pase.id)
     else:
         form = PaseForm(instance=pase)
     
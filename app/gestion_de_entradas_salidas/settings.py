@@ -18,16 +18,40 @@ from django.urls import reverse_lazy
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_bool(nombre, defecto=False):
+    return os.environ.get(nombre, str(defecto)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_entero(nombre, defecto):
+    valor = os.environ.get(nombre, '').strip()
+    return int(valor) if valor else defecto
+
+
+def env_lista(nombre, defecto=''):
+    return [valor.strip() for valor in os.environ.get(nombre, defecto).split(',') if valor.strip()]
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-h)9l$9z4_dwr)8loxroqyro!njzb=#*rnhn&omr)v+6r5(w+65'
+# docker-compose pasa una cadena vacía si .env no la define: se usa la clave de desarrollo
+SECRET_KEY = (
+    os.environ.get('DJANGO_SECRET_KEY')
+    or 'django-insecure-h)9l$9z4_dwr)8loxroqyro!njzb=#*rnhn&omr)v+6r5(w+65'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Apagado salvo que DEBUG=True en el entorno: con DEBUG cada consulta SQL
+# queda guardada en memoria durante la petición.
+DEBUG = env_bool('DEBUG')
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env_lista('ALLOWED_HOSTS', 'localhost,127.0.0.1,gestion_de_entradas')
+CSRF_TRUSTED_ORIGINS = env_lista('CSRF_TRUSTED_ORIGINS')
+
+# Token que los kioscos envían en `X-Kiosco-Token` al subir checadas
+# acumuladas sin conexión. Vacío: el endpoint de lotes rechaza todo.
+KIOSCO_TOKEN = os.environ.get('KIOSCO_TOKEN', '')
 
 
 # Application definition
@@ -70,10 +94,22 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'gestion_de_entradas_salidas.wsgi.application'
+# En producción se sirve por ASGI (gunicorn + workers de uvicorn, ver gunicorn.conf.py)
+ASGI_APPLICATION = 'gestion_de_entradas_salidas.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Reutilización de conexiones (ver `make benchmark-conexiones`):
+# - DB_CONN_MAX_AGE: segundos que una conexión sigue abierta entre peticiones
+#   (0 = se cierra al terminar cada petición). Sirve con workers de hilos
+#   (gthread); con ASGI cada petición corre en un hilo nuevo y las
+#   conexiones persistentes quedarían abandonadas, así que ahí se usa el pool.
+# - DB_CONN_HEALTH_CHECKS: comprobar la conexión reutilizada antes de usarla,
+#   por si MariaDB la cerró (wait_timeout).
+# - DB_POOL: pool de conexiones por proceso (django-db-connection-pool). Al
+#   terminar cada petición la conexión vuelve al pool en lugar de cerrarse.
 
 DATABASES = {
     'default': {
@@ -83,9 +119,41 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_ROOT_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': '3306',
+        'CONN_MAX_AGE': env_entero('DB_CONN_MAX_AGE', 0),
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
     }
 }
 
+if env_bool('DB_POOL'):
+    # Cada worker tiene su pool. DB_MAX_CONNECTIONS (por debajo de
+    # max_connections de MariaDB, 151, para dejar margen a comandos y
+    # consola) se reparte entre los WEB_CONCURRENCY workers, que gunicorn.conf.py
+    # exporta: workers x (POOL_SIZE + MAX_OVERFLOW) <= DB_MAX_CONNECTIONS
+    _conexiones_por_worker = max(2, env_entero('DB_MAX_CONNECTIONS', 100) // max(1, env_entero('WEB_CONCURRENCY', 1)))
+    _pool_size = env_entero('DB_POOL_SIZE', min(5, _conexiones_por_worker // 2))
+    DATABASES['default'].update({
+        'ENGINE': 'dj_db_conn_pool.backends.mysql',
+        # Las conexiones las conserva el pool: Django las devuelve al cerrar
+        'CONN_MAX_AGE': 0,
+        'POOL_OPTIONS': {
+            'POOL_SIZE': _pool_size,
+            'MAX_OVERFLOW': env_entero('DB_POOL_MAX_OVERFLOW', min(5, _conexiones_por_worker - _pool_size)),
+            # Menor que el wait_timeout de MariaDB
+            'RECYCLE': env_entero('DB_POOL_RECYCLE', 300),
+            'PRE_PING': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        },
+    })
+
+
+# Caché compartida entre workers (contadores en tiempo real, índices de
+# horarios, configuración). Sin REDIS_URL cada proceso usa su propia memoria.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
 
 
 # Password validation
@@ -129,6 +197,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Descargas protegidas (pases, justificantes, exportaciones): prefijo de la
+# location interna de nginx que sirve MEDIA_ROOT vía X-Accel-Redirect.
+# Vacío: Django envía el archivo con FileResponse.
+DESCARGAS_X_ACCEL_PREFIX = os.environ.get('DESCARGAS_X_ACCEL_PREFIX', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,52 @@
+"""
+Configuración de gunicorn para producción (reemplaza a `runserver`).
+
+Cada worker de uvicorn atiende la aplicación ASGI: las vistas asíncronas
+(el flujo SSE del dashboard) no ocupan un hilo y las síncronas se ejecutan
+en un hilo por petición. Con `GUNICORN_WORKER_CLASS=gthread` y
+`wsgi:application` se puede servir por WSGI (sin el flujo SSE). Todos los
+valores se pueden ajustar por variables de entorno.
+"""
+import math
+import os
+
+
+def _cpus_disponibles():
+    """CPUs que puede usar el contenedor (afinidad y límite de cgroup), no las del host."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    try:
+        # cgroup v2: "max 100000" o "<cuota> <periodo>"
+        with open('/sys/fs/cgroup/cpu.max') as archivo:
+            cuota, periodo = archivo.read().split()[:2]
+        if cuota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(cuota) / int(periodo))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+_cpus = _cpus_disponibles()
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:80'
+# Regla habitual de gunicorn: 2 workers por CPU + 1
+workers = int(os.environ.get('WEB_CONCURRENCY') or 2 * _cpus + 1)
+# Los workers heredan el entorno: settings reparte DB_MAX_CONNECTIONS entre ellos
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'uvicorn_worker.UvicornWorker'
+# Solo aplica a workers `gthread` (si se sirve por WSGI)
+threads = int(os.environ.get('GUNICORN_THREADS') or max(2, _cpus))
+
+# Las conexiones SSE duran minutos: el timeout solo vigila workers colgados
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 120)
+graceful_timeout = 30
+keepalive = 5
+# Reciclar workers periódicamente acota cualquier crecimiento de memoria
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 2000)
+max_requests_jitter = 200
+
+reload = os.environ.get('GUNICORN_RELOAD', '').lower() in ('1', 'true', 'yes', 'on')
+accesslog = '-'
+errorlog = '-'
+# Solo nginx puede fijar X-Forwarded-For/-Proto (docker-compose le da una IP
+# fija); el contenedor de la aplicación no publica puertos en el host
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS') or '127.0.0.1,::1'